@@ -1,13 +1,25 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import pandas as pd
+import numpy as np
 import gspread
 from google.oauth2.service_account import Credentials
 from datetime import datetime
 import random
-import matplotlib.pyplot as plt
-import io
+import math
 import os
 import time
+import sqlite3
+import threading
+import itertools
+import atexit
+import hashlib
+import multiprocessing
+import importlib.machinery
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import renderizacao
 
 # --- CONFIGURAÇÕES DE PÁGINA ---
 icone_aba = "logo.png" if os.path.exists("logo.png") else "🦉"
@@ -146,151 +158,2140 @@ with st.sidebar:
     else:
         st.markdown("<div style='height: 50px;'></div>", unsafe_allow_html=True)
 
+# --- GRUPO (QUAL PELADA ESTA SESSÃO ABRE) ---
+# Um processo atende várias peladas. Cada uma é um grupo com planilha (ou banco), senhas e
+# caches próprios, escolhido por ?grupo=<id> na URL. Os grupos vêm de st.secrets["grupos"]
+# ({id: {planilha, nome, conta, senhas, storage_backend...}}); sem essa seção, só o Madrugão.
+GRUPO_PADRAO = "madrugao"
+PLANILHA_MADRUGAO = "1OSxEwiE3voMOd-EI6CJ034torY-K7oFoz8EReyXkmPA"
+
+# O que é só do grupo: o grupo padrão ainda herda do nível de cima (configuração antiga),
+# os outros nunca (senha ou banco de uma pelada não podem vazar para outra). Nos outros,
+# senha não configurada desliga o papel em vez de cair numa senha padrão conhecida.
+PROPRIAS_GRUPO = {"planilha", "sqlite_path", "admin_password", "moderator_password", "finance_password"}
+
+def configs_grupos():
+    grupos = st.secrets.get("grupos")
+    if not grupos: return {GRUPO_PADRAO: {"planilha": PLANILHA_MADRUGAO}}
+    return {grupo_id: dict(cfg) for grupo_id, cfg in grupos.items()}
+
+# Configuração do grupo: a seção dele; o que faltar vem do nível de cima de st.secrets
+def config_grupo(chave, padrao=None, grupo_id=None):
+    grupo_id = grupo_id or st.session_state["grupo"]
+    cfg = configs_grupos()[grupo_id]
+    if chave in cfg: return cfg[chave]
+    if chave in PROPRIAS_GRUPO and grupo_id != GRUPO_PADRAO:
+        return f"{grupo_id}.db" if chave == "sqlite_path" else None
+    if chave == "planilha": return PLANILHA_MADRUGAO
+    return st.secrets.get(chave, padrao)
+
+NOME_PADRAO = "Pelada Madrugão"
+
+def nome_grupo():
+    grupo_id = st.session_state["grupo"]
+    return config_grupo("nome", NOME_PADRAO if grupo_id == GRUPO_PADRAO else grupo_id)
+
+grupo_id = st.query_params.get("grupo", st.secrets.get("grupo_padrao", GRUPO_PADRAO))
+if grupo_id not in configs_grupos():
+    st.error(f"❌ Grupo '{grupo_id}' não encontrado."); st.stop()
+if st.session_state.get("grupo", grupo_id) != grupo_id:
+    # Trocou de grupo na mesma sessão: nada do anterior (login, índices, sorteio, gravações) vem junto
+    st.session_state.clear()
+st.session_state["grupo"] = grupo_id
+
 # --- HEADER ---
 c_title, c_logo = st.columns([4, 1])
 with c_title:
-    st.markdown("<h1 class='main-title'>Pelada Madrugão 🦉</h1>", unsafe_allow_html=True)
+    st.markdown(f"<h1 class='main-title'>{nome_grupo()} 🦉</h1>", unsafe_allow_html=True)
+
+# --- CONEXÃO INTELIGENTE (POOL DE CLIENTES) ---
+# Um cliente autorizado (e um limitador de cota) por conta de serviço, criado uma vez e
+# compartilhado por todos os grupos daquela conta; cada grupo só abre a própria planilha.
+ESCOPOS_GOOGLE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+class PoolClientes:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clientes = {}
+        self.limitadores = {}
+
+    def cliente(self, conta):
+        with self.lock:
+            if conta not in self.clientes:
+                creds = Credentials.from_service_account_info(st.secrets[conta], scopes=ESCOPOS_GOOGLE)
+                self.clientes[conta] = gspread.authorize(creds)
+            return self.clientes[conta]
+
+    # A cota do Google é por projeto, então o limitador é da conta e não do grupo
+    def limitador(self, conta):
+        with self.lock:
+            if conta not in self.limitadores:
+                self.limitadores[conta] = LimitadorCota(
+                    por_minuto=int(st.secrets.get("cota_por_minuto", 50)),
+                    tentativas=int(st.secrets.get("cota_tentativas", 5)),
+                )
+            return self.limitadores[conta]
 
-# --- CONEXÃO INTELIGENTE (CACHE) ---
 @st.cache_resource
-def get_connection():
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"],
-        scopes=scopes
-    )
-    client = gspread.authorize(creds)
-    return client.open_by_key("1OSxEwiE3voMOd-EI6CJ034torY-K7oFoz8EReyXkmPA")
+def get_pool_clientes():
+    return PoolClientes()
 
-# --- LEITURA DE DADOS (CACHE) ---
-@st.cache_data(ttl=60)
-def load_data(sheet_name, expected_cols):
-    try:
-        sh = get_connection()
+def get_connection(grupo_id=None):
+    conta = config_grupo("conta", "gcp_service_account", grupo_id)
+    return get_pool_clientes().cliente(conta).open_by_key(config_grupo("planilha", None, grupo_id))
+
+# --- ARMAZENAMENTO (BACKENDS PLUGÁVEIS) ---
+# Todos os backends têm a mesma interface:
+#   ler(aba)        -> DataFrame, ou None se a aba não existe
+#   gravar(df, aba) -> substitui o conteúdo da aba
+#   anexar(df, aba) -> acrescenta só as linhas novas no fim da aba
+#   ler_varias(abas) -> {aba: DataFrame ou None}, numa única ida ao servidor quando o backend permite
+#   remover(df, aba) -> apaga as linhas cuja chave (1ª coluna de df) aparece em df
+#   sincronizar(df, aba) -> aplica um conjunto de mudanças (coluna "_acao") pela chave de CHAVES_ABAS
+#   revisao()       -> marca barata do estado da fonte (muda quando qualquer aba muda), ou None se o backend não sabe
+# O backend é escolhido por grupo em "storage_backend" (ver config_grupo): "sheets" (padrão), "sqlite" ou "memoria".
+# Índices do SQLite: as chaves que remover/sincronizar procuram. A mesma coluna pode ser gravada
+# como INTEGER ou TEXT (depende do que o to_sql inferiu), então a busca compara como texto e o
+# índice é da mesma expressão (texto_sql), senão o SQLite ignora o índice. As leituras enchem o
+# cache com a aba inteira e não filtram nada.
+INDICES_ABAS = {
+    "elenco": [("nome",)],
+    "pagamentos": [("nome", "ano", "mes")],
+    "jogos": [("id",)],
+    "saidas": [("id",)],
+}
+
+def texto_sql(coluna):
+    return f'CAST("{coluna}" AS TEXT)'
+
+# Chave estável de cada linha, usada para aplicar só o que mudou num editor
+CHAVES_ABAS = {
+    "elenco": ["nome"],
+    "saidas": ["id"],
+    "pagamentos": ["nome", "ano", "mes"],
+}
+COLUNAS_CONTROLE = ["_acao", "_colunas"]
+
+def valores_planilha(df):
+    # Mesma representação que o Google Sheets devolve: booleanos viram TRUE/FALSE, datas AAAA-MM-DD e vazios ""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == bool:
+            df[col] = df[col].map({True: "TRUE", False: "FALSE"})
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime("%Y-%m-%d")
+    return df.astype(object).where(df.notna(), "")
+
+# Converte a matriz crua de valores (cabeçalho + linhas) como o get_all_records faria
+def registros_para_df(valores):
+    if len(valores) < 2: return pd.DataFrame(columns=valores[0] if valores else [])
+    cab = valores[0]
+    linhas = [gspread.utils.numericise_all(l + [""] * (len(cab) - len(l)), default_blank="")[:len(cab)] for l in valores[1:]]
+    return pd.DataFrame(linhas, columns=cab)
+
+# --- LIMITE DE COTA DO GOOGLE (TOKEN BUCKET + BACKOFF) ---
+# Um limitador por conta de serviço (ver PoolClientes) para todas as chamadas ao gspread: segura o ritmo abaixo da
+# cota por minuto e, se mesmo assim vier 429/5xx, tenta de novo com espera exponencial aleatória.
+def erro_temporario(e):
+    codigo = getattr(e, "code", None)
+    if codigo == 429 or (isinstance(codigo, int) and codigo >= 500): return True
+    return "429" in str(e) or isinstance(e, (ConnectionError, TimeoutError))
+
+class LimitadorCota:
+    def __init__(self, por_minuto=50, tentativas=5, espera_base=1.0, espera_max=30.0):
+        self.capacidade = float(por_minuto)
+        self.taxa = por_minuto / 60.0
+        self.tokens = self.capacidade
+        self.ultimo = time.monotonic()
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self.lock = threading.Lock()
+        self.contadores = {"chamadas": 0, "limitadas": 0, "repetidas": 0, "falhas": 0}
+
+    def _contar(self, chave):
+        with self.lock: self.contadores[chave] += 1
+
+    def _pegar_token(self):
+        while True:
+            with self.lock:
+                agora = time.monotonic()
+                self.tokens = min(self.capacidade, self.tokens + (agora - self.ultimo) * self.taxa)
+                self.ultimo = agora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.taxa
+                self.contadores["limitadas"] += 1
+            time.sleep(espera)
+
+    def chamar(self, fn, *args, **kwargs):
+        for tentativa in range(self.tentativas):
+            self._pegar_token()
+            self._contar("chamadas")
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not erro_temporario(e) or tentativa == self.tentativas - 1:
+                    if erro_temporario(e): self._contar("falhas")
+                    raise
+                if "429" in str(e) or getattr(e, "code", None) == 429: self._contar("limitadas")
+                self._contar("repetidas")
+                time.sleep(random.uniform(0, min(self.espera_max, self.espera_base * 2 ** tentativa)))
+
+    def resumo(self):
+        with self.lock: return dict(self.contadores)
+
+def get_limitador(grupo_id=None):
+    return get_pool_clientes().limitador(config_grupo("conta", "gcp_service_account", grupo_id))
+
+class ArmazenamentoSheets:
+    def __init__(self, planilha, limitador=None):
+        self.planilha = planilha
+        self.limitador = limitador
+
+    def _api(self, fn, *args, **kwargs):
+        if self.limitador is None: return fn(*args, **kwargs)
+        return self.limitador.chamar(fn, *args, **kwargs)
+
+    def _aba(self, sheet_name, criar=False):
         try:
-            worksheet = sh.worksheet(sheet_name)
-        except:
-            return pd.DataFrame(columns=expected_cols) 
-        data = worksheet.get_all_records()
-        if not data:
-            return pd.DataFrame(columns=expected_cols)
-        df = pd.DataFrame(data)
-        for col in expected_cols:
-            if col not in df.columns:
-                df[col] = ""
-        
-        # --- CORREÇÃO DO BUG "NONE" ---
-        if "time" in df.columns: df["time"] = df["time"].replace("", "Ambos").fillna("Ambos")
-        if "tipo" in df.columns: df["tipo"] = df["tipo"].replace("", "Mensalista").fillna("Mensalista")
-        if "punicao" in df.columns: df["punicao"] = df["punicao"].replace("", "Não").fillna("Não")
-        if "nivel" in df.columns: 
-            df["nivel"] = pd.to_numeric(df["nivel"], errors='coerce').fillna(2).astype(int)
-            
+            return self._api(self.planilha.worksheet, sheet_name)
+        except gspread.exceptions.WorksheetNotFound:
+            if not criar: return None
+            return self._api(self.planilha.add_worksheet, title=sheet_name, rows=100, cols=20)
+
+    def ler(self, sheet_name):
+        worksheet = self._aba(sheet_name)
+        if worksheet is None: return None
+        return pd.DataFrame(self._api(worksheet.get_all_records))
+
+    def ler_varias(self, sheet_names):
+        try:
+            resposta = self._api(self.planilha.values_batch_get, list(sheet_names))
+        except (gspread.exceptions.APIError, gspread.exceptions.WorksheetNotFound) as e:
+            # Uma aba inexistente derruba o lote inteiro (400): refaz só com as que existem
+            if getattr(e, "code", 400) != 400: raise
+            existentes = {w.title for w in self._api(self.planilha.worksheets)}
+            resultado = {nome: None for nome in sheet_names if nome not in existentes}
+            faltam = [nome for nome in sheet_names if nome in existentes]
+            if len(faltam) == len(sheet_names): raise
+            if faltam: resultado.update(self.ler_varias(faltam))
+            return resultado
+        resultado = {}
+        for nome, intervalo in zip(sheet_names, resposta.get("valueRanges", [])):
+            resultado[nome] = registros_para_df(intervalo.get("values", []))
+        return resultado
+
+    def gravar(self, df, sheet_name):
+        worksheet = self._aba(sheet_name, criar=True)
+        dados = [df.columns.values.tolist()] + valores_planilha(df).values.tolist()
+        # Escreve por cima e só depois limpa o que sobrou: a aba nunca fica vazia no meio da gravação
+        self._api(worksheet.update, range_name='A1', values=dados)
+        sobras = []
+        if worksheet.row_count > len(dados): sobras.append(f"{len(dados) + 1}:{worksheet.row_count}")
+        if worksheet.col_count > len(df.columns):
+            inicio = gspread.utils.rowcol_to_a1(1, len(df.columns) + 1)[:-1]
+            fim = gspread.utils.rowcol_to_a1(1, worksheet.col_count)[:-1]
+            sobras.append(f"{inicio}:{fim}")
+        if sobras: self._api(worksheet.batch_clear, sobras)
+
+    def anexar(self, df, sheet_name):
+        worksheet = self._aba(sheet_name, criar=True)
+        cabecalho = self._api(worksheet.row_values, 1)
+        if not cabecalho:
+            return self.gravar(df, sheet_name)
+        novas = [c for c in df.columns if c not in cabecalho]
+        if novas:
+            cabecalho = cabecalho + novas
+            self._api(worksheet.update, range_name='A1', values=[cabecalho])
+        linhas = valores_planilha(df.reindex(columns=cabecalho)).values.tolist()
+        self._api(worksheet.append_rows, linhas, value_input_option="RAW", table_range="A1")
+
+    # Apaga só as linhas cuja chave (primeira coluna de `df`) está em df: lê uma coluna e
+    # remove as faixas de linhas de baixo para cima num único batch_update
+    def remover(self, df, sheet_name):
+        worksheet = self._aba(sheet_name)
+        if worksheet is None: return
+        coluna = df.columns[0]
+        cabecalho = self._api(worksheet.row_values, 1)
+        if coluna not in cabecalho: return
+        alvo = set(df[coluna].astype(str))
+        valores = self._api(worksheet.col_values, cabecalho.index(coluna) + 1)
+        self._apagar_linhas(worksheet, [r for r, v in enumerate(valores[1:], start=2) if str(v) in alvo])
+
+    def _apagar_linhas(self, worksheet, numeros):
+        faixas = []
+        for r in sorted(numeros):
+            if faixas and faixas[-1][1] == r - 1: faixas[-1][1] = r
+            else: faixas.append([r, r])
+        if not faixas: return
+        pedidos = [{"deleteDimension": {"range": {"sheetId": worksheet.id, "dimension": "ROWS", "startIndex": ini - 1, "endIndex": fim}}}
+                   for ini, fim in reversed(faixas)]
+        self._api(self.planilha.batch_update, {"requests": pedidos})
+
+    # Lê só as colunas-chave para achar as linhas; depois, no máximo três chamadas:
+    # um batch_update com as células alteradas, um append com as linhas novas e um com as remoções
+    def sincronizar(self, df, sheet_name):
+        worksheet = self._aba(sheet_name, criar=True)
+        chave = CHAVES_ABAS[sheet_name]
+        colunas = [c for c in df.columns if c not in COLUNAS_CONTROLE]
+        cabecalho = self._api(worksheet.row_values, 1)
+        if not cabecalho:
+            return self.gravar(df.loc[df["_acao"] != "apagar", colunas], sheet_name)
+        novas = [c for c in colunas if c not in cabecalho]
+        if novas:
+            cabecalho = cabecalho + novas
+            self._api(worksheet.update, range_name='A1', values=[cabecalho])
+        if any(c not in cabecalho for c in chave):
+            raise ValueError(f"A aba {sheet_name} não tem a coluna-chave {chave}; salve a tabela inteira uma vez.")
+        letras = [gspread.utils.rowcol_to_a1(1, cabecalho.index(c) + 1)[:-1] for c in chave]
+        lidas = self._api(worksheet.batch_get, [f"{l}2:{l}" for l in letras])
+        altura = max([len(col) for col in lidas] + [0])
+        lidas = [[(linha[0] if linha else "") for linha in col] + [""] * (altura - len(col)) for col in lidas]
+        linha_da_chave = {}
+        for r, k in enumerate(zip(*lidas), start=2): linha_da_chave.setdefault(tuple(str(v) for v in k), r)
+
+        valores = valores_planilha(df.reindex(columns=cabecalho)).values.tolist()
+        chaves = [tuple(str(v) for v in k) for k in valores_planilha(df[chave]).values.tolist()]
+        celulas, novas_linhas, apagar = [], [], []
+        for linha, k, acao, alteradas in zip(valores, chaves, df["_acao"], df["_colunas"]):
+            r = linha_da_chave.get(k)
+            if acao == "apagar":
+                if r is not None: apagar.append(r)
+            elif acao == "inserir" or r is None:
+                novas_linhas.append(linha)
+            else:
+                pos = [cabecalho.index(c) for c in str(alteradas).split("|") if c in cabecalho]
+                if not pos: continue
+                ini, fim = min(pos), max(pos)
+                intervalo = f"{gspread.utils.rowcol_to_a1(r, ini + 1)}:{gspread.utils.rowcol_to_a1(r, fim + 1)}"
+                celulas.append({"range": intervalo, "values": [linha[ini:fim + 1]]})
+        if celulas: self._api(worksheet.batch_update, celulas, value_input_option="RAW")
+        if novas_linhas: self._api(worksheet.append_rows, novas_linhas, value_input_option="RAW", table_range="A1")
+        self._apagar_linhas(worksheet, apagar)
+
+    # modifiedTime da planilha no Drive: uma chamada de metadados, sem baixar nenhuma célula
+    def revisao(self):
+        return self._api(self.planilha.get_lastUpdateTime)
+
+class ArmazenamentoSQL:
+    # Banco local embutido (SQLite). Com `espelho`, a planilha vira só um destino de sincronização:
+    # abas ausentes no banco são importadas dela uma vez e toda gravação é replicada para ela.
+    def __init__(self, caminho, espelho=None):
+        self.conn = sqlite3.connect(caminho, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.espelho = espelho
+
+    def _existe(self, sheet_name):
+        cur = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (sheet_name,))
+        return cur.fetchone() is not None
+
+    def _colunas(self, sheet_name):
+        return [r[1] for r in self.conn.execute(f'PRAGMA table_info("{sheet_name}")')]
+
+    # Idempotente: tabela criada antes deste índice (ou por um anexo) ganha o índice na primeira busca
+    def _indexar(self, sheet_name, colunas):
+        for chave in INDICES_ABAS.get(aba_base(sheet_name), []):
+            if all(c in colunas for c in chave):
+                expressao = ", ".join(texto_sql(c) for c in chave)
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{sheet_name}_{"_".join(chave)}_texto" ON "{sheet_name}" ({expressao})')
+
+    def _gravar_local(self, df, sheet_name):
+        valores_planilha(df).infer_objects().to_sql(sheet_name, self.conn, if_exists="replace", index=False)
+        self._indexar(sheet_name, df.columns)
+        self.conn.commit()
+
+    def ler(self, sheet_name):
+        with self.lock:
+            if self._existe(sheet_name):
+                return pd.read_sql(f'SELECT * FROM "{sheet_name}"', self.conn)
+        if self.espelho is None: return None
+        df = self.espelho.ler(sheet_name)
+        if df is not None and not df.empty:
+            with self.lock: self._gravar_local(df, sheet_name)
         return df
+
+    def ler_varias(self, sheet_names):
+        return {nome: self.ler(nome) for nome in sheet_names}
+
+    def gravar(self, df, sheet_name):
+        with self.lock: self._gravar_local(df, sheet_name)
+        if self.espelho is not None: self.espelho.gravar(df, sheet_name)
+
+    def anexar(self, df, sheet_name):
+        with self.lock:
+            if not self._existe(sheet_name):
+                self._gravar_local(df, sheet_name)
+            else:
+                existentes = self._colunas(sheet_name)
+                for col in df.columns:
+                    if col not in existentes:
+                        self.conn.execute(f"ALTER TABLE \"{sheet_name}\" ADD COLUMN \"{col}\" DEFAULT ''")
+                valores_planilha(df).infer_objects().to_sql(sheet_name, self.conn, if_exists="append", index=False)
+                self.conn.commit()
+        if self.espelho is not None: self.espelho.anexar(df, sheet_name)
+
+    def remover(self, df, sheet_name):
+        coluna = df.columns[0]
+        alvo = sorted(set(df[coluna].astype(str)))
+        with self.lock:
+            if self._existe(sheet_name) and alvo:
+                self._indexar(sheet_name, self._colunas(sheet_name))
+                marcas = ",".join("?" * len(alvo))
+                self.conn.execute(f'DELETE FROM "{sheet_name}" WHERE {texto_sql(coluna)} IN ({marcas})', alvo)
+                self.conn.commit()
+        if self.espelho is not None: self.espelho.remover(df, sheet_name)
+
+    def sincronizar(self, df, sheet_name):
+        chave = CHAVES_ABAS[sheet_name]
+        colunas = [c for c in df.columns if c not in COLUNAS_CONTROLE]
+        with self.lock:
+            if not self._existe(sheet_name):
+                self._gravar_local(df.loc[df["_acao"] != "apagar", colunas], sheet_name)
+            else:
+                existentes = self._colunas(sheet_name)
+                for col in colunas:
+                    if col not in existentes:
+                        self.conn.execute(f"ALTER TABLE \"{sheet_name}\" ADD COLUMN \"{col}\" DEFAULT ''")
+                self._indexar(sheet_name, existentes + colunas)
+                onde = " AND ".join(f"{texto_sql(c)} = ?" for c in chave)
+                valores = valores_planilha(df[colunas]).infer_objects()
+                for (_, linha), acao in zip(valores.iterrows(), df["_acao"]):
+                    k = [str(linha[c]) for c in chave]
+                    self.conn.execute(f'DELETE FROM "{sheet_name}" WHERE {onde}', k)
+                    if acao != "apagar":
+                        marcas = ",".join("?" * len(colunas))
+                        nomes = ",".join(f'"{c}"' for c in colunas)
+                        self.conn.execute(f'INSERT INTO "{sheet_name}" ({nomes}) VALUES ({marcas})', [linha[c].item() if hasattr(linha[c], "item") else linha[c] for c in colunas])
+                self.conn.commit()
+        if self.espelho is not None: self.espelho.sincronizar(df, sheet_name)
+
+    # data_version só muda quando outra conexão (outro processo) grava no banco;
+    # as gravações deste processo já chegam ao cache pela fila
+    def revisao(self):
+        with self.lock:
+            return str(self.conn.execute("PRAGMA data_version").fetchone()[0])
+
+# --- PLANILHA FALSA EM MEMÓRIA (TESTES / DESENVOLVIMENTO LOCAL) ---
+# Imita a parte da API do gspread usada pelo app, sem rede nem credenciais.
+class AbaFake:
+    def __init__(self, title, rows=100, cols=20, id=0):
+        self.title = title
+        self.id = id
+        self.valores = []
+        self.row_count = rows
+        self.col_count = cols
+        self.planilha = None
+
+    def _mudou(self):
+        if self.planilha is not None: self.planilha.alteracoes += 1
+
+    def get_all_records(self):
+        if len(self.valores) < 2: return []
+        cab = self.valores[0]
+        return [dict(zip(cab, linha + [""] * (len(cab) - len(linha)))) for linha in self.valores[1:]]
+
+    def get_all_values(self):
+        return [list(linha) for linha in self.valores]
+
+    def row_values(self, row):
+        return list(self.valores[row - 1]) if row <= len(self.valores) else []
+
+    def col_values(self, col):
+        return [linha[col - 1] if col <= len(linha) else "" for linha in self.valores]
+
+    # Só intervalos de uma coluna ("B2:B"), como o app usa
+    def batch_get(self, ranges, **kwargs):
+        resultado = []
+        for intervalo in ranges:
+            ini = intervalo.split(":")[0]
+            lin, col = gspread.utils.a1_to_rowcol(ini)
+            resultado.append([[l[col - 1]] if col <= len(l) and l[col - 1] != "" else [] for l in self.valores[lin - 1:]])
+        return resultado
+
+    def batch_update(self, data, **kwargs):
+        for item in data: self.update(range_name=item["range"], values=item["values"])
+
+    def clear(self):
+        self.valores = []
+        self._mudou()
+
+    def batch_clear(self, ranges):
+        for intervalo in ranges:
+            ini, fim = intervalo.split(":")
+            if ini.isdigit():
+                for r in range(int(ini) - 1, min(int(fim), len(self.valores))): self.valores[r] = []
+            else:
+                c_ini = gspread.utils.a1_to_rowcol(f"{ini}1")[1]
+                for linha in self.valores: del linha[c_ini - 1:]
+        while self.valores and not any(v != "" for v in self.valores[-1]): self.valores.pop()
+        self._mudou()
+
+    def append_rows(self, values, value_input_option="RAW", table_range=None):
+        self.update(range_name=f"A{len(self.valores) + 1}", values=values)
+
+    def update(self, range_name='A1', values=None, **kwargs):
+        lin, col = gspread.utils.a1_to_rowcol(range_name.split(":")[0])
+        for i, linha in enumerate(values or []):
+            r = lin - 1 + i
+            while len(self.valores) <= r: self.valores.append([])
+            atual = self.valores[r]
+            while len(atual) < col - 1 + len(linha): atual.append("")
+            atual[col - 1:col - 1 + len(linha)] = list(linha)
+        self.row_count = max(self.row_count, len(self.valores))
+        self.col_count = max([self.col_count] + [len(l) for l in self.valores])
+        self._mudou()
+
+class PlanilhaFake:
+    def __init__(self, abas=None):
+        self.abas = {}
+        self.alteracoes = 0
+        for nome, df in (abas or {}).items():
+            aba = self.add_worksheet(title=nome)
+            aba.update(values=[df.columns.tolist()] + valores_planilha(df).values.tolist())
+
+    def worksheet(self, title):
+        if title not in self.abas: raise gspread.exceptions.WorksheetNotFound(title)
+        return self.abas[title]
+
+    def worksheets(self):
+        return list(self.abas.values())
+
+    def values_batch_get(self, ranges, params=None):
+        for nome in ranges: self.worksheet(nome)
+        return {"valueRanges": [{"range": nome, "values": self.abas[nome].get_all_values()} for nome in ranges]}
+
+    def add_worksheet(self, title, rows=100, cols=20):
+        self.abas[title] = AbaFake(title, rows, cols, id=len(self.abas))
+        self.abas[title].planilha = self
+        self.alteracoes += 1
+        return self.abas[title]
+
+    # Faz o papel do metadado modifiedTime do Drive: muda a cada alteração em qualquer aba
+    def get_lastUpdateTime(self):
+        return f"rev-{self.alteracoes}"
+
+    def batch_update(self, body):
+        for pedido in body.get("requests", []):
+            faixa = pedido["deleteDimension"]["range"]
+            aba = next(a for a in self.abas.values() if a.id == faixa["sheetId"])
+            del aba.valores[faixa["startIndex"]:faixa["endIndex"]]
+            aba.row_count -= faixa["endIndex"] - faixa["startIndex"]
+            self.alteracoes += 1
+        return {}
+
+def criar_storage(grupo_id):
+    backend = config_grupo("storage_backend", "sheets", grupo_id)
+    if backend == "memoria":
+        return ArmazenamentoSheets(PlanilhaFake(), get_limitador(grupo_id))
+    if backend == "sqlite":
+        espelho = ArmazenamentoSheets(get_connection(grupo_id), get_limitador(grupo_id)) if config_grupo("sheets_sync", False, grupo_id) else None
+        return ArmazenamentoSQL(config_grupo("sqlite_path", "madrugao.db", grupo_id), espelho)
+    return ArmazenamentoSheets(get_connection(grupo_id), get_limitador(grupo_id))
+
+def get_storage():
+    return grupo_atual().storage
+
+# --- LEITURA DE DADOS (CACHE) ---
+MESES = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+TIMES = ["Verde", "Preto", "Ambos"]
+RESULTADOS = ["", "Verde", "Preto", "Empate"]  # também serve de "lado" (vazio = sem lado)
+
+# --- ESQUEMA DAS ABAS ---
+# Cada coluna: (tipo, padrão[, (mínimo, máximo)]). Tipos: "texto", "categoria" (aberta),
+# lista de categorias fixas, "int8"/"int16"/"int32", "id" (inteiro que pode faltar),
+# "real", "data" e "bool". Aplicado uma vez na carga; o DataFrame tipado é o que fica no cache.
+# Valor vazio, inválido ou fora da faixa vira o padrão.
+ESQUEMAS = {
+    "elenco": {
+        "nome": ("texto", ""), "time": (TIMES, "Ambos"), "tipo": (["Mensalista", "Diarista Frequente"], "Mensalista"),
+        "punicao": (["Não", "Sim"], "Não"), "nivel": ("int8", 2, (1, 3)),
+    },
+    # formato antigo (um ano, uma coluna por mês); só lido para migrar
+    "financeiro": {"nome": ("texto", ""), **{m: ("bool", False) for m in MESES}},
+    "pagamentos": {
+        "nome": ("texto", ""), "ano": ("int16", 0), "mes": ("int8", 1, (1, 12)), "pago_em": ("data", None), "valor": ("real", 0.0),
+    },
+    "saidas": {"id": ("id", None), "Data": ("data", None), "Descricao": ("texto", ""), "Valor": ("real", 0.0)},
+    "jogos": {
+        "id": ("id", None), "data": ("data", None), "jogador": ("categoria", ""), "tipo_registro": (["Jogo", "Justificado"], "Jogo"),
+        "gols": ("int16", 0, (0, 999)), "vencedor": (RESULTADOS, ""), "lado": (RESULTADOS, ""),
+    },
+    "estatisticas": {
+        "jogador": ("texto", ""), "gols": ("int32", 0), "jogos": ("int32", 0), "vitorias": ("int32", 0), "justificados": ("int32", 0),
+    },
+    "placar": {"resultado": ("texto", ""), "partidas": ("int32", 0)},
+    "ratings": {"jogador": ("texto", ""), "rating": ("real", 1500.0), "partidas": ("int32", 0)},
+    # resumo das temporadas encerradas (ver TEMPORADAS)
+    "temporadas": {
+        "ano": ("int16", 0), "jogador": ("texto", ""), "gols": ("int32", 0), "jogos": ("int32", 0), "vitorias": ("int32", 0), "justificados": ("int32", 0),
+    },
+    "placar_temporadas": {"ano": ("int16", 0), "resultado": ("texto", ""), "partidas": ("int32", 0)},
+}
+COLUNAS_ABAS = {aba: list(esquema) for aba, esquema in ESQUEMAS.items()}
+
+# Partições de temporada ("jogos_2024") seguem o esquema e os índices da aba de jogos
+def aba_base(sheet_name):
+    return "jogos" if sheet_name.startswith("jogos_") and sheet_name[6:].isdigit() else sheet_name
+
+def converter_coluna(serie, regra):
+    tipo, padrao = regra[0], regra[1]
+    vazio = serie.isna() | serie.astype(str).str.strip().eq("")
+    if isinstance(tipo, list):
+        texto = serie.astype(str).str.strip()
+        return texto.where(~vazio & texto.isin(tipo), padrao).astype(pd.CategoricalDtype(tipo))
+    if tipo == "texto":
+        return serie.where(~vazio, padrao).astype(str)
+    if tipo == "categoria":
+        return serie.where(~vazio, padrao).astype(str).astype("category")
+    if tipo == "bool":
+        return serie.astype(str).str.strip().str.upper().isin(["TRUE", "1", "SIM"])
+    if tipo == "data":
+        return pd.to_datetime(serie.where(~vazio), errors="coerce", format="mixed").astype("datetime64[ns]")
+    numeros = pd.to_numeric(serie.where(~vazio), errors="coerce")
+    if len(regra) > 2: numeros = numeros.where(numeros.between(*regra[2]))
+    if tipo == "real": return numeros.fillna(padrao).astype("float64")
+    if tipo == "id": return numeros.round().astype("Int64")
+    return numeros.fillna(padrao).round().astype(tipo)
+
+def tipar_dados(df, sheet_name):
+    esquema = ESQUEMAS.get(aba_base(sheet_name), {})
+    if df is None or df.empty:
+        df = pd.DataFrame(columns=list(esquema) if df is None else list(dict.fromkeys(list(esquema) + list(df.columns))))
+    else:
+        df = df.copy()
+    for col, regra in esquema.items():
+        df[col] = converter_coluna(df[col] if col in df.columns else pd.Series("", index=df.index, dtype=object), regra)
+    return df
+
+# --- CACHE POR ABA (VERSIONADO) ---
+# Cada aba tem um contador de geração. Gravar numa aba só avança o contador dela (e já deixa
+# o dado novo no cache), então as outras continuam quentes. Uma leitura que começou antes de
+# uma gravação não sobrescreve o dado mais novo.
+# Cada entrada guarda a revisão da fonte (ver SondaRevisao) vista quando a leitura começou: ela
+# vale até a sonda trazer uma revisão diferente. Sem revisão conhecida, vale o `ttl` de antes.
+# Todo DataFrame entregue leva a marca do conteúdo em df.attrs["marca"]: é a versão-base que
+# a sessão editou, conferida na gravação (compare-and-swap, ver `escrever`).
+class ConflitoGravacao(Exception):
+    pass
+
+class CacheAbas:
+    def __init__(self, ttl=60, snapshot=None):
+        self.ttl = ttl
+        self.snapshot = snapshot
+        self.lock = threading.Lock()
+        self.entradas = {}
+        self.versoes = {}
+        self.reservas = {}
+        self.revisao = None
+
+    def versao(self, sheet_name):
+        return self.versoes.get(sheet_name, 0)
+
+    # Devolve True se a fonte mudou desde a última revisão conhecida
+    def nova_revisao(self, revisao):
+        with self.lock:
+            mudou = self.revisao is not None and revisao != self.revisao
+            self.revisao = revisao
+            return mudou
+
+    # Gravação do próprio app levou a fonte de `antes` para `depois`: o que estava em dia em
+    # `antes` continua em dia. Se a fonte já não estava em `antes` (alguém editou por fora),
+    # nada muda aqui e a próxima sonda vence o cache como sempre.
+    def avancar_revisao(self, antes, depois):
+        if antes is None or depois is None: return
+        with self.lock:
+            if self.revisao not in (antes, depois): return
+            self.revisao = depois
+            for entrada in self.entradas.values():
+                if entrada["revisao"] == antes: entrada["revisao"] = depois
+
+    def _vencida(self, entrada):
+        # A cópia do disco pode ser de ontem: só segura a tela enquanto a revalidação não chega
+        if self.revisao is None or entrada["origem"] == "disco":
+            return time.time() - entrada["lido_em"] > self.ttl
+        return entrada["revisao"] != self.revisao
+
+    def _copia(self, entrada):
+        df = entrada["df"].copy()
+        df.attrs["marca"] = (entrada["versao"], entrada["lido_em"])
+        return df
+
+    # `fixo`: a aba tem gravação pendente, então o cache (otimista) vale mais que a fonte
+    def obter(self, sheet_name, fixo=False):
+        with self.lock:
+            entrada = self.entradas.get(sheet_name)
+            if entrada is None or entrada["versao"] != self.versao(sheet_name): return None
+            if not fixo and self._vencida(entrada): return None
+            return self._copia(entrada)
+
+    # Marca `df` (do chamador) com a marca da entrada; leitura atropelada por gravação fica com
+    # uma marca que nunca confere, e a edição feita sobre ela passa pelo rebase
+    def guardar(self, sheet_name, df, versao, revisao=None):
+        with self.lock:
+            if versao != self.versao(sheet_name):
+                df.attrs["marca"] = (versao, None)
+                return
+            self.entradas[sheet_name] = {"df": df.copy(), "versao": versao, "lido_em": time.time(), "origem": "leitura", "revisao": revisao}
+            self.reservas[sheet_name] = self.entradas[sheet_name]
+            df.attrs["marca"] = (versao, self.entradas[sheet_name]["lido_em"])
+        if self.snapshot is not None: self.snapshot.salvar(sheet_name, df)
+
+    # Partida a frio: a cópia do disco vale como dado (velho) até a revalidação trazer o da fonte
+    def semear(self, sheet_name, df, salvo_em):
+        with self.lock:
+            if sheet_name in self.entradas:
+                df.attrs["marca"] = (self.versao(sheet_name), None)
+                return
+            self.entradas[sheet_name] = {"df": df.copy(), "versao": self.versao(sheet_name), "lido_em": time.time(), "origem": "disco", "salvo_em": salvo_em, "revisao": None}
+            self.reservas[sheet_name] = self.entradas[sheet_name]
+            df.attrs["marca"] = (self.versao(sheet_name), self.entradas[sheet_name]["lido_em"])
+
+    def de_disco(self):
+        with self.lock:
+            return {nome: e["salvo_em"] for nome, e in self.entradas.items() if e["origem"] == "disco" and e["versao"] == self.versao(nome)}
+
+    # Compare-and-swap: `base` é a marca do DataFrame que a sessão carregou e editou. Se a aba
+    # mudou depois disso, `rebasear(atual)` refaz a edição sobre o conteúdo mais novo (ou levanta
+    # ConflitoGravacao); sem `rebasear`, a gravação é recusada. Devolve o df que ficou no cache.
+    def escrever(self, sheet_name, df, base=None, rebasear=None):
+        with self.lock:
+            entrada = self.entradas.get(sheet_name)
+            if entrada is not None and entrada["versao"] != self.versao(sheet_name): entrada = None
+            if base is not None and (entrada is None or base != (entrada["versao"], entrada["lido_em"])):
+                if rebasear is None or entrada is None:
+                    raise ConflitoGravacao(f"A aba {sheet_name} foi alterada por outra pessoa enquanto você editava. Recarregue e refaça a alteração.")
+                df = rebasear(entrada["df"].copy())
+            self.versoes[sheet_name] = self.versao(sheet_name) + 1
+            self.entradas[sheet_name] = {"df": df.copy(), "versao": self.versoes[sheet_name], "lido_em": time.time(), "origem": "escrita", "revisao": self.revisao}
+            self.reservas[sheet_name] = self.entradas[sheet_name]
+            return df
+
+    # Anexo não apaga nada de ninguém; o único choque possível é de id (duas súmulas no mesmo
+    # segundo, dois lançamentos no Cofre ao mesmo tempo): ids repetidos ganham números livres.
+    # Devolve as linhas como devem ir para a fonte.
+    def anexar(self, sheet_name, df_novos):
+        with self.lock:
+            entrada = self.entradas.get(sheet_name)
+            self.versoes[sheet_name] = self.versao(sheet_name) + 1
+            if entrada is None or entrada["versao"] != self.versoes[sheet_name] - 1:
+                self.entradas.pop(sheet_name, None)
+                return df_novos
+            df_novos = renumerar_ids(entrada["df"], df_novos)
+            df = pd.concat([entrada["df"], df_novos], ignore_index=True)
+            # Categorias abertas (ex.: jogador) com valores novos viram object no concat
+            for col in df.columns:
+                if isinstance(entrada["df"][col].dtype, pd.CategoricalDtype) and df[col].dtype == object:
+                    df[col] = df[col].astype("category")
+            self.entradas[sheet_name] = {"df": df, "versao": self.versoes[sheet_name], "lido_em": entrada["lido_em"], "origem": "escrita", "revisao": entrada["revisao"]}
+            self.reservas[sheet_name] = self.entradas[sheet_name]
+            return df_novos
+
+    def remover(self, sheet_name, chaves):
+        coluna = chaves.columns[0]
+        with self.lock:
+            entrada = self.entradas.get(sheet_name)
+            self.versoes[sheet_name] = self.versao(sheet_name) + 1
+            if entrada is None or entrada["versao"] != self.versoes[sheet_name] - 1:
+                self.entradas.pop(sheet_name, None)
+                return
+            df = entrada["df"]
+            df = df[~df[coluna].astype(str).isin(set(chaves[coluna].astype(str)))].reset_index(drop=True)
+            self.entradas[sheet_name] = {"df": df, "versao": self.versoes[sheet_name], "lido_em": entrada["lido_em"], "origem": "escrita", "revisao": entrada["revisao"]}
+            self.reservas[sheet_name] = self.entradas[sheet_name]
+
+    # Identifica o conteúdo atual da aba no cache (muda a cada gravação ou releitura)
+    def marca(self, sheet_name):
+        with self.lock:
+            entrada = self.entradas.get(sheet_name)
+            return None if entrada is None else (entrada["versao"], entrada["lido_em"])
+
+    # Chamado depois que a fila gravou a aba: o que veio de escrita já é a verdade;
+    # o que foi lido da fonte no meio do caminho pode estar velho
+    def confirmar(self, sheet_name):
+        with self.lock:
+            entrada = self.entradas.get(sheet_name)
+            if entrada is not None and entrada["origem"] == "escrita":
+                if self.snapshot is not None: self.snapshot.salvar(sheet_name, entrada["df"])
+                return
+        self.invalidar(sheet_name)
+
+    # Última cópia boa conhecida, mesmo vencida: melhor que tabela vazia quando o Google recusa
+    def reserva(self, sheet_name):
+        with self.lock:
+            entrada = self.reservas.get(sheet_name)
+            return None if entrada is None else (self._copia(entrada), entrada["lido_em"])
+
+    def invalidar(self, sheet_name):
+        with self.lock:
+            self.versoes[sheet_name] = self.versao(sheet_name) + 1
+            self.entradas.pop(sheet_name, None)
+
+def get_cache():
+    return grupo_atual().cache
+
+# --- DETECÇÃO DE MUDANÇAS (SONDA DE REVISÃO) ---
+# Em vez de baixar as abas de novo a cada minuto, pergunta à fonte só "mudou algo?" (um
+# metadado barato), no máximo uma vez por intervalo por grupo. As abas só são relidas quando
+# a resposta muda, e aí edições feitas direto na planilha aparecem no próximo rerun.
+class SondaRevisao:
+    def __init__(self, storage, cache, intervalo=10):
+        self.storage = storage
+        self.cache = cache
+        self.intervalo = intervalo
+        self.lock = threading.Lock()
+        self.ultima = 0.0
+
+    def verificar(self):
+        with self.lock:
+            if time.time() - self.ultima < self.intervalo: return
+            self.ultima = time.time()
+        try:
+            revisao = self.storage.revisao()
+        except Exception:
+            return  # sem resposta, mantém a revisão conhecida e tenta no próximo intervalo
+        if revisao is not None: self.cache.nova_revisao(revisao)
+
+def get_sonda():
+    return grupo_atual().sonda
+
+# --- CÓPIA EM DISCO (PARTIDA A FRIO) ---
+# A última cópia boa de cada aba fica em Parquet (com os tipos do esquema). Depois de um
+# redeploy, o primeiro acesso mostra essa cópia na hora e a leitura da fonte roda em segundo plano.
+class SnapshotDisco:
+    def __init__(self, pasta):
+        self.pasta = pasta
+        os.makedirs(pasta, exist_ok=True)
+
+    def _arquivo(self, sheet_name):
+        return os.path.join(self.pasta, f"{sheet_name}.parquet")
+
+    def salvar(self, sheet_name, df):
+        try:
+            temp = self._arquivo(sheet_name) + f".{threading.get_ident()}.tmp"
+            df.to_parquet(temp, index=False)
+            os.replace(temp, self._arquivo(sheet_name))
+        except Exception:
+            pass  # a cópia em disco é só um atalho; falhar aqui não pode derrubar a leitura
+
+    def carregar(self, sheet_name):
+        arquivo = self._arquivo(sheet_name)
+        if not os.path.exists(arquivo): return None
+        try:
+            return pd.read_parquet(arquivo), os.path.getmtime(arquivo)
+        except Exception:
+            return None
+
+def get_snapshot():
+    return grupo_atual().snapshot
+
+class Revalidador:
+    def __init__(self, storage, cache):
+        self.storage = storage
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.em_voo = set()
+
+    def pedir(self, sheet_names):
+        with self.lock:
+            novas = [n for n in sheet_names if n not in self.em_voo]
+            self.em_voo.update(novas)
+        if novas:
+            versoes = {n: self.cache.versao(n) for n in novas}
+            threading.Thread(target=self._ler, args=(versoes, self.cache.revisao), daemon=True, name="revalidacao").start()
+
+    def _ler(self, versoes, revisao):
+        try:
+            brutos = self.storage.ler_varias(list(versoes))
+            for nome, versao in versoes.items():
+                self.cache.guardar(nome, tipar_dados(brutos.get(nome), nome), versao, revisao)
+        except Exception:
+            pass  # segue com a cópia do disco; quando ela vencer, a leitura normal tenta de novo
+        finally:
+            with self.lock: self.em_voo.difference_update(versoes)
+
+def get_revalidador():
+    return grupo_atual().revalidador
+
+def ler_abas(storage, sheet_names):
+    try:
+        return storage.ler_varias(sheet_names)
     except Exception as e:
-        if "429" in str(e):
-            time.sleep(2)
-            st.warning("Muitos acessos. Aguardando Google liberar...")
+        if erro_temporario(e):
+            st.warning("Muitos acessos. O Google não liberou a leitura agora; mostrando a última cópia salva.")
+        else:
+            st.error(f"Erro ao ler dados: {e}")
+        return {}
+
+# Uma única leitura em lote por rerun, e só das abas que não estão no cache
+def load_all_data(abas=tuple(ESQUEMAS)):
+    grupo = grupo_atual()
+    cache = grupo.cache
+    grupo.sonda.verificar()
+    revisao = cache.revisao
+    pendentes = grupo.fila.abas_pendentes()
+    dados = {}
+    faltam = {}
+    for nome in abas:
+        df = cache.obter(nome, fixo=nome in pendentes)
+        if df is None: faltam[nome] = cache.versao(nome)
+        else: dados[nome] = df
+    # Aba que nunca foi lida neste grupo (processo recém-iniciado ou grupo recém-despejado): serve a cópia do disco e revalida em segundo plano
+    frias = [nome for nome in faltam if cache.reserva(nome) is None]
+    if frias:
+        snapshot = grupo.snapshot
+        for nome in frias:
+            copia = snapshot.carregar(nome)
+            if copia is None: continue
+            dados[nome] = tipar_dados(copia[0], nome)
+            cache.semear(nome, dados[nome], copia[1])
+            del faltam[nome]
+        grupo.revalidador.pedir([nome for nome in frias if nome in dados])
+    if faltam:
+        brutos = ler_abas(grupo.storage, list(faltam))
+        for nome, versao in faltam.items():
+            reserva = cache.reserva(nome)
+            if nome not in brutos and reserva is not None:
+                dados[nome] = reserva[0]
+                continue
+            dados[nome] = tipar_dados(brutos.get(nome), nome)
+            if nome in brutos: cache.guardar(nome, dados[nome], versao, revisao)
+            # Leitura falhou: tabela vazia que não pode servir de base para reescrever a aba
+            else: dados[nome].attrs["marca"] = (versao, None)
+    return dados
+
+def load_data(sheet_name):
+    return load_all_data((sheet_name,))[sheet_name]
+
+# Estrutura derivada de uma aba (índice, saldos...): refeita só quando o conteúdo dela no cache muda
+def derivado(sheet_name, construir):
+    df = load_data(sheet_name)
+    marca = get_cache().marca(sheet_name)
+    memo = st.session_state.get(f"derivado_{sheet_name}")
+    if memo is None or marca is None or memo[0] != marca:
+        memo = (marca, construir(df))
+        st.session_state[f"derivado_{sheet_name}"] = memo
+    return memo[1]
+
+# --- FILA DE GRAVAÇÃO (WRITE-BEHIND) ---
+# As gravações vão para uma thread de fundo e a tela segue na hora com o cache já atualizado.
+# Gravações repetidas na mesma aba que ainda não saíram da fila são fundidas:
+# uma reescrita completa absorve tudo o que estava pendente, e anexos (ou remoções) seguidos se somam.
+class FilaGravacao:
+    def __init__(self, storage, cache):
+        self.storage = storage
+        self.cache = cache
+        self.cond = threading.Condition()
+        self.pendentes = []
+        self.em_andamento = None
+        self.status = {}
+        self.seq = itertools.count(1)
+        self.thread = None
+        self._iniciar()
+
+    def _iniciar(self):
+        self.ativa = True
+        atexit.register(self.drenar, 10)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, daemon=True, name="fila-gravacao")
+            self.thread.start()
+
+    # Grupo despejado: a thread sai assim que a fila esvaziar e solta a referência do atexit,
+    # então o cache do grupo pode ser liberado. Um envio atrasado religa a fila.
+    def encerrar(self):
+        with self.cond:
+            self.ativa = False
+            self.cond.notify_all()
+        atexit.unregister(self.drenar)
+
+    def enviar(self, tipo, sheet_name, df):
+        with self.cond:
+            if not self.ativa: self._iniciar()
+            job_id = next(self.seq)
+            mesma_aba = [j for j in self.pendentes if j["aba"] == sheet_name]
+            if tipo == "gravar" and mesma_aba:
+                alvo = mesma_aba[0]
+                for j in mesma_aba[1:]:
+                    alvo["ids"] += j["ids"]; self.pendentes.remove(j)
+                alvo.update(tipo="gravar", df=df.copy())
+                alvo["ids"].append(job_id)
+            elif tipo == "anexar" and mesma_aba and mesma_aba[-1]["tipo"] in ("gravar", "anexar"):
+                alvo = mesma_aba[-1]
+                alvo["df"] = pd.concat([alvo["df"], df], ignore_index=True)
+                alvo["ids"].append(job_id)
+            elif tipo == "remover" and mesma_aba and mesma_aba[-1]["tipo"] == "remover":
+                alvo = mesma_aba[-1]
+                alvo["df"] = pd.concat([alvo["df"], df], ignore_index=True)
+                alvo["ids"].append(job_id)
+            else:
+                self.pendentes.append({"tipo": tipo, "aba": sheet_name, "df": df.copy(), "ids": [job_id]})
+            self.status[job_id] = {"estado": "pendente", "aba": sheet_name, "erro": None, "fim": None}
+            self.cond.notify()
+        return job_id
+
+    # Segura a fila enquanto a gravação confere a base no cache e enfileira: os trabalhos
+    # entram na fila na mesma ordem em que as trocas aconteceram no cache
+    def em_ordem(self):
+        return self.cond
+
+    def abas_pendentes(self):
+        with self.cond:
+            abas = {j["aba"] for j in self.pendentes}
+            if self.em_andamento: abas.add(self.em_andamento["aba"])
+            return abas
+
+    def consultar(self, job_ids):
+        with self.cond:
+            return {i: dict(self.status[i]) for i in job_ids if i in self.status}
+
+    def drenar(self, timeout=None):
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pendentes and self.em_andamento is None, timeout)
+
+    # Revisão da fonte em volta de cada gravação: a gravação da fila não pode vencer o cache
+    # das outras abas. Sem resposta, a próxima sonda decide.
+    def _revisao(self):
+        try:
+            return self.storage.revisao()
+        except Exception:
+            return None
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pendentes or not self.ativa)
+                if not self.pendentes:
+                    self.thread = None
+                    return
+                job = self.em_andamento = self.pendentes.pop(0)
             try:
-                return load_data.__wrapped__(sheet_name, expected_cols)
-            except:
-                return pd.DataFrame(columns=expected_cols)
-        st.error(f"Erro ao ler dados ({sheet_name}): {e}")
-        return pd.DataFrame(columns=expected_cols)
+                antes = self._revisao()
+                getattr(self.storage, job["tipo"])(job["df"], job["aba"])
+                estado, erro = "ok", None
+                self.cache.confirmar(job["aba"])
+                self.cache.avancar_revisao(antes, self._revisao())
+            except Exception as e:
+                estado, erro = "erro", str(e)
+                # Descarta o otimismo: a próxima leitura volta a mostrar o que está de fato salvo
+                self.cache.invalidar(job["aba"])
+            with self.cond:
+                for i in job["ids"]:
+                    self.status[i].update(estado=estado, erro=erro, fim=time.time())
+                self.em_andamento = None
+                velhos = [i for i, st_ in self.status.items() if st_["fim"] and time.time() - st_["fim"] > 600]
+                for i in velhos: del self.status[i]
+                self.cond.notify_all()
+
+def get_fila():
+    return grupo_atual().fila
+
+def registrar_gravacao(job_id):
+    st.session_state.setdefault("gravacoes", []).append(job_id)
+
+# --- GRUPOS ATIVOS NO PROCESSO (LRU) ---
+# Tudo o que guarda dados de uma pelada (armazenamento, cache de abas, sonda, cópia em disco,
+# fila, entrosamento, corridas) fica num Grupo. O registro mantém só os grupos em uso: passando de `max_ativos`, ou parado há mais de `ocioso` segundos,
+# o grupo menos usado sai e a memória dele vai junto. Quem volta depois parte da cópia em disco.
+# Sai só grupo sem gravação na fila e parado há pelo menos MIN_OCIOSO_DESPEJO segundos, para
+# não tirar o grupo de debaixo de uma sessão no meio de um rerun.
+MIN_OCIOSO_DESPEJO = 60
+
+class Grupo:
+    def __init__(self, grupo_id):
+        self.id = grupo_id
+        self.storage = criar_storage(grupo_id)
+        self.snapshot = SnapshotDisco(os.path.join(st.secrets.get("snapshot_dir", ".cache_madrugao"), grupo_id))
+        self.cache = CacheAbas(ttl=60, snapshot=self.snapshot)
+        self.sonda = SondaRevisao(self.storage, self.cache, float(config_grupo("intervalo_sonda", 10, grupo_id)))
+        self.revalidador = Revalidador(self.storage, self.cache)
+        self.fila = FilaGravacao(self.storage, self.cache)
+        self.entrosamento = Entrosamento()
+        self.corridas = {}
+        self.usado_em = time.time()
+
+class RegistroGrupos:
+    def __init__(self, max_ativos=8, ocioso=1800):
+        self.max_ativos = max_ativos
+        self.ocioso = ocioso
+        self.lock = threading.Lock()
+        self.ativos = OrderedDict()
+        self.montando = {}
+
+    def obter(self, grupo_id):
+        with self.lock:
+            grupo = self.ativos.get(grupo_id)
+            if grupo is not None:
+                self.ativos.move_to_end(grupo_id)
+                grupo.usado_em = time.time()
+                self._despejar()
+                return grupo
+            trava = self.montando.setdefault(grupo_id, threading.Lock())
+        # Montar pode abrir a planilha: só espera quem pediu o mesmo grupo
+        with trava:
+            with self.lock: grupo = self.ativos.get(grupo_id)
+            if grupo is None:
+                grupo = Grupo(grupo_id)
+                with self.lock:
+                    self.ativos[grupo_id] = grupo
+                    self.montando.pop(grupo_id, None)
+                    self._despejar()
+        return grupo
+
+    # Do menos usado para o mais usado; para no primeiro que ainda deve ficar
+    def _despejar(self):
+        agora = time.time()
+        for grupo_id, grupo in list(self.ativos.items())[:-1]:
+            parado = agora - grupo.usado_em
+            if parado < MIN_OCIOSO_DESPEJO or (parado < self.ocioso and len(self.ativos) <= self.max_ativos): break
+            if grupo.fila.abas_pendentes(): continue
+            del self.ativos[grupo_id]
+            grupo.fila.encerrar()
+
+    def resumo(self):
+        with self.lock: return list(self.ativos)
+
+@st.cache_resource
+def get_grupos():
+    return RegistroGrupos(int(st.secrets.get("grupos_max_ativos", 8)), float(st.secrets.get("grupos_ocioso", 1800)))
+
+def grupo_atual():
+    return get_grupos().obter(st.session_state["grupo"])
 
 # --- SALVAR DADOS ---
-def save_data(df, sheet_name):
+# Várias sessões (admin, moderador, tesoureiro) gravam ao mesmo tempo sem trava global: cada
+# gravação leva a marca da versão que a sessão carregou (df.attrs["marca"]) e o cache faz o
+# compare-and-swap. Mudanças por chave são refeitas sobre a versão nova; reescrita completa
+# sobre versão velha é recusada.
+
+# `base`: marca do DataFrame de onde `df` saiu; sem ela, grava incondicionalmente (dado derivado).
+# `rebasear(atual)`: refaz `df` sobre a versão mais nova quando a base ficou velha (ver CacheAbas.escrever)
+def save_data(df, sheet_name, base=None, rebasear=None):
+    def refazer(atual):
+        nonlocal df
+        df = rebasear(atual)
+        return tipar_dados(df, sheet_name)
     try:
-        sh = get_connection()
-        try:
-            worksheet = sh.worksheet(sheet_name)
-        except:
-            worksheet = sh.add_worksheet(title=sheet_name, rows=100, cols=20)
-        
-        worksheet.clear()
-        dados = [df.columns.values.tolist()] + df.values.tolist()
-        worksheet.update(range_name='A1', values=dados)
-        time.sleep(2) 
-        st.cache_data.clear()
+        grupo = grupo_atual()
+        with grupo.fila.em_ordem():
+            grupo.cache.escrever(sheet_name, tipar_dados(df, sheet_name), base, refazer if rebasear else None)
+            registrar_gravacao(grupo.fila.enviar("gravar", sheet_name, df))
         return True
+    except ConflitoGravacao as e:
+        st.warning(str(e))
+        return False
     except Exception as e:
         st.error(f"Erro ao salvar ({sheet_name}): {e}")
         return False
 
-# --- FUNÇÕES VISUAIS DE GERAÇÃO DE IMAGEM ---
-def gerar_imagem_bonita(df, titulo="Relatório"):
-    cor_cabecalho = '#1b5e20' 
-    cor_texto_cabecalho = 'white'
-    cor_linha_par = '#f1f8e9' 
-    cor_linha_impar = 'white'
-    
-    fig, ax = plt.subplots(figsize=(12, len(df) * 0.8 + 2)) 
-    ax.axis('tight')
-    ax.axis('off')
-    
-    plt.title(titulo.upper(), fontsize=20, weight='bold', color='#1b5e20', pad=25)
-    tabela = ax.table(cellText=df.values, colLabels=df.columns, loc='center', cellLoc='center')
-    tabela.auto_set_font_size(False); tabela.set_fontsize(14); tabela.scale(1.2, 2.0)
-    
-    for (row, col), cell in tabela.get_celld().items():
-        cell.set_edgecolor('#cfd8dc'); cell.set_linewidth(1)
-        if row == 0:
-            cell.set_facecolor(cor_cabecalho); cell.set_text_props(color=cor_texto_cabecalho, weight='bold'); cell.set_height(0.12)
+# Acrescenta só as linhas novas: o custo não cresce com o histórico
+def append_data(df_novos, sheet_name):
+    try:
+        grupo = grupo_atual()
+        with grupo.fila.em_ordem():
+            df_novos = grupo.cache.anexar(sheet_name, tipar_dados(df_novos, sheet_name))
+            registrar_gravacao(grupo.fila.enviar("anexar", sheet_name, df_novos))
+        return True
+    except Exception as e:
+        st.error(f"Erro ao salvar ({sheet_name}): {e}")
+        return False
+
+# Ids do anexo que já existem na aba ganham os próximos números livres; linhas com o mesmo
+# id (as de uma partida) continuam juntas
+def renumerar_ids(atual, novos):
+    if "id" not in novos.columns or "id" not in atual.columns: return novos
+    existentes = set(atual["id"].dropna().astype("int64"))
+    choques = [int(i) for i in novos["id"].dropna().unique() if int(i) in existentes]
+    if not choques: return novos
+    livre = max(existentes | set(novos["id"].dropna().astype("int64"))) + 1
+    novos = novos.copy()
+    novos["id"] = novos["id"].replace({i: livre + n for n, i in enumerate(choques)})
+    return novos
+
+# Números comparados como float: 50 (lido da planilha) e 50.0 (vindo do editor) são iguais
+def comparavel(df):
+    return valores_planilha(df.apply(lambda c: c.astype(float) if pd.api.types.is_numeric_dtype(c) and not pd.api.types.is_bool_dtype(c) else c)).astype(str)
+
+# Conjunto de mudanças entre a tabela carregada e a editada, pela chave estável da aba:
+# uma linha por registro inserido/alterado/apagado, com "_acao" e as colunas que mudaram.
+# Devolve None quando a chave não serve (vazia ou repetida) e só a reescrita completa é segura.
+def calcular_mudancas(antes, depois, sheet_name):
+    chave = CHAVES_ABAS[sheet_name]
+    antes = tipar_dados(antes, sheet_name).reset_index(drop=True)
+    depois = tipar_dados(depois, sheet_name).reset_index(drop=True)
+    a = comparavel(antes).set_index(chave)
+    d = comparavel(depois).set_index(chave)
+    if not a.index.is_unique or not d.index.is_unique or (d.reset_index()[chave] == "").any(axis=None): return None
+    resto = [c for c in d.columns if c in a.columns]
+    novo = ~d.index.isin(a.index)
+    sumiu = ~a.index.isin(d.index)
+    dif = pd.DataFrame(a.reindex(d.index[~novo])[resto].values != d.loc[~novo, resto].values, columns=resto)
+    mudou = dif.any(axis=1).values
+    return pd.concat([
+        depois[novo].assign(_acao="inserir", _colunas=""),
+        depois[~novo][mudou].assign(_acao="atualizar", _colunas=["|".join(dif.columns[m]) for m in dif.values[mudou]]),
+        antes[sumiu].assign(_acao="apagar", _colunas=""),
+    ], ignore_index=True)
+
+# Rebase: refaz sobre `atual` (a aba como está agora) as mudanças calculadas a partir de `antes`.
+# Colunas diferentes da mesma linha se somam. É conflito mexer em célula que a outra gravação
+# também mudou, editar linha que ela apagou (ou apagar linha que ela editou) e inserir uma chave
+# que já apareceu com outro conteúdo; em abas com chave "id", a linha nova só ganha outro id.
+# Devolve (aba refeita, mudanças a enviar) ou levanta ConflitoGravacao com as chaves em choque.
+def rebasear_mudancas(atual, antes, mudancas, sheet_name):
+    chave = CHAVES_ABAS[sheet_name]
+    colunas = [c for c in mudancas.columns if c not in COLUNAS_CONTROLE]
+    atual = tipar_dados(atual, sheet_name).reset_index(drop=True)
+    a = comparavel(tipar_dados(antes, sheet_name)).set_index(chave)
+    n = comparavel(atual).set_index(chave)
+    m = comparavel(mudancas[colunas]).set_index(chave)
+    if not n.index.is_unique:
+        raise ConflitoGravacao(f"A aba {sheet_name} está com chaves repetidas agora. Recarregue antes de salvar.")
+    linha_de = dict(zip(n.index, range(len(n))))
+    comuns = [c for c in a.columns if c in n.columns]
+    novo = atual.astype(object)
+    proximo_id = None
+    if chave == ["id"]:
+        ids = pd.concat([atual["id"], tipar_dados(mudancas, sheet_name)["id"]]).dropna()
+        proximo_id = int(ids.max()) + 1 if len(ids) else 1
+    saida, apagar, conflitos = [], [], []
+    for i, (k, acao, alteradas) in enumerate(zip(m.index, mudancas["_acao"], mudancas["_colunas"])):
+        linha = mudancas.iloc[i].copy()
+        r = linha_de.get(k)
+        if acao == "inserir":
+            if r is not None and proximo_id is not None:
+                linha["id"] = proximo_id; proximo_id += 1
+            elif r is not None:
+                if not (n.iloc[r][m.columns] == m.iloc[i]).all(): conflitos.append(k)
+                continue
+            saida.append(linha)
+            continue
+        if r is None:
+            if acao == "atualizar": conflitos.append(k)
+            continue  # apagar o que a outra sessão já apagou
+        outras = {c for c in comuns if a.loc[k][c] != n.iloc[r][c]}
+        if acao == "apagar":
+            if outras: conflitos.append(k)
+            else: apagar.append(r); saida.append(linha)
         else:
-            cell.set_height(0.1)
-            if row % 2 == 0: cell.set_facecolor(cor_linha_par)
-            else: cell.set_facecolor(cor_linha_impar)
-    
-    buf = io.BytesIO(); plt.savefig(buf, format='png', bbox_inches='tight', dpi=300, transparent=False); buf.seek(0)
-    return buf
-
-def gerar_card_jogo(data_jogo, placar_verde, placar_preto, gols_map, df_elenco):
-    art_verde = []; art_preto = []
-    for jogador, gols in gols_map.items():
-        if gols > 0:
-            time_jogador = "Indefinido"
-            if not df_elenco.empty:
-                row = df_elenco[df_elenco['nome'] == jogador]
-                if not row.empty: time_jogador = row.iloc[0]['time']
-            txt = f"{jogador}" if gols == 1 else f"{jogador} ({gols})"
-            if time_jogador == 'Verde': art_verde.append(txt)
-            else: art_preto.append(txt)
-
-    fig, ax = plt.subplots(figsize=(10, 8)); ax.axis('off'); fig.patch.set_facecolor('#f8f9fa')
-    plt.text(0.5, 0.95, "RESULTADO FINAL", ha='center', va='center', fontsize=22, weight='bold', color='#333')
-    plt.text(0.5, 0.88, f"{data_jogo}", ha='center', va='center', fontsize=12, color='#666')
-    plt.text(0.25, 0.75, "VERDE", ha='center', fontsize=18, weight='bold', color='#2E7D32')
-    plt.text(0.75, 0.75, "PRETO", ha='center', fontsize=18, weight='bold', color='#212121')
-    plt.text(0.5, 0.65, f"{placar_verde}  x  {placar_preto}", ha='center', va='center', fontsize=50, weight='bold')
-    plt.plot([0.1, 0.9], [0.55, 0.55], color='#ddd', lw=2)
-    plt.text(0.5, 0.50, "GOLS", ha='center', fontsize=14, color='#888')
-    y = 0.45
-    for a in art_verde: plt.text(0.25, y, a, ha='center', fontsize=12, color='#2E7D32'); y -= 0.05
-    y = 0.45
-    for a in art_preto: plt.text(0.75, y, a, ha='center', fontsize=12, color='#212121'); y -= 0.05
-    plt.text(0.5, 0.05, "PELADA MADRUGAO", ha='center', fontsize=10, color='#aaa', style='italic')
-    buf = io.BytesIO(); plt.savefig(buf, format='png', bbox_inches='tight', dpi=150, facecolor='#f8f9fa'); buf.seek(0)
-    return buf
+            nossas = [c for c in str(alteradas).split("|") if c in novo.columns]
+            if outras & set(nossas):
+                conflitos.append(k)
+                continue
+            novo.loc[r, nossas] = linha[nossas].values
+            linha[colunas] = novo.loc[r, colunas].values
+            saida.append(linha)
+    if conflitos:
+        nomes = ", ".join("/".join(map(str, k)) if isinstance(k, tuple) else str(k) for k in conflitos)
+        raise ConflitoGravacao(f"Outra pessoa alterou {sheet_name} ({nomes}) enquanto você editava. Recarregue e refaça essas linhas.")
+    saida = pd.DataFrame(saida, columns=colunas + COLUNAS_CONTROLE)
+    inseridas = saida.loc[saida["_acao"] == "inserir", colunas]
+    novo = pd.concat([novo.drop(index=apagar), inseridas], ignore_index=True)
+    return tipar_dados(novo, sheet_name), tipar_dados(saida, sheet_name)
+
+# Salva a edição de uma tabela mandando só as diferenças para a fila; se a aba mudou desde
+# que `df_antes` foi carregado, as diferenças são refeitas sobre a versão nova
+def sync_data(df_antes, df_depois, sheet_name):
+    base = df_antes.attrs.get("marca")
+    mudancas = calcular_mudancas(df_antes, df_depois, sheet_name)
+    if mudancas is None: return save_data(df_depois, sheet_name, base)
+    if mudancas.empty: return True
+    def rebasear(atual):
+        nonlocal mudancas
+        df, mudancas = rebasear_mudancas(atual, df_antes, mudancas, sheet_name)
+        return df
+    try:
+        grupo = grupo_atual()
+        with grupo.fila.em_ordem():
+            grupo.cache.escrever(sheet_name, tipar_dados(df_depois, sheet_name), base, rebasear)
+            if not mudancas.empty: registrar_gravacao(grupo.fila.enviar("sincronizar", sheet_name, mudancas))
+        return True
+    except ConflitoGravacao as e:
+        st.warning(str(e))
+        return False
+    except Exception as e:
+        st.error(f"Erro ao salvar ({sheet_name}): {e}")
+        return False
+
+# Apaga só as linhas com essas chaves (ex.: todas as linhas de uma partida), sem reescrever a aba
+def remove_data(sheet_name, coluna, valores):
+    try:
+        chaves = pd.DataFrame({coluna: [str(v) for v in valores]})
+        grupo = grupo_atual()
+        with grupo.fila.em_ordem():
+            grupo.cache.remover(sheet_name, chaves)
+            registrar_gravacao(grupo.fila.enviar("remover", sheet_name, chaves))
+        return True
+    except Exception as e:
+        st.error(f"Erro ao salvar ({sheet_name}): {e}")
+        return False
+
+# Status das gravações desta sessão; enquanto houver pendência, atualiza sozinho
+def mostrar_status_gravacoes():
+    ids = st.session_state.get("gravacoes", [])
+    if not ids: return
+    status = get_fila().consultar(ids)
+    pendentes = [i for i in ids if status.get(i, {}).get("estado") == "pendente"]
+    erros = [f"Erro ao salvar ({status[i]['aba']}): {status[i]['erro']}" for i in ids if status.get(i, {}).get("estado") == "erro"]
+    st.session_state["gravacoes"] = pendentes
+    st.session_state.setdefault("erros_gravacao", []).extend(erros)
+    if pendentes:
+        st.caption(f"⏳ Salvando {len(pendentes)} alteração(ões) na planilha...")
+
+# Reescrita completa e rara: remove linhas vazias/duplicadas, reordena colunas e linhas.
+# Lê a aba crua (linhas vazias e colunas soltas que o cache tipado esconde) só depois de a fila
+# esvaziar, e grava com a marca do cache: se alguém gravar na aba no meio do caminho, a
+# compactação é recusada em vez de engolir a gravação alheia.
+def compactar_aba(sheet_name, expected_cols, ordem=None):
+    grupo = grupo_atual()
+    if not grupo.fila.drenar(30):
+        st.warning("Ainda há gravações na fila. Tente compactar de novo em instantes.")
+        return None
+    base = load_data(sheet_name).attrs.get("marca")
+    df = grupo.storage.ler(sheet_name)
+    if df is None or df.empty: return 0
+    antes = len(df)
+    df = df.replace("", pd.NA).dropna(how="all").fillna("")
+    df = df.drop_duplicates().reset_index(drop=True)
+    extras = [c for c in df.columns if c not in expected_cols and not str(c).startswith("Unnamed")]
+    df = df.reindex(columns=expected_cols + extras, fill_value="")
+    if ordem: df = df.sort_values(ordem, kind="stable").reset_index(drop=True)
+    if save_data(df, sheet_name, base): return antes - len(df)
+    return None
+
+# --- SERVIÇO DE RENDERIZAÇÃO (POOL DE PROCESSOS) ---
+# O matplotlib roda em processos separados (renderizacao.py): a thread do script só recebe
+# um Future e segue; vários cards/tabelas são desenhados em paralelo.
+# Nada de fork do servidor: ele tem threads (tornado, fila, revalidação, limitador) e o filho
+# poderia herdar uma trava fechada. O forkserver é um processo novo que só importa
+# renderizacao (e o matplotlib) e dele saem os filhos; onde não existe, spawn.
+# Se um filho morre, o pool quebra (BrokenProcessPool): o próximo pedido monta outro.
+# O Streamlit instala este script como sys.modules["__main__"] (com __file__), e os filhos de
+# forkserver/spawn reexecutariam o app inteiro ao subir. Com __spec__ de nome "__main__", o
+# multiprocessing pula essa reimportação; os filhos só precisam de renderizacao.
+if __name__ == "__main__":
+    __spec__ = importlib.machinery.ModuleSpec("__main__", None)
+
+class PoolRenderizacao:
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.pool = None
+
+    def _novo(self):
+        metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        contexto = multiprocessing.get_context(metodo)
+        if metodo == "forkserver": contexto.set_forkserver_preload(["renderizacao"])
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=contexto)
+
+    def enviar(self, funcao, *args):
+        with self.lock:
+            if self.pool is None: self.pool = self._novo()
+            try:
+                return self.pool.submit(funcao, *args)
+            except BrokenProcessPool:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = self._novo()
+                return self.pool.submit(funcao, *args)
+
+@st.cache_resource
+def get_render_pool():
+    return PoolRenderizacao(int(st.secrets.get("render_workers", 2)))
+
+def renderizar(funcao, *args):
+    return get_render_pool().enviar(funcao, *args)
+
+# --- CACHE DE IMAGENS (LRU POR CONTEÚDO) ---
+# A imagem só é gerada quando alguém pede o download, e fica guardada pelo hash dos dados
+# que a originaram: a mesma tabela/placar não é desenhada duas vezes. Enquanto renderiza,
+# o item guardado é o Future.
+class CacheImagens:
+    def __init__(self, maximo=32):
+        self.maximo = maximo
+        self.itens = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, chave):
+        with self.lock: return chave in self.itens
+
+    def pedir(self, chave, gerar):
+        with self.lock:
+            if chave in self.itens: return
+            self.itens[chave] = gerar()
+            while len(self.itens) > self.maximo: self.itens.popitem(last=False)
+
+    def pendente(self, chave):
+        with self.lock:
+            item = self.itens.get(chave)
+            return isinstance(item, Future) and not item.done()
+
+    # Bytes prontos, None se ainda renderizando; se a renderização falhou, esquece e repassa o erro
+    def obter(self, chave):
+        with self.lock:
+            item = self.itens.get(chave)
+            if item is None: return None
+            self.itens.move_to_end(chave)
+            if not isinstance(item, Future): return item
+            if not item.done(): return None
+            if item.exception() is not None:
+                del self.itens[chave]
+                raise item.exception()
+            self.itens[chave] = item.result()
+            return self.itens[chave]
+
+@st.cache_resource
+def get_cache_imagens():
+    return CacheImagens(int(st.secrets.get("cache_imagens_max", 32)))
+
+def chave_imagem(tipo, *partes):
+    h = hashlib.sha256(tipo.encode())
+    for parte in partes:
+        if isinstance(parte, pd.DataFrame):
+            h.update(repr(list(parte.columns)).encode())
+            h.update(pd.util.hash_pandas_object(parte, index=False).values.tobytes())
+        else:
+            h.update(repr(parte).encode())
+    return h.hexdigest()
+
+# itens: [(rótulo, nome do arquivo, chave, função de renderizacao.py, args)]
+def botoes_download_imagens(itens, key):
+    cache = get_cache_imagens()
+    faltam = [it for it in itens if it[2] not in cache]
+    rotulo = faltam[0][0] if len(faltam) == 1 else "Imagens"
+    if faltam and st.button(f"🖼️ Gerar {rotulo}", key=f"gerar_{key}"):
+        for _, _, chave, funcao, args in faltam:
+            cache.pedir(chave, lambda funcao=funcao, args=args: renderizar(funcao, *args))
+    if any(cache.pendente(it[2]) for it in itens):
+        st.fragment(run_every=1)(_mostrar_downloads)(itens, True)
+    else:
+        _mostrar_downloads(itens, False)
+
+def _mostrar_downloads(itens, acompanhando):
+    cache = get_cache_imagens()
+    renderizando = 0
+    for rotulo, nome_arquivo, chave, _, _ in itens:
+        try:
+            dados = cache.obter(chave)
+        except Exception as e:
+            st.error(f"Erro ao gerar {rotulo}: {e}")
+            continue
+        if dados is not None:
+            st.download_button(f"📸 Baixar {rotulo}", dados, nome_arquivo, "image/png", key=f"baixar_{chave[:16]}")
+        elif chave in cache:
+            renderizando += 1
+    if renderizando:
+        st.caption(f"⏳ Renderizando {renderizando} imagem(ns)...")
+    elif acompanhando:
+        st.rerun()
 
 # --- DADOS PADRÃO ---
 def carregar_elenco():
-    df = load_data("elenco", ["nome", "time", "tipo", "punicao", "nivel"])
-    if df.empty:
-        df = pd.DataFrame(columns=["nome", "time", "tipo", "punicao", "nivel"])
-        save_data(df, "elenco")
-    
-    if "punicao" not in df.columns: df["punicao"] = "Não"
-    if "nivel" not in df.columns: df["nivel"] = 2
-    
+    df = load_data("elenco")
+    # Leitura que falhou também volta vazia, com marca sem data (ver load_all_data): não cria a aba
+    if df.empty and df.attrs.get("marca", (None, None))[1] is not None:
+        save_data(df, "elenco", df.attrs.get("marca"))
     return df
 
+# --- ELENCO INDEXADO POR NOME ---
+# Montado uma vez por rerun: acesso O(1) a time/tipo/nível/punição sem varrer o DataFrame,
+# alterações feitas no lugar e para_dataframe() devolve o formato que o save_data espera.
+class Elenco:
+    def __init__(self, df):
+        self.colunas = list(df.columns) if len(df.columns) else COLUNAS_ABAS["elenco"]
+        self.jogadores = {str(r["nome"]): r for r in df.to_dict("records")}
+
+    def __contains__(self, nome):
+        return nome in self.jogadores
+
+    def __len__(self):
+        return len(self.jogadores)
+
+    def get(self, nome):
+        return self.jogadores.get(nome)
+
+    def time(self, nome, padrao=None):
+        j = self.jogadores.get(nome)
+        return j["time"] if j else padrao
+
+    def nivel(self, nome, padrao=2):
+        j = self.jogadores.get(nome)
+        return int(j["nivel"]) if j else padrao
+
+    def punido(self, nome):
+        j = self.jogadores.get(nome)
+        return bool(j) and j["punicao"] == "Sim"
+
+    def filtrar(self, **campos):
+        return [j for j in self.jogadores.values() if all(j.get(c) == v for c, v in campos.items())]
+
+    def nomes(self, **campos):
+        return sorted(str(j["nome"]) for j in self.filtrar(**campos))
+
+    def times(self):
+        return {n: j["time"] for n, j in self.jogadores.items()}
+
+    def atualizar(self, nome, **campos):
+        j = self.jogadores.get(nome)
+        if j is None: return False
+        mudou = any(j.get(c) != v for c, v in campos.items())
+        j.update(campos)
+        return mudou
+
+    def adicionar(self, **registro):
+        self.jogadores[str(registro["nome"])] = {c: registro.get(c, "") for c in self.colunas}
+
+    def remover(self, nome):
+        return self.jogadores.pop(nome, None) is not None
+
+    def para_dataframe(self):
+        return pd.DataFrame(list(self.jogadores.values()), columns=self.colunas)
+
+# --- PAGAMENTOS (LIVRO LONGO) ---
+# Uma linha por mensalidade paga (nome, ano, mes, pago_em, valor): o histórico cresce por
+# temporada sem alargar a planilha. A grade Jan–Dez do editor é só uma visão (pivot) de um ano.
+def migrar_financeiro(df_checks, ano):
+    if df_checks.empty: return pd.DataFrame(columns=COLUNAS_ABAS["pagamentos"])
+    longo = df_checks.melt(id_vars="nome", value_vars=MESES, var_name="mes", value_name="pago")
+    longo = longo[longo["pago"]]
+    return pd.DataFrame({"nome": longo["nome"], "ano": ano, "mes": longo["mes"].map(MESES.index) + 1, "pago_em": "", "valor": 0})
+
+# A grade antiga não guardava o ano: ele vem de "ano_financeiro" (secrets do grupo) ou do admin,
+# na aba Financeiro. Sem ano, nada é migrado e a grade antiga fica como está.
+def migracao_pendente():
+    dados = load_all_data(("pagamentos", "financeiro"))
+    return dados["pagamentos"].empty and not dados["financeiro"].empty
+
+def carregar_pagamentos(ano_legado=None):
+    dados = load_all_data(("pagamentos", "financeiro"))
+    pagamentos = dados["pagamentos"]
+    ano_legado = ano_legado or config_grupo("ano_financeiro")
+    if pagamentos.empty and not dados["financeiro"].empty and ano_legado:
+        pagamentos = migrar_financeiro(dados["financeiro"], int(ano_legado))
+        if not pagamentos.empty: save_data(pagamentos, "pagamentos", dados["pagamentos"].attrs.get("marca"))
+        pagamentos = tipar_dados(pagamentos, "pagamentos")
+    return pagamentos
+
+# Mensalistas × meses do ano, True onde há pagamento; quem não tem linha entra todo False
+def conciliar_pagamentos(mensalistas, pagamentos, ano):
+    do_ano = pagamentos[pagamentos["ano"] == ano]
+    grade = pd.crosstab(do_ano["nome"], do_ano["mes"]).gt(0)
+    grade = grade.reindex(index=sorted(mensalistas), columns=range(1, 13), fill_value=False)
+    grade.columns = MESES
+    return grade.rename_axis("nome").reset_index()
+
+# Compara a grade editada com a original: linhas novas para anexar e (nome, mes) desmarcados
+def diferenca_pagamentos(antes, depois, ano, valor):
+    a = antes.set_index("nome")[MESES].stack()
+    d = depois.set_index("nome")[MESES].reindex(a.index.get_level_values(0).unique()).stack().reindex(a.index, fill_value=False)
+    marcados = d[d & ~a].index
+    desmarcados = set((nome, MESES.index(mes) + 1) for nome, mes in d[~d & a].index)
+    novos = pd.DataFrame({
+        "nome": marcados.get_level_values(0), "ano": ano,
+        "mes": [MESES.index(m) + 1 for m in marcados.get_level_values(1)],
+        "pago_em": datetime.today().strftime("%Y-%m-%d"), "valor": valor,
+    })
+    return novos, desmarcados
+
+# --- COFRE (LIVRO-CAIXA COM FECHAMENTOS) ---
+# Cada movimentação tem um id estável. Saldo acumulado e fechamentos mensais são calculados
+# uma vez por versão da aba (via `derivado`); o SALDO é o último fechamento + o mês corrente.
+class Cofre:
+    def __init__(self, df):
+        self.movs = df.sort_values(["Data", "id"], na_position="first", kind="stable").reset_index(drop=True)
+        self.movs["Saldo"] = self.movs["Valor"].cumsum()
+        valor = self.movs["Valor"]
+        mes = self.movs["Data"].dt.to_period("M")
+        self.meses = pd.DataFrame({
+            "entradas": valor.clip(lower=0).groupby(mes).sum(),
+            "saidas": valor.clip(upper=0).abs().groupby(mes).sum(),
+        })
+        self.meses["saldo"] = (self.meses["entradas"] - self.meses["saidas"]).cumsum()
+        # Movimentações sem data válida ficam fora dos meses, mas contam no saldo
+        sem_data = valor[mes.isna()]
+        self.sem_data = (sem_data.clip(lower=0).sum(), sem_data.clip(upper=0).abs().sum())
+        self.ultimo_id = int(self.movs["id"].max()) if self.movs["id"].notna().any() else 0
+
+    def __len__(self):
+        return len(self.movs)
+
+    def totais(self):
+        return self.meses["entradas"].sum() + self.sem_data[0], self.meses["saidas"].sum() + self.sem_data[1]
+
+    def saldo(self, hoje=None):
+        atual = pd.Period(hoje or datetime.today(), "M")
+        fechados = self.meses[self.meses.index < atual]
+        abertos = self.meses[self.meses.index >= atual]
+        base = fechados["saldo"].iloc[-1] if len(fechados) else 0
+        return base + (abertos["entradas"] - abertos["saidas"]).sum() + self.sem_data[0] - self.sem_data[1]
+
+    def por_mes(self):
+        return self.meses.rename_axis("mes").reset_index().assign(mes=lambda d: d["mes"].dt.strftime("%m/%Y"))
+
+    def por_ano(self):
+        anos = self.meses.groupby(self.meses.index.year).agg({"entradas": "sum", "saidas": "sum", "saldo": "last"})
+        return anos.rename_axis("ano").reset_index()
+
+    def novos_ids(self, n):
+        return list(range(self.ultimo_id + 1, self.ultimo_id + 1 + n))
+
+# Planilhas antigas não têm id: numera uma vez, na ordem em que as linhas estão
+def carregar_cofre():
+    df_mov = load_data("saidas")
+    ids = df_mov["id"]
+    if not df_mov.empty and ids.isna().any():
+        livres = iter(range(int(ids.max()) + 1 if ids.notna().any() else 1, 10**12))
+        df_mov["id"] = [int(i) if pd.notna(i) else next(livres) for i in ids]
+        save_data(df_mov, "saidas", df_mov.attrs.get("marca"))
+    return derivado("saidas", Cofre)
+
+# --- MOTOR DE SORTEIO ---
+# Os fixos (Verde/Preto) ficam no seu time; os "Ambos" são distribuídos para minimizar a
+# diferença de força total entre os times, mantendo os tamanhos o mais iguais possível.
+# Força inteira (nível 1-3) -> partição exata por programação dinâmica.
+# Força fracionária (ex.: rating) -> busca local com trocas, recomeçando de divisões aleatórias;
+# para quando a diferença fica dentro da tolerância, quando MAX_SEM_MELHORA recomeços seguidos não
+# acham nada melhor, ou no fim do orçamento de tempo.
+# Mesma semente + mesmo pool = mesmo sorteio.
+def sortear_times(pool, max_titulares=20, semente=None, orcamento_ms=80, chave_forca="nivel"):
+    rng = random.Random(semente)
+    titulares = pool[:max_titulares]
+    reservas = [p['nome'] for p in pool[max_titulares:]]
+    fixos_verde = [p for p in titulares if p['time_pref'] == 'Verde']
+    fixos_preto = [p for p in titulares if p['time_pref'] == 'Preto']
+    flutuantes = [p for p in titulares if p['time_pref'] not in ('Verde', 'Preto')]
+    rng.shuffle(flutuantes)
+
+    forca = [p[chave_forca] for p in flutuantes]
+    base = sum(p[chave_forca] for p in fixos_verde) - sum(p[chave_forca] for p in fixos_preto)
+    k = len(flutuantes)
+    # Quantos flutuantes vão para o Verde: os valores que deixam os tamanhos mais próximos
+    dif_tam = {c: abs((len(fixos_verde) + c) - (len(fixos_preto) + k - c)) for c in range(k + 1)}
+    qtds_ok = {c for c, d in dif_tam.items() if d == min(dif_tam.values())}
+
+    if all(float(f).is_integer() for f in forca) and sum(abs(f) for f in forca) <= 5000:
+        escolha = _particao_exata([int(f) for f in forca], int(base), qtds_ok)
+    else:
+        escolha = _particao_busca_local(forca, base, qtds_ok, rng, orcamento_ms)
+
+    verde = [p['nome'] for p in fixos_verde] + [flutuantes[i]['nome'] for i in sorted(escolha)]
+    preto = [p['nome'] for p in fixos_preto] + [flutuantes[i]['nome'] for i in range(k) if i not in escolha]
+    forca_verde = sum(p[chave_forca] for p in fixos_verde) + sum(forca[i] for i in escolha)
+    forca_preto = sum(p[chave_forca] for p in fixos_preto) + sum(forca[i] for i in range(k) if i not in escolha)
+    return {"verde": verde, "preto": preto, "reservas": reservas,
+            "forca_verde": forca_verde, "forca_preto": forca_preto,
+            "diferenca": abs(forca_verde - forca_preto), "semente": semente, "chave_forca": chave_forca}
+
+# Subconjunto com quantidade em `qtds_ok` cuja soma deixa base + 2*soma - total o mais perto de zero
+def _particao_exata(forca, base, qtds_ok):
+    total = sum(forca)
+    estados = {(0, 0): ()}
+    for i, f in enumerate(forca):
+        novos = dict(estados)
+        for (c, s), escolhidos in estados.items():
+            novos.setdefault((c + 1, s + f), escolhidos + (i,))
+        estados = novos
+    melhor = min((abs(base + 2 * s - total), c, s) for (c, s) in estados if c in qtds_ok)
+    return set(estados[(melhor[1], melhor[2])])
+
+# Diferença abaixo de TOLERANCIA_FORCA × a maior força já é empate (0,15 ponto num rating de 1500)
+TOLERANCIA_FORCA = 1e-4
+MAX_SEM_MELHORA = 25
+
+def _particao_busca_local(forca, base, qtds_ok, rng, orcamento_ms, max_reinicios=1000):
+    k = len(forca)
+    total = sum(forca)
+    tolerancia = TOLERANCIA_FORCA * max([abs(f) for f in forca] + [abs(base)])
+    limite = time.perf_counter() + orcamento_ms / 1000
+    melhor, melhor_dif, sem_melhora = set(), float("inf"), 0
+    for _ in range(max_reinicios):
+        escolha = set(rng.sample(range(k), rng.choice(sorted(qtds_ok))))
+        soma = sum(forca[i] for i in escolha)
+        melhorou = True
+        while melhorou:
+            melhorou = False
+            dif = abs(base + 2 * soma - total)
+            for i in list(escolha):
+                for j in range(k):
+                    if j in escolha: continue
+                    nova = soma - forca[i] + forca[j]
+                    if abs(base + 2 * nova - total) < dif - 1e-9:
+                        escolha.remove(i); escolha.add(j); soma = nova
+                        melhorou = True
+                        break
+                if melhorou: break
+        dif = abs(base + 2 * soma - total)
+        # Guarda qualquer melhora, mas só uma maior que a tolerância conta como progresso
+        sem_melhora = 0 if dif < melhor_dif - tolerancia else sem_melhora + 1
+        if dif < melhor_dif: melhor, melhor_dif = set(escolha), dif
+        if melhor_dif <= tolerancia or sem_melhora >= MAX_SEM_MELHORA or time.perf_counter() > limite: break
+    return melhor
+
+# --- SUGESTÃO DE SORTEIOS (MONTE CARLO EM LOTE) ---
+# Milhares de divisões dos flutuantes viram uma matriz 0/1 (linha = divisão, coluna = titular,
+# 1 = Verde) pontuada de uma vez com álgebra de matrizes: diferença de força (em desvios-padrão
+# da força do pool) + PESO_QUIMICA × diferença de entrosamento entre os dois times. As melhores
+# são refinadas em lote trocando um flutuante do Verde por um do Preto. `quimica` é a matriz
+# titular × titular de Entrosamento.quimica.
+PESO_QUIMICA = 1.0
+
+def sugerir_sorteios(pool, quimica, max_titulares=20, chave_forca="nivel", quantos=3, amostras=4000, rodadas=4, semente=None):
+    rng = np.random.default_rng(semente)
+    titulares = pool[:max_titulares]
+    reservas = [p['nome'] for p in pool[max_titulares:]]
+    n = len(titulares)
+    forca = np.array([p[chave_forca] for p in titulares], dtype=float)
+    fixo_verde = np.array([p['time_pref'] == 'Verde' for p in titulares], dtype=bool)
+    fixo_preto = np.array([p['time_pref'] == 'Preto' for p in titulares], dtype=bool)
+    flut = np.flatnonzero(~fixo_verde & ~fixo_preto)
+    k = len(flut)
+    dif_tam = {c: abs((fixo_verde.sum() + c) - (fixo_preto.sum() + k - c)) for c in range(k + 1)}
+    qtds_ok = [c for c, d in dif_tam.items() if d == min(dif_tam.values())]
+    escala = forca.std() or 1.0
+
+    def pontuar(X):
+        Y = 1 - X
+        dif = np.abs(2 * (X @ forca) - forca.sum()) / escala
+        q_verde = ((X @ quimica) * X).sum(axis=1) / 2
+        q_preto = ((Y @ quimica) * Y).sum(axis=1) / 2
+        return dif + PESO_QUIMICA * np.abs(q_verde - q_preto), q_verde, q_preto
+
+    X = np.zeros((amostras if k else 1, n))
+    X[:, fixo_verde] = 1
+    if k:
+        # Posto aleatório de cada flutuante; os `c` primeiros vão para o Verde
+        postos = rng.random((amostras, k)).argsort(axis=1).argsort(axis=1)
+        X[:, flut] = postos < rng.choice(qtds_ok, size=amostras)[:, None]
+        for _ in range(rodadas):
+            elite = X[np.argsort(pontuar(X)[0])[:64]]
+            filhos = np.repeat(elite, 32, axis=0)
+            F = filhos[:, flut]
+            sorteio = rng.random(F.shape)
+            sai = np.argmax(np.where(F == 1, sorteio, -1), axis=1)
+            entra = np.argmax(np.where(F == 0, sorteio, -1), axis=1)
+            ok = np.flatnonzero((F.sum(axis=1) > 0) & (F.sum(axis=1) < k))
+            F[ok, sai[ok]] = 0; F[ok, entra[ok]] = 1
+            filhos[:, flut] = F
+            X = np.vstack([elite, filhos])
+    X = np.unique(X, axis=0)
+    custo, q_verde, q_preto = pontuar(X)
+    sugestoes = []
+    for s in np.argsort(custo)[:quantos]:
+        lado = X[s].astype(bool)
+        forca_verde = sum(titulares[i][chave_forca] for i in range(n) if lado[i])
+        forca_preto = sum(titulares[i][chave_forca] for i in range(n) if not lado[i])
+        sugestoes.append({
+            "verde": [titulares[i]['nome'] for i in range(n) if lado[i]],
+            "preto": [titulares[i]['nome'] for i in range(n) if not lado[i]],
+            "reservas": reservas, "forca_verde": forca_verde, "forca_preto": forca_preto,
+            "diferenca": abs(forca_verde - forca_preto), "semente": semente, "chave_forca": chave_forca,
+            "quimica_verde": float(q_verde[s]), "quimica_preto": float(q_preto[s]),
+        })
+    return sugestoes
+
+# --- ESTATÍSTICAS MATERIALIZADAS ---
+# "estatisticas" (por jogador) e "placar" (vitórias por time) são mantidas somando/subtraindo
+# só as linhas da partida salva ou apagada, então a aba de estatísticas não relê o histórico.
+# Lado de cada linha de jogo (NA quando não se sabe)
+def lados_partida(jogo, times_elenco=None):
+    lado = jogo['lado'].replace("", pd.NA) if 'lado' in jogo.columns else pd.Series(pd.NA, index=jogo.index, dtype=object)
+    if times_elenco is not None:
+        # Histórico antigo não tem "lado": usa o time fixo do elenco quando existir
+        lado = lado.fillna(jogo['jogador'].map(times_elenco).where(lambda t: t.isin(["Verde", "Preto"])))
+    return lado
+
+def agregar_partidas(linhas, times_elenco=None):
+    # Agrega por texto puro: categorias do histórico e linhas novas da súmula se misturam aqui
+    linhas = linhas.astype({c: object for c in ("jogador", "vencedor", "lado", "tipo_registro") if c in linhas.columns})
+    jogo = linhas[linhas['tipo_registro'] == 'Jogo']
+    lado = lados_partida(jogo, times_elenco)
+    venceu = jogo[lado.notna() & lado.fillna("").eq(jogo['vencedor'])]
+    por_jogador = pd.DataFrame({
+        "gols": jogo.groupby("jogador")['gols'].sum(),
+        "jogos": jogo.groupby("jogador").size(),
+        "vitorias": venceu.groupby("jogador").size(),
+        "justificados": linhas[linhas['tipo_registro'] == 'Justificado'].groupby("jogador").size(),
+    }).fillna(0).astype(int)
+    placar = jogo.drop_duplicates(subset=['id'])['vencedor'].value_counts().rename("partidas")
+    placar = placar[placar.index.isin(["Verde", "Preto", "Empate"])]
+    return por_jogador, placar
+
+def somar_agregados(atual, delta, sinal):
+    novo = atual.add(delta * sinal, fill_value=0).clip(lower=0).astype(int)
+    return novo[(novo != 0).any(axis=1)] if isinstance(novo, pd.DataFrame) else novo[novo != 0]
+
+def tabela_estatisticas(por_jogador):
+    por_jogador = por_jogador.reindex(columns=COLUNAS_ABAS["estatisticas"][1:]).fillna(0).astype(int)
+    return por_jogador.sort_values(["gols", "jogos"], ascending=False).rename_axis("jogador").reset_index()
+
+def tabela_placar(placar):
+    return placar.rename_axis("resultado").reset_index()
+
+def gravar_agregados(por_jogador, placar):
+    return save_data(tabela_estatisticas(por_jogador), "estatisticas") and save_data(tabela_placar(placar), "placar")
+
+# Histórico da aba aberta sem as partidas de `linhas`: serve de base para materializar antes da
+# primeira atualização, esteja a partida já anexada (súmula) ou ainda na aba (apagar, arquivar)
+def historico_sem(linhas):
+    hist = load_data("jogos")
+    return hist[~hist['id'].astype(str).isin(set(linhas['id'].astype(str)))]
+
+# Soma o delta de `linhas` ao que foi lido, com compare-and-swap: se outra súmula gravou as
+# tabelas depois da leitura, o delta é somado de novo sobre a versão dela (nenhum incremento se perde)
+def atualizar_estatisticas(linhas, sinal=1, times_elenco=None):
+    dados = load_all_data(("estatisticas", "placar"))
+    colunas = COLUNAS_ABAS["estatisticas"][1:]
+    est = dados["estatisticas"].set_index("jogador")[colunas]
+    placar = dados["placar"].set_index("resultado")["partidas"]
+    d_est, d_placar = agregar_partidas(linhas, times_elenco)
+    if est.empty and placar.empty:
+        # Tabelas nunca materializadas (ou apagadas): somar a partida ao vazio perderia o histórico.
+        # Para apagar, o histórico sem `linhas` já é o resultado: soma de volta o que o sinal vai tirar.
+        est, placar = agregar_partidas(historico_sem(linhas), times_elenco)
+        if sinal < 0: est, placar = somar_agregados(est, d_est, 1), somar_agregados(placar, d_placar, 1)
+    def somar_est(atual):
+        return tabela_estatisticas(somar_agregados(atual.set_index("jogador")[colunas], d_est, sinal))
+    def somar_placar(atual):
+        return tabela_placar(somar_agregados(atual.set_index("resultado")["partidas"], d_placar, sinal))
+    novo_est, novo_placar = somar_agregados(est, d_est, sinal), somar_agregados(placar, d_placar, sinal)
+    return (save_data(tabela_estatisticas(novo_est), "estatisticas", dados["estatisticas"].attrs.get("marca"), somar_est)
+            and save_data(tabela_placar(novo_placar), "placar", dados["placar"].attrs.get("marca"), somar_placar))
+
+def reconstruir_estatisticas(hist, elenco):
+    por_jogador, placar = agregar_partidas(hist, elenco.times())
+    return gravar_agregados(por_jogador, placar)
+
+# --- RATINGS (ELO POR PARTIDA) ---
+# Força de cada jogador tirada dos resultados das súmulas. Em cada partida, Verde e Preto valem
+# a média dos ratings de quem jogou de cada lado; todos do time ganham (ou perdem) o mesmo
+# K × fator × (resultado − esperado), com fator maior para placar largo. Salvar uma súmula
+# mexe só em quem jogou nela; "Recalcular Ratings" refaz do zero na ordem das partidas.
+# Quem ainda não tem rating começa pelo nível do elenco (1 → 1400, 2 → 1500, 3 → 1600).
+K_RATING = 24
+PONTOS_RESULTADO = {"Verde": 1.0, "Empate": 0.5, "Preto": 0.0}
+
+def rating_inicial(nivel=2):
+    return 1500.0 + 100.0 * (int(nivel) - 2)
+
+# `ratings`: DataFrame (índice jogador; rating, partidas). Com sinal=-1 desfaz as partidas de
+# `linhas` (aproximado: o Elo depende da ordem, o recálculo completo acerta a diferença).
+def aplicar_ratings(ratings, linhas, elenco=None, sinal=1):
+    tabela = {j: [float(r), int(n)] for j, r, n in zip(ratings.index, ratings["rating"], ratings["partidas"])}
+    linhas = linhas.astype({c: object for c in ("jogador", "vencedor", "lado", "tipo_registro") if c in linhas.columns})
+    jogo = linhas[linhas['tipo_registro'] == 'Jogo']
+    jogo = jogo.assign(lado=lados_partida(jogo, elenco.times() if elenco is not None else None))
+    jogo = jogo[jogo['lado'].isin(["Verde", "Preto"]) & jogo['vencedor'].isin(list(PONTOS_RESULTADO))]
+    jogo = jogo.sort_values(["data", "id"], kind="stable", na_position="last")
+    for _, partida in jogo.groupby("id", sort=False):
+        verde = partida[partida['lado'] == "Verde"]; preto = partida[partida['lado'] == "Preto"]
+        if verde.empty or preto.empty: continue
+        for j in partida['jogador']:
+            tabela.setdefault(j, [rating_inicial(elenco.nivel(j) if elenco is not None else 2), 0])
+        media_verde = sum(tabela[j][0] for j in verde['jogador']) / len(verde)
+        media_preto = sum(tabela[j][0] for j in preto['jogador']) / len(preto)
+        esperado = 1 / (1 + 10 ** ((media_preto - media_verde) / 400))
+        saldo = int(verde['gols'].sum()) - int(preto['gols'].sum())
+        delta = sinal * K_RATING * (math.log(abs(saldo) + 1) + 1) * (PONTOS_RESULTADO[partida['vencedor'].iloc[0]] - esperado)
+        for j in verde['jogador']: tabela[j][0] += delta; tabela[j][1] += sinal
+        for j in preto['jogador']: tabela[j][0] -= delta; tabela[j][1] += sinal
+    novo = pd.DataFrame.from_dict(tabela, orient="index", columns=["rating", "partidas"]).rename_axis("jogador")
+    return novo[novo["partidas"] > 0]
+
+def tabela_ratings(ratings):
+    return ratings.sort_values("rating", ascending=False).round({"rating": 2}).reset_index()[COLUNAS_ABAS["ratings"]]
+
+def gravar_ratings(ratings):
+    return save_data(tabela_ratings(ratings), "ratings")
+
+# Como atualizar_estatisticas: se outra súmula gravou os ratings depois da leitura, as partidas
+# de `linhas` são aplicadas de novo sobre a versão dela
+def atualizar_ratings(linhas, elenco=None, sinal=1):
+    lido = load_data("ratings")
+    atual = lido.set_index("jogador")
+    if atual.empty:
+        # Tabela nunca materializada: parte de todas as temporadas, sem as partidas de `linhas`
+        hist = carregar_historico_completo()
+        hist = hist[~hist['id'].astype(str).isin(set(linhas['id'].astype(str)))]
+        atual = aplicar_ratings(pd.DataFrame(columns=["rating", "partidas"]), hist, elenco)
+        # Para desfazer, o histórico sem `linhas` já é o resultado
+        novo = atual if sinal < 0 else aplicar_ratings(atual, linhas, elenco, sinal)
+    else: novo = aplicar_ratings(atual, linhas, elenco, sinal)
+    def aplicar(outro):
+        return tabela_ratings(aplicar_ratings(outro.set_index("jogador"), linhas, elenco, sinal))
+    return save_data(tabela_ratings(novo), "ratings", lido.attrs.get("marca"), aplicar)
+
+def reconstruir_ratings(hist, elenco):
+    vazio = pd.DataFrame(columns=["rating", "partidas"])
+    return gravar_ratings(aplicar_ratings(vazio, hist, elenco))
+
+# {jogador: rating}; na primeira vez (tabela ainda vazia) materializa a partir do histórico
+def carregar_ratings(elenco):
+    ratings = load_data("ratings")
+    if ratings.empty:
+        hist = carregar_historico_completo()
+        if not hist.empty:
+            reconstruir_ratings(hist, elenco)
+            ratings = load_data("ratings")
+    return dict(zip(ratings["jogador"], ratings["rating"]))
+
+# --- ENTROSAMENTO (MATRIZ DE DUPLAS) ---
+# Para cada dupla: partidas jogadas do mesmo lado (`juntos`) e vitórias juntos (`vitorias`,
+# empate vale meia), em matrizes NumPy de um objeto do grupo. Ele acompanha a aba de jogos
+# partida a partida: a cada olhada só entram as partidas novas e saem as apagadas.
+# Química da dupla = taxa de vitória juntos − 0,5, puxada para 0 com PRIOR_QUIMICA partidas neutras.
+PRIOR_QUIMICA = 4
+
+class Entrosamento:
+    def __init__(self, capacidade=64):
+        self.lock = threading.Lock()
+        self.posicao = {}
+        self.juntos = np.zeros((capacidade, capacidade))
+        self.vitorias = np.zeros((capacidade, capacidade))
+        self.partidas = {}
+        self.arquivadas = set()
+        self.temporadas = {}
+
+    def _posicoes(self, nomes):
+        for nome in nomes: self.posicao.setdefault(nome, len(self.posicao))
+        if len(self.posicao) > len(self.juntos):
+            cresce = max(len(self.posicao), 2 * len(self.juntos)) - len(self.juntos)
+            self.juntos = np.pad(self.juntos, (0, cresce))
+            self.vitorias = np.pad(self.vitorias, (0, cresce))
+        return np.array([self.posicao[nome] for nome in nomes], dtype=int)
+
+    def _aplicar(self, verde, preto, pontos, sinal):
+        for lado, p in ((verde, pontos), (preto, 1 - pontos)):
+            self.juntos[np.ix_(lado, lado)] += sinal
+            self.vitorias[np.ix_(lado, lado)] += sinal * p
+
+    # `arquivo`: o índice é de uma temporada encerrada; as partidas dele só entram e não saem
+    # quando somem da aba de jogos aberta
+    def sincronizar(self, indice, times_elenco=None, arquivo=False):
+        with self.lock:
+            atuais = set(indice.posicoes)
+            if arquivo:
+                self.arquivadas |= atuais
+            else:
+                for id_partida in set(self.partidas) - atuais - self.arquivadas:
+                    self._aplicar(*self.partidas.pop(id_partida), -1)
+            novas = list(atuais - set(self.partidas))
+            if not novas: return
+            # Todas as partidas novas de uma vez no pandas; por partida sobra só a soma nas matrizes
+            linhas = indice.hist.iloc[np.concatenate([indice.posicoes[i] for i in novas])]
+            linhas = linhas.astype({c: object for c in ("jogador", "vencedor", "lado", "tipo_registro")})
+            jogo = linhas[linhas['tipo_registro'] == 'Jogo']
+            jogo = jogo.assign(lado=lados_partida(jogo, times_elenco), id=jogo['id'].astype(str))
+            vencedor = jogo.groupby("id")['vencedor'].first()
+            jogo = jogo[jogo['lado'].isin(["Verde", "Preto"])].drop_duplicates(["id", "jogador"])
+            pos = self._posicoes(jogo['jogador'].tolist())
+            grupos = jogo.groupby(["id", "lado"]).indices
+            vazio = np.array([], dtype=int)
+            for id_partida in novas:
+                verde = pos[grupos.get((id_partida, "Verde"), vazio)]
+                preto = pos[grupos.get((id_partida, "Preto"), vazio)]
+                resultado = vencedor.get(id_partida, "")
+                if resultado not in PONTOS_RESULTADO or not len(verde) or not len(preto):
+                    verde = preto = vazio  # conta como vista, sem efeito
+                self.partidas[id_partida] = (verde, preto, PONTOS_RESULTADO.get(resultado, 0.0))
+                self._aplicar(*self.partidas[id_partida], 1)
+
+    # Matriz nomes × nomes (diagonal zero); quem nunca jogou tem química 0 com todos
+    def quimica(self, nomes):
+        with self.lock:
+            pos = np.array([self.posicao.get(nome, -1) for nome in nomes], dtype=int)
+            conhecidos = pos >= 0
+            q = np.zeros((len(nomes), len(nomes)))
+            sub = np.ix_(pos[conhecidos], pos[conhecidos])
+            q[np.ix_(conhecidos, conhecidos)] = (self.vitorias[sub] + PRIOR_QUIMICA / 2) / (self.juntos[sub] + PRIOR_QUIMICA) - 0.5
+            np.fill_diagonal(q, 0)
+            return q
+
+def get_entrosamento():
+    return grupo_atual().entrosamento
+
+# Temporadas encerradas entram uma vez por grupo ativo (de novo só se a partição mudar)
+def carregar_entrosamento(elenco):
+    entrosamento = get_entrosamento()
+    for ano in anos_arquivados():
+        hist = load_data(aba_temporada(ano))
+        marca = hist.attrs.get("marca")
+        if entrosamento.temporadas.get(ano) != marca:
+            entrosamento.sincronizar(IndicePartidas(hist), elenco.times(), arquivo=True)
+            entrosamento.temporadas[ano] = marca
+    entrosamento.sincronizar(get_indice_partidas(), elenco.times())
+    return entrosamento
+
+# --- ÍNDICE DE PARTIDAS ---
+# Uma linha por partida (id → posições no histórico), refeito só quando o conteúdo de "jogos"
+# no cache muda. A tela de Ajustes pagina e filtra o resumo em vez de varrer o histórico.
+class IndicePartidas:
+    def __init__(self, hist):
+        self.hist = hist.reset_index(drop=True)
+        ids = self.hist['id'].astype(str)
+        self.posicoes = ids.groupby(ids, sort=False).indices
+        jogo = self.hist['tipo_registro'] == 'Jogo'
+        resumo = pd.DataFrame({
+            "data": self.hist['data'].dt.date.groupby(ids).first(),
+            "vencedor": self.hist['vencedor'].where(jogo).groupby(ids).first(),
+            "atletas": jogo.groupby(ids).sum(),
+            "gols": self.hist['gols'].where(jogo, 0).groupby(ids).sum(),
+        }).fillna({"vencedor": ""})
+        self.resumo = resumo.rename_axis("id").reset_index().sort_values(["data", "id"], ascending=False, na_position="last").reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.resumo)
+
+    def linhas(self, id_partida):
+        return self.hist.iloc[self.posicoes.get(str(id_partida), [])]
+
+    def filtrar(self, inicio=None, fim=None):
+        datas = self.resumo['data']
+        ok = pd.Series(True, index=self.resumo.index)
+        if inicio is not None: ok &= datas.notna() & (datas >= inicio)
+        if fim is not None: ok &= datas.notna() & (datas <= fim)
+        return self.resumo[ok]
+
+def get_indice_partidas():
+    return derivado("jogos", IndicePartidas)
+
+def apagar_partida(indice, id_partida, elenco):
+    linhas = indice.linhas(id_partida)
+    if linhas.empty: return False
+    atualizar_estatisticas(linhas, sinal=-1, times_elenco=elenco.times())
+    atualizar_ratings(linhas, elenco, sinal=-1)
+    return remove_data("jogos", "id", [id_partida])
+
+# --- TEMPORADAS (HISTÓRICO PARTICIONADO POR ANO) ---
+# "jogos" guarda só a temporada aberta. Arquivar move as linhas de anos encerrados para
+# "jogos_<ano>" (lida só quando alguém pede aquele ano) e grava os totais do ano em
+# "temporadas" (por jogador) e "placar_temporadas". "estatisticas" e "placar" passam a ser da
+# temporada aberta; a visão de todas as temporadas soma os resumos, sem abrir partição nenhuma.
+# Súmula lançada depois com data de um ano já encerrado vai para a aba aberta e é arquivada
+# na próxima vez, somando ao que já estava na partição e no resumo.
+def aba_temporada(ano):
+    return f"jogos_{int(ano)}"
+
+def anos_arquivados():
+    dados = load_all_data(("temporadas", "placar_temporadas"))
+    return sorted(set(dados["temporadas"]["ano"].astype(int)) | set(dados["placar_temporadas"]["ano"].astype(int)), reverse=True)
+
+# Totais (por jogador, placar) das temporadas encerradas; `anos` = None soma todas
+def resumo_temporadas(anos=None):
+    dados = load_all_data(("temporadas", "placar_temporadas"))
+    por_jogador, placar = dados["temporadas"], dados["placar_temporadas"]
+    if anos is not None:
+        por_jogador = por_jogador[por_jogador["ano"].isin(anos)]
+        placar = placar[placar["ano"].isin(anos)]
+    por_jogador = por_jogador.groupby("jogador")[COLUNAS_ABAS["estatisticas"][1:]].sum()
+    return por_jogador, placar.groupby("resultado")["partidas"].sum()
+
+# Todas as partições em ordem + a aba aberta: só para recálculos completos (ex.: ratings)
+def carregar_historico_completo():
+    abas = tuple(aba_temporada(ano) for ano in sorted(anos_arquivados())) + ("jogos",)
+    dados = load_all_data(abas)
+    return tipar_dados(pd.concat([dados[aba] for aba in abas], ignore_index=True), "jogos")
+
+def arquivar_temporadas(elenco, hoje=None):
+    hist = load_data("jogos")
+    anos = hist["data"].dt.year
+    ano_atual = (hoje or datetime.today()).year
+    fechados = sorted(int(a) for a in anos.dropna().unique() if a < ano_atual)
+    for ano in fechados:
+        linhas = hist[(anos == ano) & hist["id"].notna()]
+        if linhas.empty: continue
+        por_jogador, placar = agregar_partidas(linhas, elenco.times())
+        resumo = por_jogador.rename_axis("jogador").reset_index().assign(ano=ano)[COLUNAS_ABAS["temporadas"]]
+        placar = placar.rename_axis("resultado").reset_index().assign(ano=ano)[COLUNAS_ABAS["placar_temporadas"]]
+        # Partição e resumo primeiro; só então as linhas saem da aba aberta (e das estatísticas dela)
+        if not (append_data(linhas[COLUNAS_ABAS["jogos"]], aba_temporada(ano)) and append_data(resumo, "temporadas")
+                and (placar.empty or append_data(placar, "placar_temporadas"))): return None
+        atualizar_estatisticas(linhas, sinal=-1, times_elenco=elenco.times())
+        if not remove_data("jogos", "id", linhas["id"].unique().tolist()): return None
+    return fechados
+
+# --- CORRIDA DA ARTILHARIA (SÉRIE ESPARSA) ---
+# Um ponto por (data, jogador) só onde o jogador marcou, com os gols acumulados até ali; quem
+# não marcou naquele dia não ocupa espaço. Como o Entrosamento, acompanha a aba partida a
+# partida: súmula nova depois da última data só acrescenta os pontos dela; retroativa ou
+# apagada refaz só a série de quem marcou nela. O gráfico pega os TOP_CORRIDA primeiros e no
+# máximo MAX_PONTOS_CORRIDA datas, então o custo não cresce com temporadas nem diaristas.
+TOP_CORRIDA = 8
+MAX_PONTOS_CORRIDA = 60
+
+class CorridaArtilharia:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = set()
+        self.eventos = pd.DataFrame({"id": pd.Series(dtype=object), "data": pd.Series(dtype="datetime64[ns]"),
+                                     "jogador": pd.Series(dtype=object), "gols": pd.Series(dtype=float)})
+        self.pontos = self.eventos.drop(columns="id").assign(acumulado=pd.Series(dtype=float))
+        self.totais = pd.Series(dtype=float)
+
+    def _acumular(self, eventos, base=None):
+        pontos = eventos.groupby(["data", "jogador"], as_index=False)["gols"].sum().sort_values("data", kind="stable")
+        pontos["acumulado"] = pontos.groupby("jogador")["gols"].cumsum()
+        if base is not None: pontos["acumulado"] += pontos["jogador"].map(base).fillna(0)
+        return pontos
+
+    def sincronizar(self, indice):
+        with self.lock:
+            atuais = set(indice.posicoes)
+            sumidas, novas = self.ids - atuais, list(atuais - self.ids)
+            if not sumidas and not novas: return
+            mexidos = set()
+            if sumidas:
+                saem = self.eventos['id'].isin(sumidas)
+                mexidos |= set(self.eventos.loc[saem, 'jogador'])
+                self.eventos = self.eventos[~saem]
+            novos = self.eventos.iloc[:0]
+            if novas:
+                linhas = indice.hist.iloc[np.concatenate([indice.posicoes[i] for i in novas])]
+                linhas = linhas[(linhas['tipo_registro'] == 'Jogo') & (linhas['gols'] > 0) & linhas['data'].notna()]
+                novos = pd.DataFrame({"id": linhas['id'].astype(str), "data": linhas['data'].astype("datetime64[ns]"),
+                                      "jogador": linhas['jogador'].astype(str), "gols": linhas['gols'].astype(float)})
+                self.eventos = pd.concat([self.eventos, novos], ignore_index=True)
+            self.ids = atuais
+            if novos.empty and not mexidos: return
+            ultima = self.pontos['data'].max()
+            if not mexidos and (self.pontos.empty or novos['data'].min() > ultima):
+                # Caso comum: a partida nova é a mais recente, os pontos dela vão para o fim
+                pontos = self._acumular(novos, self.totais)
+                self.pontos = pd.concat([self.pontos, pontos], ignore_index=True)
+            else:
+                mexidos |= set(novos['jogador'])
+                pontos = self._acumular(self.eventos[self.eventos['jogador'].isin(mexidos)])
+                self.pontos = pd.concat([self.pontos[~self.pontos['jogador'].isin(mexidos)], pontos], ignore_index=True)
+                self.totais = self.totais.drop(list(mexidos), errors="ignore")
+            self.totais = pontos.groupby("jogador")["acumulado"].max().combine_first(self.totais)
+
+    # Tabela larga só dos líderes (datas × top), com as datas reduzidas a `max_pontos`
+    # posições espalhadas; a última data sempre entra, então o placar final não muda
+    def grafico(self, top=TOP_CORRIDA, max_pontos=MAX_PONTOS_CORRIDA):
+        with self.lock:
+            totais = self.totais[self.totais > 0]
+            lideres = totais.rename_axis("jogador").reset_index(name="total").sort_values(["total", "jogador"], ascending=[False, True])["jogador"].head(top).tolist()
+            pontos = self.pontos[self.pontos['jogador'].isin(lideres)]
+        if pontos.empty: return pd.DataFrame()
+        largo = pontos.pivot_table(index="data", columns="jogador", values="acumulado", aggfunc="max").ffill().fillna(0)
+        if len(largo) > max_pontos:
+            largo = largo.iloc[np.unique(np.linspace(0, len(largo) - 1, max_pontos).round().astype(int))]
+        return largo[lideres]
+
+def get_corridas():
+    return grupo_atual().corridas
+
+# Uma série por aba ("jogos" ou a partição de uma temporada encerrada), compartilhada pelas sessões do grupo
+def carregar_corrida(sheet_name):
+    corrida = get_corridas().setdefault(sheet_name, CorridaArtilharia())
+    corrida.sincronizar(derivado(sheet_name, IndicePartidas))
+    return corrida
+
 # --- LOGIN COM BOTÃO (CORRIGIDO) ---
-SENHA_ADMIN = st.secrets.get("admin_password", "1234")
-SENHA_MODERADOR = st.secrets.get("moderator_password", "bola") 
-SENHA_FINANCEIRO = st.secrets.get("finance_password", "money")
+SENHA_ADMIN = config_grupo("admin_password", "1234")
+SENHA_MODERADOR = config_grupo("moderator_password", "bola") 
+SENHA_FINANCEIRO = config_grupo("finance_password", "money")
 
 # Formulário para evitar refresh automático
 with st.sidebar.form(key="login_form"):
@@ -299,13 +2300,13 @@ with st.sidebar.form(key="login_form"):
     btn_entrar = st.form_submit_button("ENTRAR 🔓", type="primary", use_container_width=True)
 
 user_role = "visitor"
-if senha_digitada == SENHA_ADMIN:
+if SENHA_ADMIN and senha_digitada == SENHA_ADMIN:
     user_role = "admin"
     st.sidebar.success("🔑 ADMIN MASTER")
-elif senha_digitada == SENHA_MODERADOR:
+elif SENHA_MODERADOR and senha_digitada == SENHA_MODERADOR:
     user_role = "moderator"
     st.sidebar.success("🛡️ MODERADOR")
-elif senha_digitada == SENHA_FINANCEIRO:
+elif SENHA_FINANCEIRO and senha_digitada == SENHA_FINANCEIRO:
     user_role = "finance"
     st.sidebar.warning("💰 TESOUREIRO")
 else:
@@ -315,416 +2316,479 @@ else:
     else:
         st.sidebar.info("👀 VISITANTE")
 
-df_elenco = carregar_elenco()
+load_all_data()  # aquece o cache de todas as abas num único lote
+
+if user_role == "admin":
+    cota = get_limitador().resumo()
+    st.sidebar.caption(f"📡 Google API: {cota['chamadas']} chamadas · {cota['limitadas']} seguradas · {cota['repetidas']} repetidas · {cota['falhas']} falhas")
+    if len(configs_grupos()) > 1:
+        st.sidebar.caption(f"👥 Grupos em memória: {', '.join(get_grupos().resumo())}")
+
+with st.sidebar:
+    if get_cache().de_disco():
+        @st.fragment(run_every=2)
+        def acompanhar_revalidacao():
+            velhas = get_cache().de_disco()
+            if not velhas: st.rerun()
+            salvo = datetime.fromtimestamp(min(velhas.values())).strftime("%d/%m %H:%M")
+            st.caption(f"🕒 Mostrando a cópia salva em {salvo}; atualizando com a planilha...")
+        acompanhar_revalidacao()
+    for msg in st.session_state.pop("erros_gravacao", []): st.error(msg)
+    if st.session_state.get("gravacoes"):
+        @st.fragment(run_every=2)
+        def acompanhar_gravacoes():
+            mostrar_status_gravacoes()
+            if not st.session_state.get("gravacoes"): st.rerun()
+        acompanhar_gravacoes()
 
 # --- NAVEGAÇÃO ---
+# Cada aba é um fragmento e só a aba aberta executa: clicar num widget reexecuta só aquela
+# aba, e trocar de aba reexecuta o script com a nova aba aberta (on_change="rerun").
 if user_role in ["admin", "moderator"]:
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["🎲 Sorteio", "📝 Súmula", "👥 Elenco", "💰 Financeiro", "🏦 Cofre", "📊 Estatísticas", "⚙️ Ajustes"])
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["🎲 Sorteio", "📝 Súmula", "👥 Elenco", "💰 Financeiro", "🏦 Cofre", "📊 Estatísticas", "⚙️ Ajustes"], key="aba_ativa", on_change="rerun")
 elif user_role == "finance":
-    tab4, tab5, tab6 = st.tabs(["💰 Financeiro", "🏦 Cofre", "📊 Estatísticas"])
+    tab4, tab5, tab6 = st.tabs(["💰 Financeiro", "🏦 Cofre", "📊 Estatísticas"], key="aba_ativa", on_change="rerun")
     tab1=tab2=tab3=tab7=st.container()
 else:
-    tab6, tab4, tab5 = st.tabs(["📊 Estatísticas", "💰 Financeiro", "🏦 Cofre"])
+    tab6, tab4, tab5 = st.tabs(["📊 Estatísticas", "💰 Financeiro", "🏦 Cofre"], key="aba_ativa", on_change="rerun")
     tab1=tab2=tab3=tab7=st.container()
 
+# Clique que só mexe no estado da própria aba reexecuta só o fragmento dela. Na primeira
+# execução depois de trocar de aba o fragmento roda dentro do script inteiro, e aí o Streamlit
+# só aceita o rerun completo.
+def rerun_fragmento():
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
 # === ABA 1: SORTEIO ===
-if user_role in ["admin", "moderator"]:
-    with tab1:
-        st.header("Montar Times")
-        
-        if 'temp_diaristas' not in st.session_state: st.session_state.temp_diaristas = []
-        if 'resultado_sorteio' not in st.session_state: st.session_state.resultado_sorteio = {}
-        if 'mapa_chegada' not in st.session_state: st.session_state.mapa_chegada = {}
+@st.fragment
+def aba_sorteio():
+    elenco = Elenco(carregar_elenco())
+    st.header("Montar Times")
 
-        c1, c2 = st.columns([1, 2])
-        with c1:
-            st.subheader("1. Diaristas")
-            with st.form("form_add_diarista", clear_on_submit=True):
-                novo_diarista = st.text_input("Nome:")
-                add_btn = st.form_submit_button("➕ Adicionar")
-                if add_btn and novo_diarista:
-                    st.session_state.temp_diaristas.append({"nome": novo_diarista, "nivel": 2})
-                    st.rerun()
-            
-            if st.session_state.temp_diaristas:
-                st.caption("Lista de Diaristas:")
-                # Exibição simplificada
-                lista_dia = [f"{i+1}. {d['nome']}" for i, d in enumerate(st.session_state.temp_diaristas)]
-                render_html_list("Diaristas Adicionados", lista_dia, "box-azul", "#1F6FEB")
-                
-                if st.button("Limpar Lista"):
-                    st.session_state.temp_diaristas = []; st.rerun()
+    if 'temp_diaristas' not in st.session_state: st.session_state.temp_diaristas = []
+    if 'resultado_sorteio' not in st.session_state: st.session_state.resultado_sorteio = {}
+    if 'mapa_chegada' not in st.session_state: st.session_state.mapa_chegada = {}
 
-        with c2:
-            st.subheader("2. Mensalistas & Sorteio")
-            with st.form("form_sorteio_geral"):
-                nomes = sorted(df_elenco['nome'].astype(str).tolist()) if not df_elenco.empty else []
-                punidos_nomes = df_elenco[df_elenco['punicao'] == 'Sim']['nome'].tolist()
-                
-                mens = st.multiselect("Presença (Selecione na ORDEM DE CHEGADA):", nomes, key="t1_m")
-                
-                if mens:
-                    ordem_texto = ", ".join([f"{i+1}. {n}" for i, n in enumerate(mens)])
-                    st.caption(f"🏁 **Ordem Atual:** {ordem_texto}")
-                
-                if punidos_nomes:
-                    st.error(f"⚠️ Punições Pendentes: {', '.join(punidos_nomes)}")
-
-                st.write("")
-                submitted = st.form_submit_button("🎲 REALIZAR SORTEIO", type="primary")
-                
-                if submitted:
-                    pool_completo = []
-                    
-                    for m in mens:
-                        row = df_elenco[df_elenco['nome'] == m].iloc[0]
-                        pool_completo.append({
-                            "nome": m,
-                            "time_pref": row['time'],
-                            "nivel": int(row['nivel']),
-                            "tipo": "Mensalista"
-                        })
-                        
-                    for d in st.session_state.temp_diaristas:
-                        pool_completo.append({
-                            "nome": f"{d['nome']} (D)",
-                            "time_pref": "Ambos",
-                            "nivel": int(d['nivel']),
-                            "tipo": "Diarista"
-                        })
-                    
-                    mapa_chegada = {p['nome'].replace(" (D)", ""): i+1 for i, p in enumerate(pool_completo)}
-                    st.session_state.mapa_chegada = mapa_chegada
-                    
-                    if not pool_completo: st.error("Ninguém selecionado!")
+    c1, c2 = st.columns([1, 2])
+    with c1:
+        st.subheader("1. Diaristas")
+        with st.form("form_add_diarista", clear_on_submit=True):
+            novo_diarista = st.text_input("Nome:")
+            add_btn = st.form_submit_button("➕ Adicionar")
+            if add_btn and novo_diarista:
+                st.session_state.temp_diaristas.append({"nome": novo_diarista, "nivel": 2})
+                rerun_fragmento()
+
+        if st.session_state.temp_diaristas:
+            st.caption("Lista de Diaristas:")
+            # Exibição simplificada
+            lista_dia = [f"{i+1}. {d['nome']}" for i, d in enumerate(st.session_state.temp_diaristas)]
+            render_html_list("Diaristas Adicionados", lista_dia, "box-azul", "#1F6FEB")
+
+            if st.button("Limpar Lista"):
+                st.session_state.temp_diaristas = []; rerun_fragmento()
+
+    with c2:
+        st.subheader("2. Mensalistas & Sorteio")
+        with st.form("form_sorteio_geral"):
+            nomes = elenco.nomes()
+            punidos_nomes = elenco.nomes(punicao='Sim')
+
+            mens = st.multiselect("Presença (Selecione na ORDEM DE CHEGADA):", nomes, key="t1_m")
+
+            if mens:
+                ordem_texto = ", ".join([f"{i+1}. {n}" for i, n in enumerate(mens)])
+                st.caption(f"🏁 **Ordem Atual:** {ordem_texto}")
+
+            if punidos_nomes:
+                st.error(f"⚠️ Punições Pendentes: {', '.join(punidos_nomes)}")
+
+            criterio = st.radio("Equilibrar por:", ["Nível", "Rating"], horizontal=True, key="t1_criterio",
+                                help="Rating: força calculada pelos resultados das súmulas (Elo). Nível: o 1-3 do elenco.")
+
+            st.write("")
+            cs1, cs2 = st.columns(2)
+            submitted = cs1.form_submit_button("🎲 REALIZAR SORTEIO", type="primary")
+            sugerir = cs2.form_submit_button("✨ SUGERIR 3 MELHORES", help="Equilibra força e entrosamento (taxa de vitória das duplas no histórico)")
+
+            if submitted or sugerir:
+                pool_completo = []
+                ratings = carregar_ratings(elenco) if criterio == "Rating" else {}
+
+                for m in mens:
+                    row = elenco.get(m)
+                    pool_completo.append({
+                        "nome": m,
+                        "time_pref": row['time'],
+                        "nivel": int(row['nivel']),
+                        "rating": ratings.get(m, rating_inicial(row['nivel'])),
+                        "tipo": "Mensalista"
+                    })
+
+                for d in st.session_state.temp_diaristas:
+                    pool_completo.append({
+                        "nome": f"{d['nome']} (D)",
+                        "time_pref": "Ambos",
+                        "nivel": int(d['nivel']),
+                        "rating": ratings.get(d['nome'], rating_inicial(d['nivel'])),
+                        "tipo": "Diarista"
+                    })
+
+                mapa_chegada = {p['nome'].replace(" (D)", ""): i+1 for i, p in enumerate(pool_completo)}
+                st.session_state.mapa_chegada = mapa_chegada
+
+                if not pool_completo: st.error("Ninguém selecionado!")
+                else:
+                    MAX = 20
+                    chave = "rating" if criterio == "Rating" else "nivel"
+                    if sugerir:
+                        quimica = carregar_entrosamento(elenco).quimica([p['nome'].replace(" (D)", "") for p in pool_completo[:MAX]])
+                        st.session_state.sugestoes_sorteio = sugerir_sorteios(pool_completo, quimica, MAX, chave_forca=chave, semente=time.time_ns() % 2**32)
                     else:
-                        MAX = 20
-                        titulares_objs = pool_completo[:MAX]
-                        reservas_names = [p['nome'] for p in pool_completo[MAX:]]
-                        
-                        verde = []
-                        preto = []
-                        
-                        # Correção de Sintaxe Aqui
-                        fixos_verde = [p for p in titulares_objs if p['time_pref'] == 'Verde']
-                        fixos_preto = [p for p in titulares_objs if p['time_pref'] == 'Preto']
-                        flutuantes = [p for p in titulares_objs if p['time_pref'] == 'Ambos']
-                        
-                        verde.extend([p['nome'] for p in fixos_verde])
-                        preto.extend([p['nome'] for p in fixos_preto])
-                        
-                        # Ordena flutuantes por Nível para balancear
-                        flutuantes.sort(key=lambda x: x['nivel']) 
-                        
-                        for p in flutuantes:
-                            if len(verde) <= len(preto): verde.append(p['nome'])
-                            else: preto.append(p['nome'])
-                        
-                        st.session_state.resultado_sorteio = {"verde": verde, "preto": preto, "reservas": reservas_names}
-
-        if 'resultado_sorteio' in st.session_state and st.session_state.resultado_sorteio:
-            res_data = st.session_state.resultado_sorteio
-            st.divider()
-            
-            def formatar_jogador(nome):
-                clean = nome.replace(" (D)", "")
-                ordem = st.session_state.mapa_chegada.get(clean, "?")
-                prefixo = f"<b style='color:#8B949E'>{ordem}º</b> "
-                status = ""
-                if clean in punidos_nomes:
-                    if len(res_data['reservas']) > 0: status = " <span style='color:#F85149; font-weight:bold'>🟥 (Sai)</span>"
-                    else: status = " <span style='color:#D29922; font-weight:bold'>⚠️ (Joga)</span>"
-                return f"{prefixo}{nome}{status}"
-
-            ca, cb = st.columns(2)
-            
-            with ca:
-                lista_verde = [formatar_jogador(x) for x in res_data['verde']]
-                render_html_list(f"VERDE ({len(res_data['verde'])})", lista_verde, "box-verde", "#2e7d32")
-
-            with cb:
-                lista_preto = [formatar_jogador(x) for x in res_data['preto']]
-                render_html_list(f"PRETO ({len(res_data['preto'])})", lista_preto, "box-preto", "#F0F6FC")
-            
-            if res_data['reservas']:
-                st.divider()
-                col_res, col_sai = st.columns(2)
-                
-                with col_res:
-                    lista_res = []
-                    for i, r in enumerate(res_data['reservas']):
-                        ordem_reserva = st.session_state.mapa_chegada.get(r.replace(" (D)", ""), "?")
-                        lista_res.append((f"<b>{i+1}.</b> {r}", f"Chegada: {ordem_reserva}º"))
-                    render_html_list("⏱️ Reservas (Fila)", lista_res, "box-ouro", "#D29922")
-                
-                with col_sai:
-                    titulares_todos = res_data['verde'] + res_data['preto']
-                    lista_saida_objs = []
-                    for p in titulares_todos:
-                        clean = p.replace(" (D)", "")
-                        num_chegada = st.session_state.mapa_chegada.get(clean, 0)
-                        is_punido = clean in punidos_nomes
-                        time_icon = "🟢" if p in res_data['verde'] else "⚫"
-                        lista_saida_objs.append({"nome": p, "num": num_chegada, "punido": is_punido, "icon": time_icon})
-                    
-                    lista_saida_objs.sort(key=lambda x: (x['punido'], x['num']), reverse=True)
-                    qtd_reservas = len(res_data['reservas'])
-                    
-                    lista_sai_fmt = []
-                    for k in range(min(qtd_reservas, len(lista_saida_objs))):
-                        alvo = lista_saida_objs[k]
-                        motivo = "<b style='color:#F85149'>🟥 PUNIÇÃO</b>" if alvo['punido'] else f"Chegada Nº {alvo['num']}"
-                        lista_sai_fmt.append((f"<b>{k+1}. {alvo['nome']}</b> {alvo['icon']}", motivo))
-                    
-                    render_html_list("🚨 Sugestão de Saída", lista_sai_fmt, "box-vermelho", "#F85149")
+                        st.session_state.sugestoes_sorteio = []
+                        st.session_state.resultado_sorteio = sortear_times(pool_completo, MAX, semente=time.time_ns(), chave_forca=chave)
+
+    sugestoes = st.session_state.get("sugestoes_sorteio")
+    if sugestoes:
+        st.divider()
+        st.subheader("✨ Sugestões (força + entrosamento)")
+        for i, (col, sug) in enumerate(zip(st.columns(len(sugestoes)), sugestoes)):
+            with col:
+                fmt = (lambda v: f"{v:.0f}") if sug['chave_forca'] == "rating" else str
+                st.markdown(f"**Opção {i + 1}**")
+                st.caption(f"Força: Verde {fmt(sug['forca_verde'])} × Preto {fmt(sug['forca_preto'])} · "
+                           f"Entrosamento: {sug['quimica_verde']:+.2f} × {sug['quimica_preto']:+.2f}")
+                st.markdown("🟢 " + ", ".join(sug['verde']))
+                st.markdown("⚫ " + ", ".join(sug['preto']))
+                if st.button("Usar esta", key=f"usar_sugestao_{i}"):
+                    st.session_state.resultado_sorteio = sug
+                    st.session_state.sugestoes_sorteio = []
+                    rerun_fragmento()
 
+    if 'resultado_sorteio' in st.session_state and st.session_state.resultado_sorteio:
+        res_data = st.session_state.resultado_sorteio
+        st.divider()
+
+        def formatar_jogador(nome):
+            clean = nome.replace(" (D)", "")
+            ordem = st.session_state.mapa_chegada.get(clean, "?")
+            prefixo = f"<b style='color:#8B949E'>{ordem}º</b> "
+            status = ""
+            if clean in punidos_nomes:
+                if len(res_data['reservas']) > 0: status = " <span style='color:#F85149; font-weight:bold'>🟥 (Sai)</span>"
+                else: status = " <span style='color:#D29922; font-weight:bold'>⚠️ (Joga)</span>"
+            return f"{prefixo}{nome}{status}"
+
+        ca, cb = st.columns(2)
+
+        with ca:
+            lista_verde = [formatar_jogador(x) for x in res_data['verde']]
+            render_html_list(f"VERDE ({len(res_data['verde'])})", lista_verde, "box-verde", "#2e7d32")
+
+        with cb:
+            lista_preto = [formatar_jogador(x) for x in res_data['preto']]
+            render_html_list(f"PRETO ({len(res_data['preto'])})", lista_preto, "box-preto", "#F0F6FC")
+
+        if 'diferenca' in res_data:
+            if res_data.get('chave_forca') == "rating":
+                st.caption(f"⚖️ Rating médio: Verde {res_data['forca_verde'] / max(len(res_data['verde']), 1):.0f} × Preto {res_data['forca_preto'] / max(len(res_data['preto']), 1):.0f} (diferença na soma {res_data['diferenca']:.0f}) · semente {res_data['semente']}")
+            else:
+                st.caption(f"⚖️ Soma de níveis: Verde {res_data['forca_verde']} × Preto {res_data['forca_preto']} (diferença {res_data['diferenca']}) · semente {res_data['semente']}")
+
+        if res_data['reservas']:
             st.divider()
-            if st.button("📂 CARREGAR ESTES TIMES NA SÚMULA", type="secondary", use_container_width=True):
-                todos = res_data['verde'] + res_data['preto'] + res_data['reservas']
-                m_sum = []
-                d_sum = []
-                nomes_bd = df_elenco['nome'].values.tolist()
-                for nome in todos:
-                    clean = nome.replace(" (D)", "").replace(" 🟥 (Sai)", "").replace(" ⚠️ (Joga)", "")
-                    if clean in nomes_bd: m_sum.append(clean)
-                    else: d_sum.append(clean)
-                st.session_state['import_sumula_mens'] = m_sum
-                st.session_state['import_sumula_diar'] = d_sum
-                st.success("✅ Enviado para a Súmula!")
+            col_res, col_sai = st.columns(2)
+
+            with col_res:
+                lista_res = []
+                for i, r in enumerate(res_data['reservas']):
+                    ordem_reserva = st.session_state.mapa_chegada.get(r.replace(" (D)", ""), "?")
+                    lista_res.append((f"<b>{i+1}.</b> {r}", f"Chegada: {ordem_reserva}º"))
+                render_html_list("⏱️ Reservas (Fila)", lista_res, "box-ouro", "#D29922")
+
+            with col_sai:
+                titulares_todos = res_data['verde'] + res_data['preto']
+                lista_saida_objs = []
+                for p in titulares_todos:
+                    clean = p.replace(" (D)", "")
+                    num_chegada = st.session_state.mapa_chegada.get(clean, 0)
+                    is_punido = clean in punidos_nomes
+                    time_icon = "🟢" if p in res_data['verde'] else "⚫"
+                    lista_saida_objs.append({"nome": p, "num": num_chegada, "punido": is_punido, "icon": time_icon})
+
+                lista_saida_objs.sort(key=lambda x: (x['punido'], x['num']), reverse=True)
+                qtd_reservas = len(res_data['reservas'])
+
+                lista_sai_fmt = []
+                for k in range(min(qtd_reservas, len(lista_saida_objs))):
+                    alvo = lista_saida_objs[k]
+                    motivo = "<b style='color:#F85149'>🟥 PUNIÇÃO</b>" if alvo['punido'] else f"Chegada Nº {alvo['num']}"
+                    lista_sai_fmt.append((f"<b>{k+1}. {alvo['nome']}</b> {alvo['icon']}", motivo))
+
+                render_html_list("🚨 Sugestão de Saída", lista_sai_fmt, "box-vermelho", "#F85149")
+
+        st.divider()
+        if st.button("📂 CARREGAR ESTES TIMES NA SÚMULA", type="secondary", use_container_width=True):
+            todos = res_data['verde'] + res_data['preto'] + res_data['reservas']
+            m_sum = []
+            d_sum = []
+            for nome in todos:
+                clean = nome.replace(" (D)", "").replace(" 🟥 (Sai)", "").replace(" ⚠️ (Joga)", "")
+                if clean in elenco: m_sum.append(clean)
+                else: d_sum.append(clean)
+            st.session_state['import_sumula_mens'] = m_sum
+            st.session_state['import_sumula_diar'] = d_sum
+            lados = {n.replace(" (D)", ""): "Verde" for n in res_data['verde']}
+            lados.update({n.replace(" (D)", ""): "Preto" for n in res_data['preto']})
+            st.session_state['import_sumula_lados'] = lados
+            st.success("✅ Enviado para a Súmula!")
+
+if user_role in ["admin", "moderator"]:
+    with tab1:
+        if tab1.open: aba_sorteio()
 
 # === ABA 2: SÚMULA (MODO TABELA) ===
+@st.fragment
+def aba_sumula():
+    elenco = Elenco(carregar_elenco())
+    st.header("Súmula")
+
+    mens_list = elenco.nomes()
+    imp_mens = st.session_state.get('import_sumula_mens', [])
+    imp_diar = st.session_state.get('import_sumula_diar', [])
+    imp_lados = st.session_state.get('import_sumula_lados', {})
+
+    todos_nomes = mens_list + imp_diar
+    todos_nomes = list(dict.fromkeys(todos_nomes))
+
+    df_sumula = pd.DataFrame({'Atleta': todos_nomes})
+    df_sumula['Jogou'] = df_sumula['Atleta'].apply(lambda x: x in imp_mens or x in imp_diar).astype(bool)
+    df_sumula['Lado'] = df_sumula['Atleta'].map(lambda x: imp_lados.get(x) or (elenco.time(x) if elenco.time(x) in ("Verde", "Preto") else None))
+    df_sumula['Gols'] = 0
+    df_sumula['Justificou'] = False
+
+    df_sumula = df_sumula.sort_values(by='Jogou', ascending=False).reset_index(drop=True)
+
+    with st.form("form_sumula_tabela"):
+        dt = st.date_input("Data do Jogo:", datetime.today())
+        v = st.radio("Vencedor:", ["Verde", "Preto", "Empate"], horizontal=True)
+
+        st.write("📝 **Marque quem jogou e digite os gols:**")
+
+        edited_df = st.data_editor(
+            df_sumula,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "Atleta": st.column_config.TextColumn("Atleta", disabled=True),
+                "Jogou": st.column_config.CheckboxColumn("Jogou?", help="Marque se esteve presente"),
+                "Lado": st.column_config.SelectboxColumn("Time", options=["Verde", "Preto"], help="Lado em que jogou nesta partida"),
+                "Gols": st.column_config.NumberColumn("Gols", min_value=0, max_value=20, step=1),
+                "Justificou": st.column_config.CheckboxColumn("Justificou Faltas?", help="Marque se não foi mas avisou")
+            },
+            height=600
+        )
+
+        submitted_sumula = st.form_submit_button("💾 SALVAR SÚMULA E APLICAR PUNIÇÕES", type="primary")
+
+        if submitted_sumula:
+            jogaram_df = edited_df[edited_df['Jogou'] == True]
+            justificaram_df = edited_df[edited_df['Justificou'] == True]
+            gols_df = edited_df[edited_df['Gols'] > 0]
+
+            jogaram_lista = jogaram_df['Atleta'].tolist()
+            justificaram_lista = justificaram_df['Atleta'].tolist()
+            gm = dict(zip(gols_df['Atleta'], gols_df['Gols']))
+            lados_jogo = {a: l for a, l in zip(jogaram_df['Atleta'], jogaram_df['Lado']) if l in ("Verde", "Preto")}
+
+            score_verde = 0; score_preto = 0
+            for atleta, qtd in gm.items():
+                if lados_jogo.get(atleta) == "Preto": score_preto += qtd
+                else: score_verde += qtd 
+
+            gid = int(datetime.now().timestamp())
+            nv = []
+            for p in jogaram_lista:
+                nv.append({"id": gid, "data": str(dt), "jogador": p, "tipo_registro": "Jogo", "gols": gm.get(p,0), "vencedor": v, "lado": lados_jogo.get(p, "")})
+            for j in justificaram_lista:
+                nv.append({"id": gid, "data": str(dt), "jogador": j, "tipo_registro": "Justificado", "gols": 0, "vencedor": "", "lado": ""})
+
+            df_nv = pd.DataFrame(nv, columns=COLUNAS_ABAS["jogos"])
+            if append_data(df_nv, "jogos"):
+                atualizar_estatisticas(df_nv, times_elenco=elenco.times())
+                atualizar_ratings(df_nv, elenco)
+                st.toast("Súmula Salva!", icon="✅")
+
+                df_antes = carregar_elenco(); elenco_atual = Elenco(df_antes)
+                alterou_elenco = False
+                jogaram_set = set(jogaram_lista); justificaram_set = set(justificaram_lista)
+                faltosos = [m for m in elenco_atual.nomes(tipo='Mensalista') if m not in jogaram_set and m not in justificaram_set]
+
+                for nome in faltosos:
+                    alterou_elenco |= elenco_atual.atualizar(nome, punicao="Sim")
+                for nome in jogaram_lista:
+                    alterou_elenco |= elenco_atual.atualizar(nome, punicao="Não")
+
+                if alterou_elenco:
+                    sync_data(df_antes, elenco_atual.para_dataframe(), "elenco")
+                    if faltosos: st.error(f"🚨 Punição aplicada para: {', '.join(faltosos)}")
+
+                st.session_state['ultimo_placar_dados'] = (score_verde, score_preto, gm, str(dt), lados_jogo)
+                if 'import_sumula_mens' in st.session_state: del st.session_state['import_sumula_mens']
+                if 'import_sumula_diar' in st.session_state: del st.session_state['import_sumula_diar']
+                if 'import_sumula_lados' in st.session_state: del st.session_state['import_sumula_lados']
+
+    if 'ultimo_placar_dados' in st.session_state:
+        sv, sp, sgm, sdt, slados = st.session_state['ultimo_placar_dados']
+        times_gols = {k: slados.get(k) or elenco.time(k, "Indefinido") for k in sgm}
+        st.divider()
+
+        c_res_v, c_res_p = st.columns(2)
+        with c_res_v:
+            render_html_list(f"VERDE: {sv}", [f"{k}: {v} Gols" for k, v in sgm.items() if times_gols[k] == 'Verde'], "box-verde", "#2e7d32")
+        with c_res_p:
+            render_html_list(f"PRETO: {sp}", [f"{k}: {v} Gols" for k, v in sgm.items() if times_gols[k] == 'Preto'], "box-preto", "#F0F6FC")
+
+        st.divider()
+        botoes_download_imagens([("Card do Jogo", f"jogo_{sdt}.png",
+                                  chave_imagem("card", sdt, sv, sp, sorted(sgm.items()), sorted(times_gols.items()), nome_grupo()),
+                                  renderizacao.gerar_card_jogo, (sdt, sv, sp, sgm, times_gols, nome_grupo().upper()))], key="card_jogo")
+
 if user_role in ["admin", "moderator"]:
     with tab2:
-        st.header("Súmula")
-        
-        mens_list = sorted(df_elenco['nome'].astype(str).tolist())
-        imp_mens = st.session_state.get('import_sumula_mens', [])
-        imp_diar = st.session_state.get('import_sumula_diar', [])
-        
-        todos_nomes = mens_list + imp_diar
-        todos_nomes = list(dict.fromkeys(todos_nomes))
-        
-        df_sumula = pd.DataFrame({'Atleta': todos_nomes})
-        df_sumula['Jogou'] = df_sumula['Atleta'].apply(lambda x: x in imp_mens or x in imp_diar)
-        df_sumula['Gols'] = 0
-        df_sumula['Justificou'] = False
-        
-        df_sumula = df_sumula.sort_values(by='Jogou', ascending=False).reset_index(drop=True)
-
-        with st.form("form_sumula_tabela"):
-            dt = st.date_input("Data do Jogo:", datetime.today())
-            v = st.radio("Vencedor:", ["Verde", "Preto", "Empate"], horizontal=True)
-            
-            st.write("📝 **Marque quem jogou e digite os gols:**")
-            
-            edited_df = st.data_editor(
-                df_sumula,
+        if tab2.open: aba_sumula()
+
+# === ABA 3: ELENCO (DIFERENCIADO ADMIN VS MODERADOR) ===
+@st.fragment
+def aba_elenco():
+    df_elenco = carregar_elenco(); elenco = Elenco(df_elenco)
+    st.header("Gerenciar Elenco")
+    with st.expander("✏️ Edição Rápida (Tabela Completa)", expanded=True):
+        with st.form("form_elenco_massa"):
+
+            # SEPARAÇÃO: Admin Vê Nível, Moderador NÃO Vê
+            if user_role == "admin":
+                df_to_show = df_elenco
+                col_conf = {
+                    "nome": st.column_config.TextColumn("Nome", disabled=True),
+                    "time": st.column_config.SelectboxColumn("Time", options=["Verde", "Preto", "Ambos"], required=True),
+                    "tipo": st.column_config.SelectboxColumn("Tipo", options=["Mensalista", "Diarista Frequente"], required=True),
+                    "punicao": st.column_config.SelectboxColumn("Punição", options=["Não", "Sim"], required=True),
+                    "nivel": st.column_config.SelectboxColumn("Nível (1=Craque)", options=[1, 2, 3], required=True)
+                }
+            else: # Moderador
+                df_to_show = df_elenco.drop(columns=["nivel"]) 
+                col_conf = {
+                    "nome": st.column_config.TextColumn("Nome", disabled=True),
+                    "time": st.column_config.SelectboxColumn("Time", options=["Verde", "Preto", "Ambos"], required=True),
+                    "tipo": st.column_config.SelectboxColumn("Tipo", options=["Mensalista", "Diarista Frequente"], required=True),
+                    "punicao": st.column_config.SelectboxColumn("Punição", options=["Não", "Sim"], required=True)
+                }
+
+            df_editor = st.data_editor(
+                df_to_show,
                 use_container_width=True,
                 hide_index=True,
-                column_config={
-                    "Atleta": st.column_config.TextColumn("Atleta", disabled=True),
-                    "Jogou": st.column_config.CheckboxColumn("Jogou?", help="Marque se esteve presente"),
-                    "Gols": st.column_config.NumberColumn("Gols", min_value=0, max_value=20, step=1),
-                    "Justificou": st.column_config.CheckboxColumn("Justificou Faltas?", help="Marque se não foi mas avisou")
-                },
-                height=600
+                column_config=col_conf,
+                height=400
             )
-            
-            submitted_sumula = st.form_submit_button("💾 SALVAR SÚMULA E APLICAR PUNIÇÕES", type="primary")
-            
-            if submitted_sumula:
-                jogaram_df = edited_df[edited_df['Jogou'] == True]
-                justificaram_df = edited_df[edited_df['Justificou'] == True]
-                gols_df = edited_df[edited_df['Gols'] > 0]
-                
-                jogaram_lista = jogaram_df['Atleta'].tolist()
-                justificaram_lista = justificaram_df['Atleta'].tolist()
-                gm = dict(zip(gols_df['Atleta'], gols_df['Gols']))
-                
-                score_verde = 0; score_preto = 0
-                for atleta, qtd in gm.items():
-                    t_jog = "Verde"
-                    row = df_elenco[df_elenco['nome'] == atleta]
-                    if not row.empty: t_jog = row.iloc[0]['time']
-                    if t_jog == "Verde": score_verde += qtd
-                    elif t_jog == "Preto": score_preto += qtd
-                    else: score_verde += qtd 
-                
-                hist = load_data("jogos", ["id", "data", "jogador", "tipo_registro", "gols", "vencedor"])
-                gid = int(datetime.now().timestamp())
-                nv = []
-                for p in jogaram_lista:
-                    nv.append({"id": gid, "data": str(dt), "jogador": p, "tipo_registro": "Jogo", "gols": gm.get(p,0), "vencedor": v})
-                for j in justificaram_lista:
-                    nv.append({"id": gid, "data": str(dt), "jogador": j, "tipo_registro": "Justificado", "gols": 0, "vencedor": ""})
-                
-                if save_data(pd.concat([hist, pd.DataFrame(nv)]), "jogos"):
-                    st.toast("Súmula Salva!", icon="✅")
-                    
-                    df_elenco_atual = carregar_elenco()
-                    alterou_elenco = False
-                    mensalistas_nomes = df_elenco_atual[df_elenco_atual['tipo'] == 'Mensalista']['nome'].tolist()
-                    faltosos = [m for m in mensalistas_nomes if m not in jogaram_lista and m not in justificaram_lista]
-                    
-                    for i, row in df_elenco_atual.iterrows():
-                        nome = row['nome']
-                        if nome in faltosos:
-                            if row['punicao'] != "Sim":
-                                df_elenco_atual.at[i, 'punicao'] = "Sim"
-                                alterou_elenco = True
-                        elif nome in jogaram_lista:
-                            if row['punicao'] != "Não":
-                                df_elenco_atual.at[i, 'punicao'] = "Não"
-                                alterou_elenco = True
-                    
-                    if alterou_elenco:
-                        save_data(df_elenco_atual, "elenco")
-                        if faltosos: st.error(f"🚨 Punição aplicada para: {', '.join(faltosos)}")
-                    
-                    st.session_state['ultimo_placar_dados'] = (score_verde, score_preto, gm, str(dt))
-                    if 'import_sumula_mens' in st.session_state: del st.session_state['import_sumula_mens']
-                    if 'import_sumula_diar' in st.session_state: del st.session_state['import_sumula_diar']
-
-        if 'ultimo_placar_dados' in st.session_state:
-            sv, sp, sgm, sdt = st.session_state['ultimo_placar_dados']
-            st.divider()
-            
-            c_res_v, c_res_p = st.columns(2)
-            with c_res_v:
-                render_html_list(f"VERDE: {sv}", [f"{k}: {v} Gols" for k, v in sgm.items() if df_elenco[df_elenco['nome']==k]['time'].values[0] == 'Verde' if not df_elenco[df_elenco['nome']==k].empty], "box-verde", "#2e7d32")
-            with c_res_p:
-                render_html_list(f"PRETO: {sp}", [f"{k}: {v} Gols" for k, v in sgm.items() if df_elenco[df_elenco['nome']==k]['time'].values[0] == 'Preto' if not df_elenco[df_elenco['nome']==k].empty], "box-preto", "#F0F6FC")
+            if st.form_submit_button("💾 SALVAR ALTERAÇÕES NA TABELA"):
+                if user_role == "moderator":
+                    for r in df_editor.to_dict("records"):
+                        elenco.atualizar(r['nome'], time=r['time'], tipo=r['tipo'], punicao=r['punicao'])
+                    salvo = sync_data(df_elenco, elenco.para_dataframe(), "elenco")
+                else:
+                    salvo = sync_data(df_elenco, df_editor, "elenco")
 
-            st.divider()
-            img_card = gerar_card_jogo(sdt, sv, sp, sgm, df_elenco)
-            st.download_button("📸 Baixar Card do Jogo", img_card, f"jogo_{sdt}.png", "image/png")
-
-# === ABA 3: ELENCO (DIFERENCIADO ADMIN VS MODERADOR) ===
-if user_role in ["admin", "moderator"]:
-    with tab3:
-        st.header("Gerenciar Elenco")
-        with st.expander("✏️ Edição Rápida (Tabela Completa)", expanded=True):
-            with st.form("form_elenco_massa"):
-                
-                # SEPARAÇÃO: Admin Vê Nível, Moderador NÃO Vê
-                if user_role == "admin":
-                    df_to_show = df_elenco
-                    col_conf = {
-                        "nome": st.column_config.TextColumn("Nome", disabled=True),
-                        "time": st.column_config.SelectboxColumn("Time", options=["Verde", "Preto", "Ambos"], required=True),
-                        "tipo": st.column_config.SelectboxColumn("Tipo", options=["Mensalista", "Diarista Frequente"], required=True),
-                        "punicao": st.column_config.SelectboxColumn("Punição", options=["Não", "Sim"], required=True),
-                        "nivel": st.column_config.SelectboxColumn("Nível (1=Craque)", options=[1, 2, 3], required=True)
-                    }
-                else: # Moderador
-                    df_to_show = df_elenco.drop(columns=["nivel"]) 
-                    col_conf = {
-                        "nome": st.column_config.TextColumn("Nome", disabled=True),
-                        "time": st.column_config.SelectboxColumn("Time", options=["Verde", "Preto", "Ambos"], required=True),
-                        "tipo": st.column_config.SelectboxColumn("Tipo", options=["Mensalista", "Diarista Frequente"], required=True),
-                        "punicao": st.column_config.SelectboxColumn("Punição", options=["Não", "Sim"], required=True)
-                    }
-
-                df_editor = st.data_editor(
-                    df_to_show,
-                    use_container_width=True,
-                    hide_index=True,
-                    column_config=col_conf,
-                    height=400
-                )
-                if st.form_submit_button("💾 SALVAR ALTERAÇÕES NA TABELA"):
-                    if user_role == "moderator":
-                        for i, r in df_editor.iterrows():
-                            idx_orig = df_elenco[df_elenco['nome'] == r['nome']].index
-                            if not idx_orig.empty:
-                                idx = idx_orig[0]
-                                df_elenco.at[idx, 'time'] = r['time']
-                                df_elenco.at[idx, 'tipo'] = r['tipo']
-                                df_elenco.at[idx, 'punicao'] = r['punicao']
-                        save_data(df_elenco, "elenco")
-                    else:
-                        save_data(df_editor, "elenco")
-                        
+                if salvo:
                     st.success("Elenco atualizado com sucesso!")
                     st.rerun()
-        
-        st.divider()
-        st.subheader("📋 Visualização Rápida")
-        cv, cp, ca = st.columns(3) # 3 Colunas agora
-        with cv:
-            verde_list = []
-            for _, r in df_elenco[df_elenco['time'] == 'Verde'].iterrows():
-                extra = f" (Nv {r['nivel']})" if user_role == "admin" else ""
-                verde_list.append(f"{r['nome']}{extra}")
-            render_html_list("ELENCO VERDE", sorted(verde_list), "box-verde", "#2e7d32")
-        with cp:
-            preto_list = []
-            for _, r in df_elenco[df_elenco['time'] == 'Preto'].iterrows():
-                extra = f" (Nv {r['nivel']})" if user_role == "admin" else ""
-                preto_list.append(f"{r['nome']}{extra}")
-            render_html_list("ELENCO PRETO", sorted(preto_list), "box-preto", "#F0F6FC")
-        with ca:
-            ambos_list = []
-            for _, r in df_elenco[df_elenco['time'] == 'Ambos'].iterrows():
-                extra = f" (Nv {r['nivel']})" if user_role == "admin" else ""
-                ambos_list.append(f"{r['nome']}{extra}")
-            render_html_list("CURINGAS (AMBOS)", sorted(ambos_list), "box-ouro", "#D29922")
 
-        st.divider()
-        c1, c2 = st.columns(2)
-        with c1:
-            st.subheader("➕ Adicionar Novo")
-            with st.form("form_add_jogador", clear_on_submit=True):
-                n = st.text_input("Nome").strip()
-                t = st.selectbox("Time", ["Verde", "Preto", "Ambos"])
-                tp = st.selectbox("Tipo", ["Mensalista", "Diarista Frequente"])
-                
-                nv = 2
-                if user_role == "admin":
-                    nv = st.selectbox("Nível (1=Craque)", [1, 2, 3], index=1)
-                
-                submitted_add = st.form_submit_button("Adicionar Jogador")
-                if submitted_add:
-                    if n and n not in df_elenco['nome'].values:
-                        novo_df = pd.concat([df_elenco, pd.DataFrame([{"nome":n,"time":t,"tipo":tp,"punicao":"Não", "nivel": nv}])], ignore_index=True)
-                        if save_data(novo_df, "elenco"): st.success(f"{n} Adicionado!"); st.rerun()
-                    elif n in df_elenco['nome'].values:
-                        st.error("Nome já existe!")
-        
-        with c2:
-            st.subheader("🗑️ Excluir")
-            s_del = st.selectbox("Selecione para excluir:", sorted(df_elenco['nome'].astype(str).tolist()))
-            if st.button("Excluir Jogador"):
-                if s_del:
-                    save_data(df_elenco[df_elenco['nome']!=s_del], "elenco")
-                    st.rerun()
+    st.divider()
+    st.subheader("📋 Visualização Rápida")
+    cv, cp, ca = st.columns(3) # 3 Colunas agora
+    with cv:
+        verde_list = []
+        for r in elenco.filtrar(time='Verde'):
+            extra = f" (Nv {r['nivel']})" if user_role == "admin" else ""
+            verde_list.append(f"{r['nome']}{extra}")
+        render_html_list("ELENCO VERDE", sorted(verde_list), "box-verde", "#2e7d32")
+    with cp:
+        preto_list = []
+        for r in elenco.filtrar(time='Preto'):
+            extra = f" (Nv {r['nivel']})" if user_role == "admin" else ""
+            preto_list.append(f"{r['nome']}{extra}")
+        render_html_list("ELENCO PRETO", sorted(preto_list), "box-preto", "#F0F6FC")
+    with ca:
+        ambos_list = []
+        for r in elenco.filtrar(time='Ambos'):
+            extra = f" (Nv {r['nivel']})" if user_role == "admin" else ""
+            ambos_list.append(f"{r['nome']}{extra}")
+        render_html_list("CURINGAS (AMBOS)", sorted(ambos_list), "box-ouro", "#D29922")
+
+    st.divider()
+    c1, c2 = st.columns(2)
+    with c1:
+        st.subheader("➕ Adicionar Novo")
+        with st.form("form_add_jogador", clear_on_submit=True):
+            n = st.text_input("Nome").strip()
+            t = st.selectbox("Time", ["Verde", "Preto", "Ambos"])
+            tp = st.selectbox("Tipo", ["Mensalista", "Diarista Frequente"])
+
+            nv = 2
+            if user_role == "admin":
+                nv = st.selectbox("Nível (1=Craque)", [1, 2, 3], index=1)
+
+            submitted_add = st.form_submit_button("Adicionar Jogador")
+            if submitted_add:
+                if n and n not in elenco:
+                    elenco.adicionar(nome=n, time=t, tipo=tp, punicao="Não", nivel=nv)
+                    if sync_data(df_elenco, elenco.para_dataframe(), "elenco"): st.success(f"{n} Adicionado!"); st.rerun()
+                elif n in elenco:
+                    st.error("Nome já existe!")
+
+    with c2:
+        st.subheader("🗑️ Excluir")
+        s_del = st.selectbox("Selecione para excluir:", elenco.nomes())
+        if st.button("Excluir Jogador"):
+            if s_del and elenco.remover(s_del):
+                if sync_data(df_elenco, elenco.para_dataframe(), "elenco"): st.rerun()
+
+if user_role in ["admin", "moderator"]:
+    with tab3:
+        if tab3.open: aba_elenco()
 
 # === ABA 4: FINANCEIRO ===
-with tab4:
+@st.fragment
+def aba_financeiro():
+    df_elenco = carregar_elenco()
     st.header("💰 Controle de Pagamentos")
-    cols_status = ["nome", "Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
-    df_checks = load_data("financeiro", cols_status)
-    if not df_elenco.empty:
-        df_mens = df_elenco[df_elenco['tipo'] == 'Mensalista'][['nome']].sort_values('nome')
-        if not df_checks.empty:
-            for nm in df_mens['nome']:
-                if nm not in df_checks['nome'].values:
-                    nv = {k: False for k in cols_status if k!='nome'}; nv['nome'] = nm
-                    df_checks = pd.concat([df_checks, pd.DataFrame([nv])], ignore_index=True)
-            df_checks = df_checks[df_checks['nome'].isin(df_mens['nome'])]
-        else:
-            df_checks = df_mens.copy(); 
-            for c in cols_status[1:]: df_checks[c] = False
-    
-    for c in cols_status[1:]: df_checks[c] = df_checks[c].astype(str).str.upper() == 'TRUE'
+    pagamentos = carregar_pagamentos()
+    if migracao_pendente():
+        if user_role == "admin":
+            with st.form("form_migrar_financeiro"):
+                st.warning("A grade antiga de pagamentos não diz de que ano é. Informe a temporada para migrá-la.")
+                ano_legado = st.number_input("Temporada da grade antiga", min_value=2000, max_value=2100, value=None, step=1)
+                if st.form_submit_button("Migrar Pagamentos") and ano_legado:
+                    carregar_pagamentos(int(ano_legado)); st.rerun()
+        else: st.info("Os pagamentos antigos aguardam a migração pelo admin.")
+    mensalistas = df_elenco.loc[df_elenco['tipo'] == 'Mensalista', 'nome'].tolist() if not df_elenco.empty else []
 
     hoje = datetime.today()
-    meses_map = {1:"Jan", 2:"Fev", 3:"Mar", 4:"Abr", 5:"Mai", 6:"Jun", 7:"Jul", 8:"Ago", 9:"Set", 10:"Out", 11:"Nov", 12:"Dez"}
-    mes_atual = meses_map[hoje.month]
-    pagos_count = df_checks[df_checks[mes_atual] == True].shape[0]
-    total_atletas = df_checks.shape[0]
-    pendentes_count = df_checks[df_checks[mes_atual] == False].shape[0]
-    
+    anos = sorted(set(pagamentos["ano"]) | {hoje.year}, reverse=True)
+    ano = st.selectbox("Temporada", anos, key="fin_ano") if len(anos) > 1 else hoje.year
+    df_checks = conciliar_pagamentos(mensalistas, pagamentos, ano)
+
+    # O mês atual é sempre do ano corrente, qualquer que seja a temporada escolhida
+    grade_atual = df_checks if ano == hoje.year else conciliar_pagamentos(mensalistas, pagamentos, hoje.year)
+    mes_atual = MESES[hoje.month - 1]
+    pagos_count = int(grade_atual[mes_atual].sum())
+    total_atletas = grade_atual.shape[0]
+    pendentes_count = total_atletas - pagos_count
+
     c_f1, c_f2 = st.columns(2)
     c_f1.info(f"Mês Atual ({mes_atual}): {pagos_count} pagos de {total_atletas}")
     if hoje.day > 20 and (total_atletas - pagos_count) > 0: c_f2.error(f"🚨 Pendentes: {total_atletas - pagos_count}")
@@ -735,10 +2799,21 @@ with tab4:
     if user_role in ["admin", "finance", "moderator"]:
         st.write("Marque quem está em dia:")
         with st.form("form_financeiro_checks"):
-            edited_checks = st.data_editor(df_checks, use_container_width=True, hide_index=True, key="editor_fin")
+            edited_checks = st.data_editor(df_checks, use_container_width=True, hide_index=True, key=f"editor_fin_{ano}",
+                                           column_config={"nome": st.column_config.TextColumn("Nome", disabled=True)})
+            valor = st.number_input("Valor da mensalidade (R$)", min_value=0.0, value=float(config_grupo("valor_mensalidade", 0)), step=5.0)
             if st.form_submit_button("💾 SALVAR LISTA (CONFIRMAR)"):
-                save_data(edited_checks, "financeiro"); st.success("Atualizado!"); st.rerun()
-    
+                novos, desmarcados = diferenca_pagamentos(df_checks, edited_checks, ano, valor)
+                if desmarcados:
+                    chave = pd.MultiIndex.from_arrays([pagamentos["nome"], pagamentos["mes"]])
+                    manter = ~((pagamentos["ano"] == ano).to_numpy() & chave.isin(list(desmarcados)))
+                    salvo = sync_data(pagamentos, pd.concat([pagamentos[manter], novos], ignore_index=True), "pagamentos")
+                elif not novos.empty:
+                    salvo = append_data(novos, "pagamentos")
+                else:
+                    salvo = True
+                if salvo: st.success("Atualizado!"); st.rerun()
+
     else:
         c1, c2 = st.columns(2)
         with c1:
@@ -756,22 +2831,22 @@ with tab4:
             </div>
             """, unsafe_allow_html=True)
 
-# === ABA 5: COFRE ===
-with tab5:
-    st.header("🏦 Cofre do Madrugão")
-    cols_mov = ["Data", "Descricao", "Valor"]
-    df_mov = load_data("saidas", cols_mov)
-    if not df_mov.empty: df_mov["Valor"] = pd.to_numeric(df_mov["Valor"], errors='coerce').fillna(0)
+with tab4:
+    if tab4.open: aba_financeiro()
 
-    total_entradas = df_mov[df_mov["Valor"] > 0]["Valor"].sum()
-    total_saidas = abs(df_mov[df_mov["Valor"] < 0]["Valor"].sum())
-    saldo_caixa = total_entradas - total_saidas
+# === ABA 5: COFRE ===
+@st.fragment
+def aba_cofre():
+    st.header(f"🏦 Cofre · {nome_grupo()}")
+    cofre = carregar_cofre()
+    total_entradas, total_saidas = cofre.totais()
+    saldo_caixa = cofre.saldo()
 
     k1, k2, k3 = st.columns(3)
     k1.metric("Entradas", f"R$ {total_entradas:,.2f}")
     k2.metric("Saídas", f"R$ {total_saidas:,.2f}")
     k3.metric("SALDO", f"R$ {saldo_caixa:,.2f}", delta="Caixa")
-    
+
     st.divider()
 
     if user_role in ["admin", "finance", "moderator"]:
@@ -785,14 +2860,20 @@ with tab5:
                 if st.form_submit_button("💾 REGISTRAR"):
                     if d_desc and d_valor > 0:
                         valor_final = d_valor if "Entrada" in d_tipo else -d_valor
-                        nova_mov = pd.DataFrame([{"Data": str(d_data), "Descricao": d_desc, "Valor": valor_final}])
-                        df_mov = pd.concat([df_mov, nova_mov], ignore_index=True)
-                        save_data(df_mov, "saidas"); st.success("Registrado!"); st.rerun()
-        
+                        nova_mov = pd.DataFrame([{"id": cofre.novos_ids(1)[0], "Data": str(d_data), "Descricao": d_desc, "Valor": valor_final}])
+                        append_data(nova_mov, "saidas"); st.success("Registrado!"); st.rerun()
+
+        with st.expander("📅 Fechamentos"):
+            periodo = st.radio("Período:", ["Mensal", "Anual"], horizontal=True, key="cofre_periodo")
+            relatorio = cofre.por_mes() if periodo == "Mensal" else cofre.por_ano()
+            st.dataframe(relatorio, hide_index=True, use_container_width=True, column_config={
+                c: st.column_config.NumberColumn(format="R$ %.2f") for c in ("entradas", "saidas", "saldo")})
+
         st.write("📝 **Histórico (Edição em Lote):**")
-        if not df_mov.empty:
-            df_mov['Data'] = pd.to_datetime(df_mov['Data'], errors='coerce')
-            
+        if len(cofre):
+            # Saldo acumulado (calculado uma vez por versão da aba) só para leitura; não vai para a planilha
+            df_mov = cofre.movs[COLUNAS_ABAS["saidas"] + ["Saldo"]]
+
             with st.form("form_cofre_tabela"):
                 edited_df = st.data_editor(
                     df_mov,
@@ -800,87 +2881,171 @@ with tab5:
                     hide_index=True,
                     num_rows="dynamic",
                     column_config={
+                        "id": None,
                         "Valor": st.column_config.NumberColumn(format="R$ %.2f"),
-                        "Data": st.column_config.DateColumn(format="DD/MM/YYYY")
+                        "Data": st.column_config.DateColumn(format="DD/MM/YYYY"),
+                        "Saldo": st.column_config.NumberColumn(format="R$ %.2f", disabled=True),
                     },
                     key="editor_cofre"
                 )
                 if st.form_submit_button("💾 SALVAR ALTERAÇÕES"):
-                    edited_df['Data'] = edited_df['Data'].astype(str)
-                    save_data(edited_df, "saidas"); st.success("Atualizado!"); st.rerun()
-            
+                    edited_df = edited_df.drop(columns="Saldo")
+                    sem_id = edited_df["id"].isna()
+                    edited_df.loc[sem_id, "id"] = cofre.novos_ids(int(sem_id.sum()))
+                    if sync_data(df_mov.drop(columns="Saldo"), edited_df, "saidas"): st.success("Atualizado!"); st.rerun()
+
             with st.expander("🗑️ Apagar Movimentação (Modo Lista)"):
-                df_temp = df_mov.copy().sort_values("Data", ascending=False)
-                opcoes_exclusao = []
-                for idx, row in df_temp.iterrows():
-                    dt_str = row['Data'].strftime('%d/%m/%Y') if pd.notnull(row['Data']) else "Data Inválida"
-                    opcoes_exclusao.append(f"[{idx}] {dt_str} | {row['Descricao']} | R$ {row['Valor']:.2f}")
-                
-                if opcoes_exclusao:
-                    selecionado = st.selectbox("Selecione para excluir:", options=opcoes_exclusao, key="sel_del_cofre")
-                    if st.button("🗑️ EXCLUIR ITEM", key="btn_del_cofre"):
-                        idx_to_drop = int(selecionado.split("]")[0].replace("[", ""))
-                        df_novo = df_mov.drop(idx_to_drop)
-                        df_novo['Data'] = df_novo['Data'].astype(str)
-                        save_data(df_novo, "saidas"); st.success("Apagado!"); st.rerun()
+                recentes = cofre.movs.iloc[::-1]
+                rotulos = dict(zip(recentes["id"], recentes["Data"].dt.strftime('%d/%m/%Y').fillna("Data Inválida") + " | " +
+                                   recentes["Descricao"].astype(str) + " | R$ " + recentes["Valor"].map("{:.2f}".format)))
+                selecionado = st.selectbox("Selecione para excluir:", options=list(rotulos), format_func=rotulos.get, key="sel_del_cofre")
+                if st.button("🗑️ EXCLUIR ITEM", key="btn_del_cofre"):
+                    remove_data("saidas", "id", [int(selecionado)]); st.success("Apagado!"); st.rerun()
     else:
         st.info("ℹ️ Detalhes restritos à administração.")
 
+with tab5:
+    if tab5.open: aba_cofre()
+
 # === ABA 6: ESTATÍSTICAS ===
-with tab6:
+@st.fragment
+def aba_estatisticas():
+    elenco = Elenco(carregar_elenco())
     st.header("📊 Estatísticas")
-    hist = load_data("jogos", ["id", "data", "jogador", "tipo_registro", "gols", "vencedor"])
-    if not hist.empty:
-        vt = hist[['id','vencedor']].drop_duplicates()['vencedor'].value_counts()
+    hist = load_data("jogos")
+    estat = load_data("estatisticas")
+    if estat.empty and not hist.empty:
+        # Primeira vez (ou tabela apagada): materializa a partir do histórico
+        reconstruir_estatisticas(hist, elenco)
+        estat = load_data("estatisticas")
+    vt = load_data("placar").set_index("resultado")["partidas"]
+
+    # Temporada aberta: tabelas materializadas; encerradas e "todas": só os resumos
+    encerradas = anos_arquivados()
+    visao = "Temporada atual"
+    if encerradas:
+        visao = st.selectbox("Temporada:", ["Temporada atual"] + [str(a) for a in encerradas] + ["Todas as temporadas"], key="estat_temporada")
+    if visao == "Todas as temporadas":
+        por_jogador, placar = resumo_temporadas()
+        estat = somar_agregados(estat.set_index("jogador")[COLUNAS_ABAS["estatisticas"][1:]], por_jogador, 1).rename_axis("jogador").reset_index()
+        vt = somar_agregados(vt, placar, 1)
+        aba_corrida = None
+    elif visao != "Temporada atual":
+        por_jogador, vt = resumo_temporadas([int(visao)])
+        estat = por_jogador.rename_axis("jogador").reset_index()
+        aba_corrida = aba_temporada(visao)
+    else: aba_corrida = "jogos"
+
+    if not estat.empty:
         c1,c2,c3 = st.columns(3)
         c1.metric("Verde 🦉 💚", vt.get("Verde",0))
         c2.metric("Preto 🦉 🖤", vt.get("Preto",0))
         c3.metric("Empates", vt.get("Empate",0))
-        
+
         ca, cb = st.columns(2)
         with ca:
-            hist['gols'] = pd.to_numeric(hist['gols'], errors='coerce').fillna(0)
-            g = hist[hist['gols']>0].groupby("jogador")['gols'].sum().sort_values(ascending=False).reset_index()
-            
+            g = estat[estat['gols']>0][['jogador', 'gols']].sort_values(['gols', 'jogador'], ascending=[False, True]).reset_index(drop=True)
+
             artilharia_html = []
             if not g.empty:
                 max_gols = g['gols'].max()
                 for i, r in g.iterrows():
                     icone = "🥇" if r['gols'] == max_gols else f"{i+1}º"
                     artilharia_html.append((f"{icone} {r['jogador']}", f"{int(r['gols'])} Gols"))
-            
+
             render_html_list("⚽ ARTILHARIA", artilharia_html, "box-ouro", "#fbc02d")
-            
-            g_print = g.copy(); g_print.columns = ["ATLETA", "GOLS"]
-            st.download_button("📸 Baixar Imagem", gerar_imagem_bonita(g_print, "ARTILHARIA"), "artilharia.png", "image/png")
 
         with cb:
-            j = hist[hist['tipo_registro']=='Jogo'].groupby("jogador").size().sort_values(ascending=False)
+            j = estat[estat['jogos']>0].sort_values(['jogos', 'jogador'], ascending=[False, True]).set_index("jogador")['jogos']
             presenca_html = []
             for jogador, qtd in j.items():
                 presenca_html.append((jogador, f"{qtd} Jogos"))
             render_html_list("📅 PRESENÇA", presenca_html, "box-azul", "#1565c0")
 
+        g_print = g.copy(); g_print.columns = ["ATLETA", "GOLS"]
+        j_print = j.reset_index(); j_print.columns = ["ATLETA", "JOGOS"]
+        botoes_download_imagens([
+            ("Artilharia", "artilharia.png", chave_imagem("tabela", "ARTILHARIA", g_print), renderizacao.gerar_imagem_bonita, (g_print, "ARTILHARIA")),
+            ("Presença", "presenca.png", chave_imagem("tabela", "PRESENÇA", j_print), renderizacao.gerar_imagem_bonita, (j_print, "PRESENÇA")),
+        ], key="tabelas_estatisticas")
+
         st.divider(); st.subheader("📈 Corrida da Artilharia")
-        df_gols = hist[(hist['tipo_registro'] == 'Jogo')]
-        if not df_gols.empty:
-            pivot = df_gols.pivot_table(index='data', columns='jogador', values='gols', aggfunc='sum').fillna(0)
-            st.line_chart(pivot.cumsum())
-        else: st.info("Sem dados.")
+        if aba_corrida is None: st.caption("A corrida é mostrada uma temporada por vez.")
+        else:
+            top = st.slider("Mostrar os primeiros:", 3, 20, TOP_CORRIDA, key="corrida_top")
+            corrida = carregar_corrida(aba_corrida).grafico(top)
+            if not corrida.empty: st.line_chart(corrida)
+            else: st.info("Sem dados.")
     else: st.info("Sem dados.")
 
+with tab6:
+    if tab6.open: aba_estatisticas()
+
 # === ABA 7: AJUSTES ===
+POR_PAGINA_AJUSTES = 15
+
+@st.fragment
+def aba_ajustes():
+    elenco = Elenco(carregar_elenco())
+    st.header("Ajustes")
+    indice = get_indice_partidas()
+    if len(indice):
+        datas = indice.resumo['data'].dropna()
+        limites = (datas.min(), datas.max()) if not datas.empty else (None, None)
+        # Com key, o date_input só lê value no 1º render: quando o intervalo das partidas muda (súmula nova,
+        # partida apagada), a ponta que estava no limite antigo ou ficou fora do novo acompanha o intervalo
+        anterior = st.session_state.get("aj_limites", (None, None))
+        if anterior != limites:
+            st.session_state["aj_limites"] = limites
+            for chave, atual, antigo in (("aj_ini", limites[0], anterior[0]), ("aj_fim", limites[1], anterior[1])):
+                valor = st.session_state.get(chave)
+                if valor is None or valor == antigo or atual is None or not limites[0] <= valor <= limites[1]:
+                    st.session_state[chave] = atual
+        cf1, cf2, cf3 = st.columns([1, 1, 1])
+        inicio = cf1.date_input("De", format="DD/MM/YYYY", key="aj_ini")
+        fim = cf2.date_input("Até", format="DD/MM/YYYY", key="aj_fim")
+        partidas = indice.filtrar(inicio, fim)
+        paginas = max(1, -(-len(partidas) // POR_PAGINA_AJUSTES))
+        pagina = cf3.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, key="aj_pag")
+        st.caption(f"{len(partidas)} de {len(indice)} partidas")
+        for _, r in partidas.iloc[(pagina - 1) * POR_PAGINA_AJUSTES:pagina * POR_PAGINA_AJUSTES].iterrows():
+            c1,c2 = st.columns([4,1])
+            dt = r['data'].strftime("%d/%m/%Y") if pd.notna(r['data']) else "?"
+            c1.write(f"📅 {dt} - {r['vencedor'] or '—'} · {r['atletas']} atletas · {r['gols']} gols")
+            if c2.button("Apagar", key=f"d_{r['id']}"):
+                if apagar_partida(indice, r['id'], elenco): st.rerun()
+    else: st.info("Nenhuma partida registrada.")
+
+    if user_role == "admin":
+        st.divider()
+        st.subheader("🧹 Manutenção")
+        st.caption("Reescreve a aba de jogos inteira: remove linhas vazias ou duplicadas e ordena por data. Use só se o histórico estiver bagunçado.")
+        if st.button("Compactar Histórico de Jogos"):
+            removidas = compactar_aba("jogos", COLUNAS_ABAS["jogos"], ordem=["data", "id"])
+            if removidas is not None: st.success(f"Histórico compactado ({removidas} linhas removidas)."); st.rerun()
+        st.caption("Refaz do zero as tabelas de estatísticas (artilharia, presença, vitórias) da temporada aberta a partir do histórico.")
+        if st.button("Recalcular Estatísticas"):
+            if reconstruir_estatisticas(indice.hist, elenco): st.success("Estatísticas recalculadas!"); st.rerun()
+        st.caption("Refaz os ratings (Elo) de todos os jogadores repassando as partidas de todas as temporadas em ordem. Use depois de importar ou corrigir súmulas antigas.")
+        if st.button("Recalcular Ratings"):
+            if reconstruir_ratings(carregar_historico_completo(), elenco): st.success("Ratings recalculados!"); st.rerun()
+
+        st.subheader("🗄️ Temporadas")
+        anos_hist = indice.hist['data'].dt.year
+        antigas = sorted(int(a) for a in anos_hist.dropna().unique() if a < datetime.today().year)
+        encerradas = anos_arquivados()
+        if encerradas: st.caption(f"Temporadas arquivadas: {', '.join(map(str, encerradas))}")
+        if antigas:
+            st.warning(f"A aba de jogos ainda tem partidas de {', '.join(map(str, antigas))}. Arquive para manter a leitura leve.")
+            if st.button("Arquivar Temporadas Encerradas"):
+                fechados = arquivar_temporadas(elenco)
+                if fechados: st.success(f"Temporada(s) {', '.join(map(str, fechados))} arquivada(s)!"); st.rerun()
+        else:
+            st.caption("Só a temporada aberta está na aba de jogos.")
+
 if user_role in ["admin", "moderator"]:
     with tab7:
-        st.header("Ajustes")
-        hist = load_data("jogos", ["id", "data", "jogador", "tipo_registro", "gols", "vencedor"])
-        if not hist.empty:
-            jg = hist.drop_duplicates(subset=['id'])[['id','data','vencedor']].sort_values('data', ascending=False)
-            for i, r in jg.iterrows():
-                c1,c2 = st.columns([4,1])
-                c1.write(f"📅 {r['data']} - {r['vencedor']}")
-                if c2.button("Apagar", key=f"d_{r['id']}"):
-                    save_data(hist[hist['id']!=r['id']], "jogos"); st.rerun()
+        if tab7.open: aba_ajustes()
 
 st.write(""); st.write(""); st.divider()
 st.markdown("""<div style='text-align: center; color: grey; font-size: 14px;'>Desenvolvido por <b>Lucas Guilherme</b> | 📱 (81) 99964-4971 (wpp)</div>""", unsafe_allow_html=True)
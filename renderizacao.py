@@ -0,0 +1,60 @@
+# --- FUNÇÕES VISUAIS DE GERAÇÃO DE IMAGEM ---
+# Rodam nos processos do pool de renderização do madrugao.py, por isso ficam num módulo
+# importável e sem Streamlit. Usam só a API orientada a objetos do matplotlib (Figure +
+# canvas Agg): nada de estado global do pyplot, então cada figura morre com a função.
+import io
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+def gerar_imagem_bonita(df, titulo="Relatório"):
+    cor_cabecalho = '#1b5e20'
+    cor_texto_cabecalho = 'white'
+    cor_linha_par = '#f1f8e9'
+    cor_linha_impar = 'white'
+
+    fig = Figure(figsize=(12, len(df) * 0.8 + 2)); FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.axis('tight')
+    ax.axis('off')
+
+    ax.set_title(titulo.upper(), fontsize=20, weight='bold', color='#1b5e20', pad=25)
+    tabela = ax.table(cellText=df.values, colLabels=df.columns, loc='center', cellLoc='center')
+    tabela.auto_set_font_size(False); tabela.set_fontsize(14); tabela.scale(1.2, 2.0)
+
+    for (row, col), cell in tabela.get_celld().items():
+        cell.set_edgecolor('#cfd8dc'); cell.set_linewidth(1)
+        if row == 0:
+            cell.set_facecolor(cor_cabecalho); cell.set_text_props(color=cor_texto_cabecalho, weight='bold'); cell.set_height(0.12)
+        else:
+            cell.set_height(0.1)
+            if row % 2 == 0: cell.set_facecolor(cor_linha_par)
+            else: cell.set_facecolor(cor_linha_impar)
+
+    buf = io.BytesIO(); fig.savefig(buf, format='png', bbox_inches='tight', dpi=300, transparent=False)
+    return buf.getvalue()
+
+def gerar_card_jogo(data_jogo, placar_verde, placar_preto, gols_map, times, rodape="PELADA MADRUGÃO"):
+    art_verde = []; art_preto = []
+    for jogador, gols in gols_map.items():
+        if gols > 0:
+            time_jogador = times.get(jogador, "Indefinido")
+            txt = f"{jogador}" if gols == 1 else f"{jogador} ({gols})"
+            if time_jogador == 'Verde': art_verde.append(txt)
+            else: art_preto.append(txt)
+
+    fig = Figure(figsize=(10, 8)); FigureCanvasAgg(fig)
+    ax = fig.subplots(); ax.axis('off'); fig.patch.set_facecolor('#f8f9fa')
+    ax.text(0.5, 0.95, "RESULTADO FINAL", ha='center', va='center', fontsize=22, weight='bold', color='#333')
+    ax.text(0.5, 0.88, f"{data_jogo}", ha='center', va='center', fontsize=12, color='#666')
+    ax.text(0.25, 0.75, "VERDE", ha='center', fontsize=18, weight='bold', color='#2E7D32')
+    ax.text(0.75, 0.75, "PRETO", ha='center', fontsize=18, weight='bold', color='#212121')
+    ax.text(0.5, 0.65, f"{placar_verde}  x  {placar_preto}", ha='center', va='center', fontsize=50, weight='bold')
+    ax.plot([0.1, 0.9], [0.55, 0.55], color='#ddd', lw=2)
+    ax.text(0.5, 0.50, "GOLS", ha='center', fontsize=14, color='#888')
+    y = 0.45
+    for a in art_verde: ax.text(0.25, y, a, ha='center', fontsize=12, color='#2E7D32'); y -= 0.05
+    y = 0.45
+    for a in art_preto: ax.text(0.75, y, a, ha='center', fontsize=12, color='#212121'); y -= 0.05
+    ax.text(0.5, 0.05, rodape, ha='center', fontsize=10, color='#aaa', style='italic')
+    buf = io.BytesIO(); fig.savefig(buf, format='png', bbox_inches='tight', dpi=150, facecolor='#f8f9fa')
+    return buf.getvalue()
@@ -0,0 +1,60 @@
+# Os testes importam o app sem `streamlit run` (modo "bare"): os widgets viram no-ops e os
+# dados ficam na PlanilhaFake em memória, sem rede nem credenciais.
+import os
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+import streamlit as st
+from streamlit import config
+
+PASTA = tempfile.mkdtemp(prefix="madrugao-testes-")
+SECRETS = os.path.join(PASTA, "secrets.toml")
+with open(SECRETS, "w") as f:
+    # Cota folgada: o limitador é do processo e seguraria a suíte inteira em 50 chamadas por minuto.
+    # Dois grupos, os dois em memória; a senha de cima só vale para o padrão.
+    f.write(f'storage_backend = "memoria"\nsnapshot_dir = "{PASTA}/snapshot"\nintervalo_sonda = 0\ncota_por_minuto = 100000\n'
+            'admin_password = "segredo"\n\n[grupos.madrugao]\n\n[grupos.outro]\nnome = "Outra Pelada"\n')
+config.set_option("secrets.files", [SECRETS])
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import madrugao
+
+
+# Cada teste começa com grupos novos (planilha falsa vazia), sem cópia em disco e sem sessão
+@pytest.fixture
+def app():
+    registro = madrugao.get_grupos()
+    for grupo in list(registro.ativos.values()):
+        grupo.fila.drenar(5)
+        grupo.fila.encerrar()
+    registro.ativos.clear()
+    shutil.rmtree(os.path.join(PASTA, "snapshot"), ignore_errors=True)
+    st.session_state.clear()
+    st.session_state["grupo"] = madrugao.GRUPO_PADRAO
+    yield madrugao
+    madrugao.get_fila().drenar(5)
+
+
+# Grava direto na fonte, como uma edição feita na planilha por fora do app
+@pytest.fixture
+def planilha(app):
+    def gravar(sheet_name, df):
+        app.get_storage().gravar(df, sheet_name)
+    return gravar
+
+
+# Partidas no formato da aba de jogos: (id, data, vencedor, {jogador: (lado, gols)})
+def partidas(*jogos):
+    linhas = [
+        {"id": id_partida, "data": data, "jogador": jogador, "tipo_registro": "Jogo", "gols": gols, "vencedor": vencedor, "lado": lado}
+        for id_partida, data, vencedor, atletas in jogos
+        for jogador, (lado, gols) in atletas.items()
+    ]
+    return pd.DataFrame(linhas, columns=madrugao.COLUNAS_ABAS["jogos"])
+
+
+def elenco(**times):
+    return pd.DataFrame({"nome": list(times), "time": list(times.values()), "tipo": "Mensalista", "punicao": "Não", "nivel": 2})
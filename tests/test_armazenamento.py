@@ -0,0 +1,74 @@
+import sqlite3
+
+import pandas as pd
+from conftest import elenco
+
+
+def test_backend_memoria_usa_a_planilha_falsa(app):
+    storage = app.get_storage()
+    assert isinstance(storage.planilha, app.PlanilhaFake)
+    assert storage.ler("elenco") is None
+
+
+def test_planilha_falsa_devolve_o_que_o_sheets_devolveria(app):
+    storage = app.ArmazenamentoSheets(app.PlanilhaFake())
+    storage.gravar(pd.DataFrame({"nome": ["Ana", "Bia"], "pago": [True, False], "gols": [2, None]}), "teste")
+    lido = storage.ler("teste")
+    assert lido.to_dict("records") == [{"nome": "Ana", "pago": "TRUE", "gols": 2.0}, {"nome": "Bia", "pago": "FALSE", "gols": ""}]
+
+
+def test_sqlite_ida_e_volta(app, tmp_path):
+    storage = app.ArmazenamentoSQL(str(tmp_path / "teste.db"))
+    assert storage.ler("elenco") is None
+    storage.gravar(elenco(Ana="Verde", Bia="Preto"), "elenco")
+    assert storage.ler("elenco").to_dict("records") == elenco(Ana="Verde", Bia="Preto").to_dict("records")
+    storage.gravar(elenco(Caio="Ambos"), "elenco")
+    assert storage.ler("elenco")["nome"].tolist() == ["Caio"]
+
+
+def indices(caminho):
+    return {nome for (nome,) in sqlite3.connect(caminho).execute("SELECT name FROM sqlite_master WHERE type='index'")}
+
+
+# Plano das consultas que remover/sincronizar fazem, com a mesma expressão da chave
+def plano(app, caminho, sheet_name, chave):
+    onde = " AND ".join(f"{app.texto_sql(c)} = ?" for c in chave)
+    linhas = sqlite3.connect(caminho).execute(f'EXPLAIN QUERY PLAN DELETE FROM "{sheet_name}" WHERE {onde}', ["1"] * len(chave))
+    return " ".join(linha[-1] for linha in linhas)
+
+
+def test_sqlite_cria_os_indices_da_aba(app, tmp_path):
+    caminho = str(tmp_path / "teste.db")
+    storage = app.ArmazenamentoSQL(caminho)
+    storage.gravar(pd.DataFrame({"id": [1], "data": ["2026-01-04"], "jogador": ["Ana"], "gols": [1]}), "jogos")
+    assert indices(caminho) == {"ix_jogos_id_texto"}
+    assert "USING INDEX ix_jogos_id_texto" in plano(app, caminho, "jogos", ["id"])
+
+
+def test_sqlite_busca_pela_chave_composta_usa_o_indice(app, tmp_path):
+    caminho = str(tmp_path / "teste.db")
+    storage = app.ArmazenamentoSQL(caminho)
+    storage.gravar(pd.DataFrame({"nome": ["Ana", "Bia"], "ano": [2026, 2026], "mes": [1, ""], "pago_em": "", "valor": 50}), "pagamentos")
+    assert "USING INDEX ix_pagamentos_nome_ano_mes_texto" in plano(app, caminho, "pagamentos", ["nome", "ano", "mes"])
+
+
+def test_sqlite_tabela_antiga_ganha_o_indice_na_primeira_remocao(app, tmp_path):
+    caminho = str(tmp_path / "teste.db")
+    antiga = sqlite3.connect(caminho)
+    pd.DataFrame({"id": [1, 1, 2], "jogador": ["Ana", "Bia", "Ana"]}).to_sql("jogos", antiga, index=False)
+    antiga.close()
+    storage = app.ArmazenamentoSQL(caminho)
+    storage.remover(pd.DataFrame({"id": ["1"]}), "jogos")
+    assert indices(caminho) == {"ix_jogos_id_texto"}
+    assert storage.ler("jogos")["id"].tolist() == [2]
+
+
+def test_sqlite_importa_do_espelho_uma_vez_e_replica_as_gravacoes(app, tmp_path):
+    planilha = app.PlanilhaFake({"elenco": elenco(Ana="Verde")})
+    espelho = app.ArmazenamentoSheets(planilha)
+    storage = app.ArmazenamentoSQL(str(tmp_path / "teste.db"), espelho)
+    assert storage.ler("elenco")["nome"].tolist() == ["Ana"]
+    espelho.gravar(elenco(Bia="Preto"), "elenco")
+    assert storage.ler("elenco")["nome"].tolist() == ["Ana"]
+    storage.gravar(elenco(Caio="Ambos"), "elenco")
+    assert espelho.ler("elenco")["nome"].tolist() == ["Caio"]
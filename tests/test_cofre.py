@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pandas as pd
+
+
+def movimentos(*linhas):
+    return pd.DataFrame(linhas, columns=["id", "Data", "Descricao", "Valor"])
+
+
+LIVRO = movimentos(
+    [1, "2026-01-05", "Mensalidades", 500.0],
+    [2, "2026-01-20", "Bola", -120.0],
+    [3, "2026-02-03", "Mensalidades", 450.0],
+    [4, "2026-02-10", "Juiz", -80.0],
+    [5, "2026-03-02", "Mensalidades", 300.0],
+    [6, "", "Acerto antigo", -50.0],
+)
+
+
+def cofre(app, df):
+    return app.Cofre(app.tipar_dados(df, "saidas"))
+
+
+def test_fechamentos_mensais_acumulam_o_saldo(app):
+    livro = cofre(app, LIVRO)
+    meses = livro.por_mes()
+    assert meses["mes"].tolist() == ["01/2026", "02/2026", "03/2026"]
+    assert meses["entradas"].tolist() == [500.0, 450.0, 300.0]
+    assert meses["saidas"].tolist() == [120.0, 80.0, 0.0]
+    assert meses["saldo"].tolist() == [380.0, 750.0, 1050.0]
+
+
+def test_saldo_acumulado_segue_a_ordem_do_livro(app):
+    livro = cofre(app, LIVRO.sample(frac=1, random_state=3))
+    # Sem data primeiro; o último acumulado é o saldo do caixa
+    assert livro.movs["id"].tolist() == [6, 1, 2, 3, 4, 5]
+    assert livro.movs["Saldo"].tolist() == [-50.0, 450.0, 330.0, 780.0, 700.0, 1000.0]
+    assert livro.movs["Saldo"].iloc[-1] == livro.saldo(hoje=datetime(2026, 3, 15))
+
+
+def test_saldo_e_totais_contam_movimentos_sem_data(app):
+    livro = cofre(app, LIVRO)
+    assert livro.totais() == (1250.0, 250.0)
+    assert livro.saldo(hoje=datetime(2026, 3, 15)) == 1000.0
+    # Mês corrente ainda aberto: entra pelos movimentos, não pelo fechamento
+    assert livro.saldo(hoje=datetime(2026, 2, 15)) == 1000.0
+
+
+def test_resumo_por_ano(app):
+    ano = cofre(app, pd.concat([LIVRO, movimentos([7, "2025-12-20", "Sobra", 100.0])], ignore_index=True)).por_ano()
+    assert ano.to_dict("records") == [
+        {"ano": 2025, "entradas": 100.0, "saidas": 0.0, "saldo": 100.0},
+        {"ano": 2026, "entradas": 1250.0, "saidas": 200.0, "saldo": 1150.0},
+    ]
+
+
+def test_ids_novos_continuam_do_maior(app):
+    livro = cofre(app, LIVRO.sample(frac=1, random_state=3))
+    assert livro.novos_ids(2) == [7, 8]
+    assert cofre(app, movimentos()).novos_ids(1) == [1]
+
+
+def test_planilha_antiga_sem_id_e_numerada_uma_vez(app, planilha):
+    antiga = LIVRO.assign(id=[1, "", 2, "", "", ""])
+    planilha("saidas", antiga)
+    livro = app.carregar_cofre()
+    app.get_fila().drenar(5)
+    gravado = app.get_storage().ler("saidas")
+    assert gravado["id"].tolist() == [1, 3, 2, 4, 5, 6]
+    assert sorted(livro.movs["id"].tolist()) == [1, 2, 3, 4, 5, 6]
@@ -0,0 +1,182 @@
+import threading
+
+import pandas as pd
+import pytest
+from conftest import elenco, partidas
+
+
+def saidas(*linhas):
+    return pd.DataFrame(linhas, columns=["id", "Data", "Descricao", "Valor"])
+
+
+# --- calcular_mudancas ---
+
+def test_mudancas_por_chave(app):
+    antes = elenco(Ana="Verde", Bia="Preto", Caio="Ambos")
+    depois = elenco(Ana="Verde", Bia="Ambos", Duda="Preto")
+    mudancas = app.calcular_mudancas(antes, depois, "elenco")
+    acoes = dict(zip(mudancas["nome"], zip(mudancas["_acao"], mudancas["_colunas"])))
+    assert acoes == {"Bia": ("atualizar", "time"), "Duda": ("inserir", ""), "Caio": ("apagar", "")}
+
+
+def test_mudancas_ignoram_numero_igual_em_outro_tipo(app):
+    antes = saidas([1, "2026-01-10", "Bola", 50])
+    depois = saidas([1, "2026-01-10", "Bola", 50.0])
+    assert app.calcular_mudancas(antes, depois, "saidas").empty
+
+
+def test_mudancas_sem_chave_unica_pedem_reescrita(app):
+    antes = elenco(Ana="Verde")
+    depois = pd.concat([elenco(Ana="Verde"), elenco(Ana="Preto")], ignore_index=True)
+    assert app.calcular_mudancas(antes, depois, "elenco") is None
+
+
+def test_edicao_manda_so_as_linhas_que_mudaram(app, planilha):
+    planilha("elenco", elenco(Ana="Verde", Bia="Preto", Caio="Ambos"))
+    antes = app.load_data("elenco")
+    storage = app.get_storage()
+    enviadas = []
+    original = storage.sincronizar
+    def sincronizar(df, sheet_name):
+        enviadas.append(df)
+        original(df, sheet_name)
+    storage.sincronizar = sincronizar
+    assert app.sync_data(antes, antes.assign(nivel=[2, 3, 2]), "elenco")
+    app.get_fila().drenar(5)
+    assert [df["nome"].tolist() for df in enviadas] == [["Bia"]]
+    assert storage.ler("elenco")["nivel"].tolist() == [2, 3, 2]
+
+
+# --- rebasear_mudancas ---
+
+def rebasear(app, antes, nosso, deles, sheet_name="elenco"):
+    mudancas = app.calcular_mudancas(antes, nosso, sheet_name)
+    return app.rebasear_mudancas(deles, antes, mudancas, sheet_name)
+
+
+def test_rebase_soma_colunas_diferentes_da_mesma_linha(app):
+    antes = elenco(Ana="Verde", Bia="Preto")
+    nosso = antes.assign(nivel=[3, 2])
+    deles = antes.assign(time=["Preto", "Preto"])
+    df, enviar = rebasear(app, antes, nosso, deles)
+    ana = df.set_index("nome").loc["Ana"]
+    assert (ana["time"], ana["nivel"]) == ("Preto", 3)
+    assert enviar["nome"].tolist() == ["Ana"]
+
+
+def test_rebase_conflita_na_mesma_celula(app):
+    antes = elenco(Ana="Verde")
+    with pytest.raises(app.ConflitoGravacao):
+        rebasear(app, antes, antes.assign(nivel=3), antes.assign(nivel=1))
+
+
+def test_rebase_aceita_mesma_celula_se_a_outra_sessao_nao_mudou(app):
+    antes = elenco(Ana="Verde")
+    df, _ = rebasear(app, antes, antes.assign(nivel=3), antes.assign(nivel=2))
+    assert df["nivel"].tolist() == [3]
+
+
+def test_rebase_conflita_editar_linha_apagada(app):
+    antes = elenco(Ana="Verde", Bia="Preto")
+    with pytest.raises(app.ConflitoGravacao):
+        rebasear(app, antes, antes.assign(nivel=[3, 2]), antes[antes["nome"] == "Bia"])
+
+
+def test_rebase_conflita_apagar_linha_editada(app):
+    antes = elenco(Ana="Verde", Bia="Preto")
+    with pytest.raises(app.ConflitoGravacao):
+        rebasear(app, antes, antes[antes["nome"] == "Bia"], antes.assign(nivel=[3, 2]))
+
+
+def test_rebase_apagar_o_que_ja_foi_apagado_nao_e_conflito(app):
+    antes = elenco(Ana="Verde", Bia="Preto")
+    df, _ = rebasear(app, antes, antes[antes["nome"] == "Bia"], antes[antes["nome"] == "Bia"])
+    assert df["nome"].tolist() == ["Bia"]
+
+
+def test_rebase_insercao_repetida(app):
+    antes = elenco(Ana="Verde")
+    nosso = pd.concat([antes, elenco(Bia="Preto")], ignore_index=True)
+    df, enviar = rebasear(app, antes, nosso, nosso)
+    assert df["nome"].tolist() == ["Ana", "Bia"] and enviar.empty
+    with pytest.raises(app.ConflitoGravacao):
+        rebasear(app, antes, nosso, pd.concat([antes, elenco(Bia="Verde")], ignore_index=True))
+
+
+def test_rebase_insercao_em_aba_com_id_ganha_id_livre(app):
+    antes = saidas([1, "2026-01-10", "Bola", -100.0])
+    nosso = pd.concat([antes, saidas([2, "2026-01-11", "Mensal", 500.0])], ignore_index=True)
+    deles = pd.concat([antes, saidas([2, "2026-01-12", "Juiz", -50.0])], ignore_index=True)
+    df, enviar = rebasear(app, antes, nosso, deles, "saidas")
+    assert sorted(df["id"].tolist()) == [1, 2, 3]
+    assert df.set_index("id").loc[3, "Descricao"] == "Mensal"
+    assert enviar["id"].tolist() == [3]
+
+
+# --- compare-and-swap nas gravações ---
+
+def test_reescrita_sobre_versao_velha_e_recusada(app, planilha):
+    planilha("elenco", elenco(Ana="Verde"))
+    velho = app.load_data("elenco")
+    assert app.save_data(velho.assign(nivel=3), "elenco", velho.attrs["marca"])
+    assert not app.save_data(velho.assign(nivel=1), "elenco", velho.attrs["marca"])
+    app.get_fila().drenar(5)
+    assert app.load_data("elenco")["nivel"].tolist() == [3]
+
+
+def test_duas_sessoes_editando_colunas_diferentes(app, planilha):
+    planilha("elenco", elenco(Ana="Verde", Bia="Preto"))
+    sessao1 = app.load_data("elenco")
+    sessao2 = app.load_data("elenco")
+    assert app.sync_data(sessao1, sessao1.assign(nivel=[3, 2]), "elenco")
+    assert app.sync_data(sessao2, sessao2.assign(time=["Verde", "Verde"]), "elenco")
+    app.get_fila().drenar(5)
+    esperado = [("Ana", "Verde", 3), ("Bia", "Verde", 2)]
+    assert list(app.load_data("elenco")[["nome", "time", "nivel"]].itertuples(index=False, name=None)) == esperado
+    fonte = app.tipar_dados(app.get_storage().ler("elenco"), "elenco")
+    assert list(fonte[["nome", "time", "nivel"]].itertuples(index=False, name=None)) == esperado
+
+
+def test_compactar_nao_engole_anexo_na_fila(app, planilha):
+    planilha("jogos", partidas((1, "2026-01-04", "Verde", {"Ana": ("Verde", 1)})))
+    app.load_data("jogos")
+    storage = app.get_storage()
+    original = storage.anexar
+    liberar = threading.Event()
+    def anexar_lento(df, sheet_name):
+        liberar.wait(5)
+        original(df, sheet_name)
+    storage.anexar = anexar_lento
+    app.append_data(partidas((2, "2026-01-11", "Preto", {"Bia": ("Preto", 2)})), "jogos")
+    # O anexo só termina depois que a compactação já começou
+    threading.Timer(0.3, liberar.set).start()
+    assert app.compactar_aba("jogos", app.COLUNAS_ABAS["jogos"], ordem=["data", "id"]) == 0
+    app.get_fila().drenar(5)
+    assert sorted(app.load_data("jogos")["id"].tolist()) == [1, 2]
+    assert sorted(app.tipar_dados(storage.ler("jogos"), "jogos")["id"].tolist()) == [1, 2]
+
+
+def test_remover_apaga_so_as_linhas_da_chave(app, planilha):
+    planilha("jogos", partidas((1, "2026-01-04", "Verde", {"Ana": ("Verde", 1), "Bia": ("Preto", 0)}),
+                               (2, "2026-01-11", "Preto", {"Ana": ("Verde", 0)})))
+    app.load_data("jogos")
+    assert app.remove_data("jogos", "id", [1])
+    assert app.load_data("jogos")["id"].tolist() == [2]
+    app.get_fila().drenar(5)
+    assert app.tipar_dados(app.get_storage().ler("jogos"), "jogos")["id"].tolist() == [2]
+
+
+def test_elenco_com_leitura_falha_nao_tenta_criar_a_aba(app, monkeypatch):
+    def falhar(sheet_names):
+        raise RuntimeError("sem rede")
+    monkeypatch.setattr(app.get_storage(), "ler_varias", falhar)
+    avisos = []
+    monkeypatch.setattr(app.st, "warning", avisos.append)
+    for _ in range(2): assert app.carregar_elenco().empty
+    assert avisos == [] and app.get_fila().consultar(range(1, 10)) == {}
+
+
+def test_elenco_vazio_cria_a_aba_com_o_cabecalho(app):
+    assert app.carregar_elenco().empty
+    app.get_fila().drenar(5)
+    assert app.get_storage().planilha.worksheet("elenco").get_all_values() == [app.COLUNAS_ABAS["elenco"]]
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+import streamlit as st
+from conftest import elenco
+
+
+def usar(grupo_id):
+    st.session_state["grupo"] = grupo_id
+
+
+def parar(grupo, segundos):
+    grupo.usado_em = time.time() - segundos
+
+
+# Registros avulsos, com as filas dos grupos que sobraram encerradas no fim
+@pytest.fixture
+def registro(app):
+    criados = []
+    def criar(**kwargs):
+        criados.append(app.RegistroGrupos(**kwargs))
+        return criados[-1]
+    yield criar
+    for reg in criados:
+        for grupo in reg.ativos.values(): grupo.fila.encerrar()
+
+
+def test_grupos_nao_enxergam_os_dados_um_do_outro(app, planilha):
+    planilha("elenco", elenco(Ana="Verde"))
+    assert app.load_data("elenco")["nome"].tolist() == ["Ana"]
+    usar("outro")
+    assert app.get_storage() is not app.get_grupos().obter(app.GRUPO_PADRAO).storage
+    assert app.load_data("elenco").empty
+    assert app.append_data(elenco(Bia="Preto"), "elenco")
+    app.get_fila().drenar(5)
+    assert app.get_storage().ler("elenco")["nome"].tolist() == ["Bia"]
+    usar(app.GRUPO_PADRAO)
+    assert app.load_data("elenco")["nome"].tolist() == ["Ana"]
+
+
+def test_config_propria_do_grupo_nao_herda_do_padrao(app):
+    assert app.config_grupo("admin_password", "1234", app.GRUPO_PADRAO) == "segredo"
+    # Senha não configurada desliga o papel, sem cair numa senha padrão conhecida
+    assert app.config_grupo("admin_password", "1234", "outro") is None
+    assert app.config_grupo("sqlite_path", "madrugao.db", "outro") == "outro.db"
+    # O que não é só do grupo continua vindo de cima
+    assert app.config_grupo("storage_backend", "sheets", "outro") == "memoria"
+
+
+def test_nome_do_grupo(app):
+    assert app.nome_grupo() == app.NOME_PADRAO
+    usar("outro")
+    assert app.nome_grupo() == "Outra Pelada"
+
+
+def test_grupo_parado_sai_quando_passa_do_limite(app, registro):
+    reg = registro(max_ativos=1)
+    madrugao = reg.obter(app.GRUPO_PADRAO)
+    parar(madrugao, app.MIN_OCIOSO_DESPEJO + 1)
+    reg.obter("outro")
+    assert reg.resumo() == ["outro"]
+    # Quem volta ganha um grupo novo, montado do zero
+    assert reg.obter(app.GRUPO_PADRAO) is not madrugao
+
+
+def test_grupo_usado_agora_nao_sai_mesmo_acima_do_limite(app, registro):
+    reg = registro(max_ativos=1)
+    reg.obter(app.GRUPO_PADRAO)
+    reg.obter("outro")
+    assert reg.resumo() == [app.GRUPO_PADRAO, "outro"]
+
+
+def test_grupo_com_gravacao_na_fila_nao_sai(app, registro):
+    reg = registro(max_ativos=1)
+    madrugao = reg.obter(app.GRUPO_PADRAO)
+    parar(madrugao, app.MIN_OCIOSO_DESPEJO + 1)
+    madrugao.fila.abas_pendentes = lambda: {"jogos"}
+    reg.obter("outro")
+    assert reg.resumo() == [app.GRUPO_PADRAO, "outro"]
+
+
+def test_grupo_ocioso_sai_mesmo_abaixo_do_limite(app, registro):
+    reg = registro(max_ativos=8, ocioso=600)
+    parar(reg.obter(app.GRUPO_PADRAO), 601)
+    reg.obter("outro")
+    assert reg.resumo() == ["outro"]
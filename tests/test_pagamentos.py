@@ -0,0 +1,22 @@
+import pandas as pd
+
+
+def grade_antiga(app, **pagos):
+    return pd.DataFrame([{"nome": nome, **{m: m in meses for m in app.MESES}} for nome, meses in pagos.items()])
+
+
+def test_grade_antiga_sem_ano_fica_como_esta(app, planilha):
+    planilha("financeiro", grade_antiga(app, Ana=["Jan", "Fev"], Bia=[]))
+    assert app.carregar_pagamentos().empty
+    assert app.migracao_pendente()
+    app.get_fila().drenar(5)
+    assert app.get_storage().ler("pagamentos") is None
+
+
+def test_grade_antiga_migra_com_o_ano_informado(app, planilha):
+    planilha("financeiro", grade_antiga(app, Ana=["Jan", "Fev"], Bia=["Mar"]))
+    pagamentos = app.carregar_pagamentos(2025)
+    assert list(pagamentos[["nome", "ano", "mes"]].itertuples(index=False, name=None)) == [("Ana", 2025, 1), ("Ana", 2025, 2), ("Bia", 2025, 3)]
+    assert not app.migracao_pendente()
+    app.get_fila().drenar(5)
+    assert app.tipar_dados(app.get_storage().ler("pagamentos"), "pagamentos")["ano"].tolist() == [2025, 2025, 2025]
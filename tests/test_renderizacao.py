@@ -0,0 +1,20 @@
+import os
+import signal
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+
+def test_pool_quebrado_e_refeito_no_proximo_envio(app):
+    pool = app.PoolRenderizacao(workers=1)
+    try:
+        pid = pool.enviar(os.getpid).result(timeout=30)
+        lento = pool.enviar(time.sleep, 30)
+        # Worker morto no meio da sessão: o que estava nele falha e o executor fica quebrado
+        os.kill(pid, signal.SIGKILL)
+        with pytest.raises(BrokenProcessPool):
+            lento.result(timeout=30)
+        assert pool.enviar(os.getpid).result(timeout=30) != pid
+    finally:
+        pool.pool.shutdown(wait=True, cancel_futures=True)
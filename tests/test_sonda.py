@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+
+from conftest import elenco
+
+
+def contar_leituras(storage):
+    lidas = []
+    original = storage.ler_varias
+    def ler_varias(sheet_names):
+        lidas.extend(sheet_names)
+        return original(sheet_names)
+    storage.ler_varias = ler_varias
+    return lidas
+
+
+def test_edicao_na_planilha_aparece_quando_a_revisao_muda(app, planilha):
+    planilha("elenco", elenco(Ana="Verde"))
+    assert app.load_data("elenco")["nome"].tolist() == ["Ana"]
+    planilha("elenco", elenco(Ana="Verde", Bia="Preto"))
+    assert app.load_data("elenco")["nome"].tolist() == ["Ana", "Bia"]
+
+
+def test_sem_mudanca_na_fonte_nao_rele_a_aba(app, planilha):
+    planilha("elenco", elenco(Ana="Verde"))
+    app.load_data("elenco")
+    lidas = contar_leituras(app.get_storage())
+    for _ in range(3): app.load_data("elenco")
+    assert lidas == []
+
+
+def test_revisao_so_e_consultada_uma_vez_por_intervalo(app, planilha):
+    planilha("elenco", elenco(Ana="Verde"))
+    app.load_data("elenco")
+    sonda = app.get_sonda()
+    sonda.intervalo = 3600
+    sonda.verificar()
+    planilha("elenco", elenco(Ana="Verde", Bia="Preto"))
+    assert app.load_data("elenco")["nome"].tolist() == ["Ana"]
+    sonda.ultima = 0.0
+    assert app.load_data("elenco")["nome"].tolist() == ["Ana", "Bia"]
+
+
+def test_gravacao_pendente_vale_o_cache_mesmo_com_revisao_nova(app, planilha):
+    planilha("elenco", elenco(Ana="Verde"))
+    app.load_data("elenco")
+    storage = app.get_storage()
+    liberar = threading.Event()
+    original = storage.anexar
+    def anexar_lento(df, sheet_name):
+        liberar.wait(5)
+        original(df, sheet_name)
+    storage.anexar = anexar_lento
+    app.append_data(elenco(Bia="Preto"), "elenco")
+    planilha("saidas", elenco(Caio="Ambos"))  # outra edição na planilha: revisão nova
+    lidas = contar_leituras(storage)
+    assert app.load_data("elenco")["nome"].tolist() == ["Ana", "Bia"]
+    liberar.set()
+    assert lidas == []
+    app.get_fila().drenar(5)
+    assert app.load_data("elenco")["nome"].tolist() == ["Ana", "Bia"]
+
+
+def test_revisao_do_sqlite_muda_com_gravacao_de_outra_conexao(app, tmp_path):
+    caminho = str(tmp_path / "teste.db")
+    storage = app.ArmazenamentoSQL(caminho)
+    antes = storage.revisao()
+    assert storage.revisao() == antes
+    outra = sqlite3.connect(caminho)
+    outra.execute("create table x (a int)")
+    outra.commit()
+    assert storage.revisao() != antes
+
+
+def test_gravacao_do_app_nao_vence_o_cache_das_outras_abas(app, planilha):
+    planilha("elenco", elenco(Ana="Verde"))
+    planilha("pagamentos", app.tipar_dados(None, "pagamentos"))
+    abas = ("elenco", "jogos", "saidas", "pagamentos")
+    app.load_all_data(abas)
+    lidas = contar_leituras(app.get_storage())
+    novo = app.tipar_dados(None, "pagamentos").reindex([0]).assign(nome="Ana", ano=2026, mes=3, valor=50.0)
+    assert app.append_data(novo, "pagamentos")
+    app.get_fila().drenar(5)
+    dados = app.load_all_data(abas)
+    assert lidas == []
+    assert dados["pagamentos"]["nome"].tolist() == ["Ana"]
+    # Edição por fora continua vencendo tudo
+    planilha("elenco", elenco(Ana="Verde", Bia="Preto"))
+    assert app.load_all_data(abas)["elenco"]["nome"].tolist() == ["Ana", "Bia"]
+    assert set(lidas) == set(abas)
@@ -0,0 +1,98 @@
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+
+def pool_aleatorio(semente, tamanho, forca="nivel"):
+    rng = random.Random(semente)
+    return [{"nome": f"J{i}", "time_pref": rng.choice(["Verde", "Preto", "Ambos", "Ambos"]),
+             "nivel": rng.randint(1, 3), "rating": round(rng.uniform(1300, 1700), 2)} for i in range(tamanho)]
+
+
+# Menor diferença possível mantendo os fixos no time deles e os tamanhos o mais iguais possível
+def melhor_diferenca(pool, chave):
+    verde = [p[chave] for p in pool if p["time_pref"] == "Verde"]
+    preto = [p[chave] for p in pool if p["time_pref"] == "Preto"]
+    soltos = [p[chave] for p in pool if p["time_pref"] not in ("Verde", "Preto")]
+    tamanhos = {c: abs(len(verde) + c - len(preto) - (len(soltos) - c)) for c in range(len(soltos) + 1)}
+    melhor = float("inf")
+    for c in (c for c, d in tamanhos.items() if d == min(tamanhos.values())):
+        for escolha in itertools.combinations(range(len(soltos)), c):
+            lado = sum(soltos[i] for i in escolha)
+            melhor = min(melhor, abs(sum(verde) + lado - sum(preto) - (sum(soltos) - lado)))
+    return melhor
+
+
+@pytest.mark.parametrize("semente", range(8))
+def test_sorteio_por_nivel_e_otimo(app, semente):
+    pool = pool_aleatorio(semente, 14)
+    resultado = app.sortear_times(pool, max_titulares=20, semente=semente)
+    assert resultado["diferenca"] == melhor_diferenca(pool, "nivel")
+
+
+@pytest.mark.parametrize("semente", range(4))
+def test_sorteio_por_rating_chega_ao_otimo_em_pool_pequeno(app, semente):
+    pool = pool_aleatorio(semente, 10)
+    resultado = app.sortear_times(pool, semente=semente, orcamento_ms=10_000, chave_forca="rating")
+    assert resultado["diferenca"] == pytest.approx(melhor_diferenca(pool, "rating"), abs=1e-6)
+
+
+def test_sorteio_por_rating_para_quando_os_recomecos_nao_melhoram(app, monkeypatch):
+    # Relógio parado: só a regra de parada pode encerrar a busca antes dos max_reinicios
+    consultas = []
+    monkeypatch.setattr(app.time, "perf_counter", lambda: consultas.append(1) or 0.0)
+    pool = pool_aleatorio(5, 20)
+    resultado = app.sortear_times(pool, semente=5, chave_forca="rating")
+    assert len(consultas) < 100
+    assert resultado["diferenca"] < 10
+
+
+def test_fixos_ficam_no_time_e_tamanhos_equilibrados(app):
+    pool = pool_aleatorio(3, 20)
+    resultado = app.sortear_times(pool, semente=1)
+    prefs = {p["nome"]: p["time_pref"] for p in pool}
+    assert all(prefs[n] != "Preto" for n in resultado["verde"])
+    assert all(prefs[n] != "Verde" for n in resultado["preto"])
+    fixos_v = sum(1 for p in pool if p["time_pref"] == "Verde")
+    fixos_p = sum(1 for p in pool if p["time_pref"] == "Preto")
+    soltos = len(pool) - fixos_v - fixos_p
+    menor = min(abs(fixos_v + c - fixos_p - (soltos - c)) for c in range(soltos + 1))
+    assert abs(len(resultado["verde"]) - len(resultado["preto"])) == menor
+
+
+def test_reservas_sao_os_que_passam_do_limite(app):
+    pool = pool_aleatorio(5, 24)
+    resultado = app.sortear_times(pool, max_titulares=20, semente=2)
+    assert resultado["reservas"] == [p["nome"] for p in pool[20:]]
+    assert len(resultado["verde"]) + len(resultado["preto"]) == 20
+
+
+@pytest.mark.parametrize("chave", ["nivel", "rating"])
+def test_mesma_semente_mesmo_sorteio(app, chave):
+    pool = pool_aleatorio(7, 18)
+    a = app.sortear_times(pool, semente=42, orcamento_ms=10_000, chave_forca=chave)
+    b = app.sortear_times(pool, semente=42, orcamento_ms=10_000, chave_forca=chave)
+    assert (a["verde"], a["preto"]) == (b["verde"], b["preto"])
+
+
+# --- sugestões com entrosamento ---
+
+def test_sugestoes_respeitam_fixos_e_repetem_com_a_mesma_semente(app):
+    pool = pool_aleatorio(4, 16)
+    a = app.sugerir_sorteios(pool, np.zeros((16, 16)), semente=9)
+    b = app.sugerir_sorteios(pool, np.zeros((16, 16)), semente=9)
+    assert [(s["verde"], s["preto"]) for s in a] == [(s["verde"], s["preto"]) for s in b]
+    assert len({tuple(s["verde"]) for s in a}) == len(a) == 3
+    prefs = {p["nome"]: p["time_pref"] for p in pool}
+    for s in a:
+        assert all(prefs[n] != "Preto" for n in s["verde"]) and all(prefs[n] != "Verde" for n in s["preto"])
+
+
+def test_sugestao_separa_a_dupla_entrosada_quando_a_forca_empata(app):
+    pool = [{"nome": nome, "time_pref": "Ambos", "nivel": 2} for nome in "ABCD"]
+    quimica = np.zeros((4, 4))
+    quimica[0, 1] = quimica[1, 0] = 0.4
+    melhor = app.sugerir_sorteios(pool, quimica, semente=1)[0]
+    assert ("A" in melhor["verde"]) != ("B" in melhor["verde"])
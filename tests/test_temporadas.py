@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from conftest import elenco, partidas
+
+ELENCO = elenco(Ana="Verde", Bia="Preto")
+
+JOGOS_2025 = partidas(
+    (1, "2025-11-02", "Verde", {"Ana": ("Verde", 2), "Bia": ("Preto", 1)}),
+    (2, "2025-12-07", "Preto", {"Ana": ("Verde", 0), "Bia": ("Preto", 3)}),
+)
+JOGOS_2026 = partidas((3, "2026-01-04", "Empate", {"Ana": ("Verde", 1), "Bia": ("Preto", 1)}))
+HOJE = datetime(2026, 3, 1)
+
+
+@pytest.fixture
+def grupo(app, planilha):
+    planilha("elenco", ELENCO)
+    planilha("jogos", pd.concat([JOGOS_2025, JOGOS_2026], ignore_index=True))
+    elenco_ = app.Elenco(app.carregar_elenco())
+    assert app.reconstruir_estatisticas(app.load_data("jogos"), elenco_)
+    return app, elenco_
+
+
+def gols(df):
+    return df.set_index("jogador")["gols"].to_dict()
+
+
+def test_ano_encerrado_sai_da_aba_aberta_para_a_particao(grupo):
+    app, elenco_ = grupo
+    assert app.arquivar_temporadas(elenco_, hoje=HOJE) == [2025]
+    assert app.load_data("jogos")["id"].unique().tolist() == [3]
+    assert app.load_data(app.aba_temporada(2025))["id"].unique().tolist() == [1, 2]
+    assert app.anos_arquivados() == [2025]
+    # Estatísticas abertas ficam só com 2026; o ano fechado vai para o resumo
+    assert gols(app.load_data("estatisticas")) == {"Ana": 1, "Bia": 1}
+    por_jogador, placar = app.resumo_temporadas([2025])
+    assert por_jogador["gols"].to_dict() == {"Ana": 2, "Bia": 4}
+    assert placar.to_dict() == {"Preto": 1, "Verde": 1}
+
+
+def test_historico_completo_junta_particoes_e_aba_aberta(grupo):
+    app, elenco_ = grupo
+    app.arquivar_temporadas(elenco_, hoje=HOJE)
+    assert app.carregar_historico_completo()["id"].unique().tolist() == [1, 2, 3]
+
+
+def test_arquivar_de_novo_nao_muda_nada(grupo):
+    app, elenco_ = grupo
+    app.arquivar_temporadas(elenco_, hoje=HOJE)
+    assert app.arquivar_temporadas(elenco_, hoje=HOJE) == []
+    assert len(app.load_data("temporadas")) == 2
+
+
+def test_sumula_atrasada_de_ano_fechado_soma_ao_resumo(grupo):
+    app, elenco_ = grupo
+    app.arquivar_temporadas(elenco_, hoje=HOJE)
+    atrasada = partidas((4, "2025-12-14", "Verde", {"Ana": ("Verde", 5), "Bia": ("Preto", 0)}))
+    assert app.append_data(atrasada, "jogos")
+    assert app.atualizar_estatisticas(atrasada, times_elenco=elenco_.times())
+    assert app.arquivar_temporadas(elenco_, hoje=HOJE) == [2025]
+    assert app.load_data(app.aba_temporada(2025))["id"].unique().tolist() == [1, 2, 4]
+    por_jogador, placar = app.resumo_temporadas()
+    assert por_jogador["gols"].to_dict() == {"Ana": 7, "Bia": 4}
+    assert placar.to_dict() == {"Preto": 1, "Verde": 2}
+    assert gols(app.load_data("estatisticas")) == {"Ana": 1, "Bia": 1}